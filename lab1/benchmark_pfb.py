@@ -0,0 +1,24 @@
+"""
+PFB spectrometer vs plain fft: speed and leakage
+"""
+
+import sys
+sys.path.insert(0, '../src')
+
+from src.pfb import benchmark
+
+
+def main():
+    nsamples = 2**22 #change
+    for nchan in [256, 1024, 4096]:
+        for fwidth in [1.0, 1.2]:
+            r = benchmark(nchan=nchan, ntaps=4, nsamples=nsamples, fwidth=fwidth)
+            print(f"nchan = {nchan:5d}, fwidth = {fwidth}: "
+                  f"fft {r['fft_rate']/1e6:7.1f} MS/s, pfb {r['pfb_rate']/1e6:7.1f} MS/s "
+                  f"({r['pfb_time']/r['fft_time']:.2f}x the fft time)")
+            print(f"    scalloping: fft {r['fft_scalloping_db']:6.2f} dB, pfb {r['pfb_scalloping_db']:6.2f} dB   "
+                  f"leakage 4 channels out: fft {r['fft_leakage_db']:6.1f} dB, pfb {r['pfb_leakage_db']:6.1f} dB")
+
+
+if __name__ == '__main__':
+    main()
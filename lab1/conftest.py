@@ -0,0 +1,11 @@
+'''
+pytest setup: the tests import the lab code as src.*, the same way the scripts here do
+'''
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# plotting script that happens to match test_*.py, not a test
+collect_ignore = ['test_plots.py']
@@ -9,7 +9,7 @@ import numpy as np
 import sys
 sys.path.insert(0, '../src')
 
-from src.acquiring_data import capture_sine_wave, save_data
+from src.acquiring_data import SDRSession, capture_sine_wave, save_data
 
 ## converts frequencies to scientific notation form to reduce file name clutter##
 def sci_filename(x, sig=3):
@@ -41,38 +41,42 @@ def main():
     path = os.path.join(cwd, folder_name)
     os.makedirs(os.path.join(cwd, folder_name), exist_ok=True)
     
-    for sr in sample_rates:
-        print(f"\n--- Sample rate: {sr/1e6} MHz ---")
+    # one open sdr for the whole sweep, retuned for each rate and filter state
+    with SDRSession(sample_rate=sample_rates[0]) as session:
+        for sr in sample_rates:
+            print(f"\n--- Sample rate: {sr/1e6} MHz ---")
         
-        # Capture with filter
-        data, metadata = capture_sine_wave(
-            signal_freq=signal_freq,
-            sample_rate=sr,
-            nsamples=nsamples,
-            bypass_filter=False
-        )
+            # Capture with filter
+            data, metadata = capture_sine_wave(
+                signal_freq=signal_freq,
+                sample_rate=sr,
+                nsamples=nsamples,
+                bypass_filter=False,
+                session=session
+            )
         
-        # another unique timestamp so as to have unique file names for each measurement
-        sci_sig = sci_filename(signal_freq)
-        sci_sr = sci_filename(sr)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            # another unique timestamp so as to have unique file names for each measurement
+            sci_sig = sci_filename(signal_freq)
+            sci_sr = sci_filename(sr)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
   
         
-        filename = f"filtered_f{sci_sig}_sr{sci_sr}_{timestamp}.npz"
-        save_data(data, metadata, filename, path)
+            filename = f"filtered_f{sci_sig}_sr{sci_sr}_{timestamp}.npz"
+            save_data(data, metadata, filename, path)
         
-        # Capture without filter
-        data, metadata = capture_sine_wave(
-            signal_freq=signal_freq,
-            sample_rate=sr,
-            nsamples=nsamples,
-            bypass_filter=True
-        )
+            # Capture without filter
+            data, metadata = capture_sine_wave(
+                signal_freq=signal_freq,
+                sample_rate=sr,
+                nsamples=nsamples,
+                bypass_filter=True,
+                session=session
+            )
         
 
         
-        filename = f"bypassed_f{sci_sig}_sr{sci_sr}_{timestamp}.npz"
-        save_data(data, metadata, filename, path)
+            filename = f"bypassed_f{sci_sig}_sr{sci_sr}_{timestamp}.npz"
+            save_data(data, metadata, filename, path)
     
     print("\n" + "="*60)
     print("Data collection complete")
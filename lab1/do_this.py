@@ -4,6 +4,7 @@ import ugradio.dft
 import numpy as np
 import astropy
 import matplotlib.pyplot as plt
+from src.peaks import find_peaks
 radio = ugradio.sdr.SDR(device_index=0)
 
 def compute_spectrum(x, fs):
@@ -16,16 +17,8 @@ def compute_spectrum(x, fs):
     return f, X, P
 
 def peak_frequency(f, P, fmin=None, fmax=None):
-    
-    mask = np.ones_like(f, dtype=bool)
-    if fmin is not None:
-        mask &= (f >= fmin)
-    if fmax is not None:
-         mask &= (f <= fmax)
-            
-    idx = np.argmax(P[mask])
-    f_peak = f[mask][idx]
-    return f_peak
+    # P can also be a stack of spectra (nspectra, nfreq); gives one peak per spectrum
+    return find_peaks(f, P, fmin=fmin, fmax=fmax, method='gaussian')['freq'][..., 0]
        
 
 fs = 1.0e6
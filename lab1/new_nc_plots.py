@@ -4,6 +4,8 @@ import matplotlib.pyplot as plt
 from scipy import signal, stats
 import ugradio.dft as dft
 from src import plotting_stuff, analysis, acquiring_data
+from src.aliasing import predict_alias
+from src.peaks import find_peaks
 
 # Setup plotting
 plotting_stuff.setup_plot_style()
@@ -74,8 +76,9 @@ for row_idx, (file, ds) in enumerate(nyquist_data.items()):
             raise ValueError(f"Length mismatch: freqs={len(freqs)}, power={len(power)}")
         
         # Find peak safely
-        peak_idx = np.argmax(power)
-        measured_freq = abs(freqs[peak_idx])
+        peak = find_peaks(freqs, power, method='gaussian')
+        peak_idx = peak['bin'][0]
+        measured_freq = abs(peak['freq'][0])
         print(f"  Peak index: {peak_idx}, Measured freq: {measured_freq/1e3:.4f} kHz ✓")
         
     except Exception as e:
@@ -92,8 +95,9 @@ for row_idx, (file, ds) in enumerate(nyquist_data.items()):
             raise ValueError(f"Length mismatch: freqs={len(freqs)}, power={len(voltage)}")
         
         # Find peak safely
-        peak_idx = np.argmax(voltage)
-        measured_freq = abs(freqs[peak_idx])
+        peak = find_peaks(freqs, np.abs(voltage), method='gaussian')
+        peak_idx = peak['bin'][0]
+        measured_freq = abs(peak['freq'][0])
         print(f"  Peak index: {peak_idx}, Measured freq: {measured_freq/1e3:.4f} kHz ✓")
         
     except Exception as e:
@@ -102,7 +106,7 @@ for row_idx, (file, ds) in enumerate(nyquist_data.items()):
     # Determine if aliasing occurs
     is_aliasing = signal_freq > nyquist
     if is_aliasing:
-        aliased_freq = sr - signal_freq
+        aliased_freq, zone = predict_alias(signal_freq, sr)
         status = f"ALIASING: {signal_freq/1e3:.0f}→{aliased_freq/1e3:.0f} kHz"
         status_color = 'red'
     else:
@@ -5,6 +5,7 @@ from scipy import signal, stats
 import ugradio.dft as dft
 
 from src import plotting_stuff, analysis, acquiring_data
+from src.aliasing import predict_alias
 
 plotting_stuff.setup_plot_style()
 
@@ -51,7 +52,7 @@ for ax, (sr, ds) in zip(axes, nyquist_data.items()):
     if signal_freq < nyquist:
         status = "No aliasing (below Nyquist)"
     else:
-        aliased_freq = haha - signal_freq
+        aliased_freq, zone = predict_alias(signal_freq, haha)
         ax.axvline(aliased_freq/1e3, color='orange', linestyle='-.', 
                    linewidth=2, label=f'Aliased: {aliased_freq/1e3:.0f} kHz')
         status = f"Aliasing appears at {aliased_freq/1e3:.0f} kHz"
@@ -3,7 +3,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 from scipy import signal, stats
 import ugradio.dft as dft
-from src import plotting_stuff, analysis, acquiring_data
+from src import plotting_stuff, analysis, acquiring_data, psd
+from src.aliasing import predict_alias
+from src.peaks import find_peaks
 
 # Setup plotting
 plotting_stuff.setup_plot_style()
@@ -78,8 +80,9 @@ for row_idx, (file, ds) in enumerate(nyquist_data.items()):
             raise ValueError(f"Length mismatch: freqs={len(freqs)}, power={len(power)}")
         
         # Find peak safely
-        peak_idx = np.argmax(power)
-        measured_freq = abs(freqs[peak_idx])
+        peak = find_peaks(freqs, power, method='gaussian')
+        peak_idx = peak['bin'][0]
+        measured_freq = abs(peak['freq'][0])
         print(f"  Peak index: {peak_idx}, Measured freq: {measured_freq/1e3:.4f} kHz ✓")
         
     except Exception as e:
@@ -96,8 +99,9 @@ for row_idx, (file, ds) in enumerate(nyquist_data.items()):
             raise ValueError(f"Length mismatch: freqs={len(freqs)}, power={len(voltage)}")
         
         # Find peak safely
-        peak_idx = np.argmax(voltage)
-        measured_freq = abs(freqs[peak_idx])
+        peak = find_peaks(freqs, np.abs(voltage), method='gaussian')
+        peak_idx = peak['bin'][0]
+        measured_freq = abs(peak['freq'][0])
         print(f"  Peak index: {peak_idx}, Measured freq: {measured_freq/1e3:.4f} kHz ✓")
         
     except Exception as e:
@@ -106,7 +110,7 @@ for row_idx, (file, ds) in enumerate(nyquist_data.items()):
     # Determine if aliasing occurs
     is_aliasing = signal_freq > nyquist
     if is_aliasing:
-        aliased_freq = sr - signal_freq
+        aliased_freq, zone = predict_alias(signal_freq, sr)
         status = f"ALIASING: {signal_freq/1e3:.0f}→{aliased_freq/1e3:.0f} kHz"
         status_color = 'red'
     else:
@@ -146,7 +150,16 @@ for row_idx, (file, ds) in enumerate(nyquist_data.items()):
     # =================================================================
     ax_spec = fig.add_subplot(gs[row_idx, 1])
     
-    ax_spec.semilogy(freqs/1e3, power, linewidth=1, color='navy', alpha=0.8)
+    # one full-length segment, rectangular vs blackman-harris window; 'spectrum' scaling
+    # puts the tone at the same height in both so only the leakage differs
+    leakage = {}
+    for window, color in (('boxcar', 'navy'), ('blackmanharris', 'teal')):
+        acc = psd.PSDAccumulator(sr, nperseg=len(data), window=window, scaling='spectrum')
+        acc.update(data)
+        leakage[window] = acc.psd
+        ax_spec.semilogy(acc.freqs/1e3, acc.psd, linewidth=1, color=color, alpha=0.8,
+                         label=f'{window} (ENBW {acc.enbw_bins:.2f} bins)')
+    power = np.concatenate(list(leakage.values()))
     
     
     # Draw boundaries
@@ -1,15 +1,334 @@
 import os
+import time
+import queue
+import threading
 import numpy as np
-import ugradio
-import ugradio.sdr
+try:
+    import ugradio
+    import ugradio.sdr
+except ImportError:
+    # no hardware libraries: only the simulated/replay backends in backends.py work
+    ugradio = None
 from pathlib import Path
 from datetime import datetime
 
+from src.storage import MemmapWriter
+
 fir_coeff = np.array([0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,2047])
 fir_coeff2 = np.array([0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,2047])
 
 
-def capture_sine_wave(signal_freq, sample_rate=2.4e6, nsamples=16384, bypass_filter=False, direct_sampling=True):
+def sci_filename(x, sig=3):
+    '''
+    converts frequencies to scientific notation form to reduce file name clutter
+    e.g. 2.4e6 -> 2p400e06
+    '''
+    s = f"{x:.{sig}e}"
+    return s.replace('.', 'p').replace('+', '').replace('-', 'm')
+
+
+# librtlsdr's default anti-aliasing filter taps, used to turn the filter back on in a session
+default_fir_coeff = np.array([-54, -36, -41, -40, -32, -14, 14, 53, 101, 156, 215, 273, 327, 372, 404, 421])
+
+# factory used to open devices when a session is not given one (None = ugradio.sdr.SDR)
+default_backend = None
+
+
+def set_backend(backend):
+    '''
+    sets the device factory used by every capture function, e.g. a SimulatedSDR
+    parameters: backend = callable taking ugradio.sdr.SDR's arguments (None = real sdr)
+    '''
+    global default_backend
+    default_backend = backend
+
+
+class CaptureStats:
+    '''
+    timing log for an SDRSession: every flush and capture call is recorded as
+    (kind, start, end, samples)
+    
+    parameters: live = print a one-line summary after every capture call
+    '''
+    
+    def __init__(self, live=False):
+        self.live = live
+        self.events = []
+        self.ncaptures = 0
+    
+    def record(self, kind, start, end, samples):
+        self.events.append((kind, start, end, samples))
+        if kind == 'capture':
+            self.ncaptures += 1
+        if self.live and kind == 'capture':
+            elapsed = end - start
+            print(f"  capture {self.ncaptures}: {samples} samples in {elapsed*1e3:.1f} ms "
+                  f"({samples/elapsed/1e6:.2f} MS/s)")
+    
+    def mark(self):
+        '''
+        returns a position to pass to summary(since=...) for the calls after this point
+        '''
+        return len(self.events)
+    
+    def summary(self, since=0, sample_rate=None):
+        '''
+        parameters: since = only use events after this mark
+                    sample_rate = requested rate, to report how far off the effective rate is
+        returns: dictionary with flush_time (s), capture_time (s), effective_rate (S/s),
+                 read_latency (s, one per capture call, however many blocks it read) and
+                 read_gap (s, host time between the end of one capture call and the start
+                 of the next); BlockMonitor has the per-block version for streamed captures
+        '''
+        events = self.events[since:]
+        flushes = [e for e in events if e[0] == 'flush']
+        captures = [e for e in events if e[0] == 'capture']
+        latency = np.array([end - start for _, start, end, _ in captures])
+        samples = sum(e[3] for e in captures)
+        stats = {'flush_time': sum(end - start for _, start, end, _ in flushes),
+                 'capture_time': latency.sum(),
+                 'effective_rate': samples / latency.sum() if len(captures) else np.nan,
+                 'read_latency': latency,
+                 'read_gap': np.array([captures[i][1] - captures[i-1][2] for i in range(1, len(captures))])}
+        if sample_rate:
+            stats['rate_ratio'] = stats['effective_rate'] / sample_rate
+        return stats
+
+
+def detect_discontinuities(data, threshold=6.0, previous=None):
+    '''
+    looks for dropped samples (e.g. usb overruns) at block boundaries
+    
+    the second difference across each boundary is compared to the spread of second
+    differences inside the blocks; a smooth signal (sine) that lost samples jumps there.
+    pure noise has no memory, so this can't see drops in noise captures.
+    
+    parameters: data = (nblocks, nsamples) real or (nblocks, nsamples, 2) I/Q blocks
+                threshold = robust z-score above which a boundary is flagged
+                previous = the block just before data (e.g. the last one of the previous
+                           read); it counts as block -1, so the jump into data[0] is checked too
+    returns: boundaries = indices k where the jump between block k and k+1 is flagged
+             z = robust z-score of every boundary
+    '''
+    x = np.asarray(data, dtype=np.float32)
+    if len(x) == 0 or (len(x) < 2 and previous is None):
+        return np.array([], dtype=int), np.array([])
+    inside = x[:, 2:] - 2 * x[:, 1:-1] + x[:, :-2]
+    # last two samples of block k, first two of block k+1
+    last = x[:-1, -2:]
+    if previous is not None:
+        last = np.concatenate([np.asarray(previous, dtype=np.float32)[None, -2:], last])
+    edge = np.concatenate([last, x[len(x) - len(last):, :2]], axis=1)
+    across = np.stack([edge[:, 2] - 2 * edge[:, 1] + edge[:, 0],
+                       edge[:, 3] - 2 * edge[:, 2] + edge[:, 1]], axis=1)
+    center = np.median(inside)
+    # 1.4826 * MAD ~ std for gaussian data
+    spread = 1.4826 * np.median(np.abs(inside - center))
+    if spread == 0:
+        spread = np.std(inside) or 1.0
+    z = np.abs(across - center) / spread
+    z = z.reshape(len(z), -1).max(axis=1)
+    offset = 0 if previous is None else -1
+    return np.where(z > threshold)[0] + offset, z
+
+
+class BlockMonitor:
+    '''
+    per-block checks for streamed captures: read time of every block, host time between
+    reads, and two ways of spotting dropped samples:
+      late reads = reads that end more than late_factor times their own duration after
+                   the previous read ended; the sdr keeps sampling while the host is busy,
+                   so a late read may have lost samples. works for any signal, noise too
+      discontinuities = detect_discontinuities across every block boundary, including the
+                        ones between one read and the next; only sees drops in smooth
+                        signals (sines), so noise captures turn it off with threshold=None
+    
+    parameters: threshold = robust z-score for detect_discontinuities (None = no boundary check)
+                live = print a warning as soon as a read or boundary is flagged
+                sample_rate = sampling rate in Hz, needed for the late read check (None = off)
+                late_factor = a read is late if it ends more than late_factor read durations
+                              after the previous one
+    '''
+    
+    def __init__(self, threshold=6.0, live=True, sample_rate=None, late_factor=1.5):
+        self.threshold = threshold
+        self.live = live
+        self.sample_rate = sample_rate
+        self.late_factor = late_factor
+        self.nblocks = 0
+        self.latency = []
+        self.gaps = []
+        self.late_reads = []
+        self.discontinuities = []
+        self._tail = None
+        self._last_end = None
+    
+    def update(self, blocks, start, end):
+        '''
+        parameters: blocks = (n, nsamples) or (n, nsamples, 2) blocks returned by one read
+                    start, end = time.perf_counter() before and after the read
+        '''
+        blocks = np.asarray(blocks)
+        n = len(blocks)
+        # a read of several blocks only has one duration, shared evenly between them
+        self.latency.extend([(end - start) / n] * n)
+        if self._last_end is not None:
+            self.gaps.append(start - self._last_end)
+            if self.sample_rate and end - self._last_end > self.late_factor * n * blocks.shape[1] / self.sample_rate:
+                # recorded by the first block of the read
+                self.late_reads.append(self.nblocks)
+                if self.live:
+                    print(f"WARNING: late read at block {self.nblocks}, samples may have been dropped")
+        self._last_end = end
+        
+        if self.threshold is not None:
+            boundaries, _ = detect_discontinuities(blocks, self.threshold, previous=self._tail)
+            boundaries = boundaries + self.nblocks
+            if len(boundaries):
+                self.discontinuities.extend(boundaries.tolist())
+                if self.live:
+                    print(f"WARNING: possible dropped samples after blocks {boundaries}")
+            self._tail = blocks[-1, -2:].copy()
+        self.nblocks += n
+    
+    def summary(self):
+        '''
+        returns: dictionary with block_latency (s, one per block), read_gap (s, between
+                 reads), late_reads (first block of every late read, if sample_rate is set)
+                 and discontinuities (indices k of flagged jumps between block k and k+1,
+                 if threshold is set)
+        '''
+        summary = {'block_latency': np.array(self.latency), 'read_gap': np.array(self.gaps)}
+        if self.sample_rate:
+            summary['late_reads'] = np.array(self.late_reads, dtype=int)
+        if self.threshold is not None:
+            summary['discontinuities'] = np.array(self.discontinuities, dtype=int)
+        return summary
+
+
+class SDRSession:
+    '''
+    keeps one sdr open across many captures and retunes it in place
+    
+    use as a context manager:
+        with SDRSession(sample_rate=1e6) as session:
+            data, metadata = capture_sine_wave(5e5, sample_rate=2e6, session=session)
+    
+    parameters: device_index = which sdr to open
+                direct = direct sampling mode
+                sample_rate = sampling rate in Hz
+                center_freq = LO frequency in Hz (ignored for direct sampling)
+                gain = gain in dB
+                fir_coeffs = anti-aliasing filter taps (None = device default)
+                flush_samples = samples thrown away after opening or retuning
+                backend = callable taking ugradio.sdr.SDR's arguments that returns the device
+                          (None = set_backend's choice, otherwise ugradio.sdr.SDR)
+                live_stats = print timing after every capture call (timing is always kept in self.stats)
+    '''
+    
+    def __init__(self, device_index=0, direct=True, sample_rate=2.4e6, center_freq=0, gain=0,
+                 fir_coeffs=None, flush_samples=2048, backend=None, live_stats=False):
+        self.device_index = device_index
+        self.stats = CaptureStats(live=live_stats)
+        self.backend = backend
+        self.gain = gain
+        self.flush_samples = flush_samples
+        self.config = {'direct': direct, 'sample_rate': sample_rate, 'center_freq': center_freq,
+                       'fir_coeffs': None if fir_coeffs is None else np.asarray(fir_coeffs)}
+        self.sdr = None
+    
+    def open(self):
+        kwargs = {'device_index': self.device_index, 'direct': self.config['direct'],
+                  'sample_rate': self.config['sample_rate'], 'gain': self.gain}
+        if not self.config['direct']:
+            kwargs['center_freq'] = self.config['center_freq']
+        if self.config['fir_coeffs'] is not None:
+            kwargs['fir_coeffs'] = self.config['fir_coeffs']
+        backend = self.backend or default_backend
+        if backend is None:
+            if ugradio is None:
+                raise ImportError("ugradio is not installed; pass a backend from backends.py")
+            backend = ugradio.sdr.SDR
+        self.sdr = backend(**kwargs)
+        self.flush()
+        return self
+    
+    def configure(self, sample_rate=None, center_freq=None, direct=None, fir_coeffs=None):
+        '''
+        retunes the open sdr; only settings that actually change are sent to the device,
+        and the pipeline is flushed once if anything changed
+        returns: changed = True if the device was retuned
+        '''
+        changed = False
+        if direct is not None and direct != self.config['direct']:
+            self.sdr.set_direct_sampling('q' if direct else 0)
+            self.config['direct'] = direct
+            changed = True
+        if sample_rate is not None and sample_rate != self.config['sample_rate']:
+            self.sdr.sample_rate = sample_rate
+            self.config['sample_rate'] = sample_rate
+            changed = True
+        if center_freq is not None and not self.config['direct'] and center_freq != self.config['center_freq']:
+            self.sdr.center_freq = center_freq
+            self.config['center_freq'] = center_freq
+            changed = True
+        if fir_coeffs is not None:
+            fir_coeffs = np.asarray(fir_coeffs)
+            current = self.config['fir_coeffs']
+            if current is None or not np.array_equal(current, fir_coeffs):
+                self.sdr.set_fir_coeffs(fir_coeffs)
+                self.config['fir_coeffs'] = fir_coeffs
+                changed = True
+        if changed:
+            self.flush()
+        return changed
+    
+    def flush(self):
+        '''
+        throws away the samples buffered before the last open/retune
+        '''
+        if self.flush_samples:
+            start = time.perf_counter()
+            self.sdr.capture_data(nsamples=self.flush_samples, nblocks=1)
+            self.stats.record('flush', start, time.perf_counter(), self.flush_samples)
+    
+    def capture(self, nsamples=16384, nblocks=1):
+        start = time.perf_counter()
+        data = self.sdr.capture_data(nsamples=nsamples, nblocks=nblocks)
+        self.stats.record('capture', start, time.perf_counter(), nsamples * nblocks)
+        return data
+    
+    def close(self):
+        if self.sdr is not None:
+            self.sdr.close()
+            self.sdr = None
+    
+    def __enter__(self):
+        return self.open()
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _session_capture(session, nsamples, nblocks, **config):
+    '''
+    captures with an existing session (retuned first) or a one-off session
+    returns: data = captured blocks
+             timing = CaptureStats summary for this capture, including the open/retune flush
+    '''
+    if session is not None:
+        mark = session.stats.mark()
+        session.configure(**config)
+        data = session.capture(nsamples=nsamples, nblocks=nblocks)
+    else:
+        with SDRSession(**config) as session:
+            mark = 0
+            data = session.capture(nsamples=nsamples, nblocks=nblocks)
+    return data, session.stats.summary(since=mark, sample_rate=config.get('sample_rate'))
+
+
+def capture_sine_wave(signal_freq, sample_rate=2.4e6, nsamples=16384, bypass_filter=False, direct_sampling=True,
+                      session=None):
     '''
     captures sine wave from function generator with sdr
     
@@ -18,6 +337,7 @@ def capture_sine_wave(signal_freq, sample_rate=2.4e6, nsamples=16384, bypass_fil
                 nsamples = number of samples
                 bypass_filter = bypassing anti-aliasing fliter using the fir_coeffs array
                 direct_sampling = sampling mode
+                session = open SDRSession to reuse (None = open and close the sdr here)
                 
     returns: data = time series data
              metadata = capture parameters
@@ -25,78 +345,346 @@ def capture_sine_wave(signal_freq, sample_rate=2.4e6, nsamples=16384, bypass_fil
     '''
     
     if bypass_filter:
-        sdr = ugradio.sdr.SDR(device_index=0, direct=direct_sampling, sample_rate=sample_rate, gain=0, fir_coeffs = fir_coeff)
+        fir_coeffs = fir_coeff
         filter_status = "bypassed"
         
     else: 
-        sdr = ugradio.sdr.SDR(device_index=0, direct=direct_sampling, sample_rate=sample_rate, gain=0)
+        fir_coeffs = default_fir_coeff
         filter_status = "filter is on"
         
     print(f"Capturing: {signal_freq/1e3:.1f} kHz at {sample_rate/1e6:.2f} MHz")
     print(f"Filter: {filter_status}")
     
-    first_capture = sdr.capture_data(nsamples=nsamples, nblocks=1)
-    data = sdr.capture_data(nsamples=nsamples, nblocks=1)
-    
-    sdr.close()
+    data, timing = _session_capture(session, nsamples, 1, direct=direct_sampling, sample_rate=sample_rate,
+                                    fir_coeffs=fir_coeffs)
     
     metadata = {'signal_freq': signal_freq, 'sample_rate': sample_rate, 'nsamples': nsamples, 'filter_bypassed': bypass_filter,
                 'direct_sampling': direct_sampling, 'timestamp': datetime.now().isoformat()}
+    metadata.update(timing)
     return data, metadata
 
 
-def capture_ng(sample_rate=2.4e6, nsamples=16384, nblocks=1):
+def capture_ng(sample_rate=2.4e6, nsamples=16384, nblocks=1, session=None):
     '''
     capture data from noise generator
     
     parameters: sample_rate = sampling rate in Hz
                 nsamples = number of samples
                 nblocks = number of blocks to capture
+                session = open SDRSession to reuse (None = open and close the sdr here)
     returns: data = time series data
-             metadata = capture parameters
+             metadata = capture parameters and read timing
+    note: the blocks come from a single read, and noise has no memory, so dropped samples
+          can't be told from the data here (no discontinuities); stream or capture to disk
+          to get the per-read late check
     '''
     direct_sampling = True
-    sdr = ugradio.sdr.SDR(device_index=0, direct=direct_sampling, sample_rate=sample_rate, gain=0)
     print(f"Capturing data: {nblocks} blocks of {nsamples} samples")
-    first_capture = sdr.capture_data(nsamples=nsamples, nblocks=nblocks)
-    data = sdr.capture_data(nsamples=nsamples, nblocks=nblocks)
-    sdr.close()
+    # filter taps given explicitly, so a session last used with the filter bypassed gets it back
+    data, timing = _session_capture(session, nsamples, nblocks, direct=direct_sampling, sample_rate=sample_rate,
+                                    fir_coeffs=default_fir_coeff)
     
     metadata = {'sample_rate': sample_rate, 'nsamples': nsamples, 'nblocks': nblocks,
                 'direct_sampling': True,  'timestamp': datetime.now().isoformat()}
+    metadata.update(timing)
     print(np.unique(data[0]))
     return data, metadata
 
 
-def capture_iq_mixer(sample_rate=2.4e6, nsamples=16384, lo_freq=10e6):
+def capture_iq_mixer(sample_rate=2.4e6, nsamples=16384, lo_freq=10e6, session=None):
     '''
     capture I/Q data from SDR internal mixer (SSB mode)
     parameters: sample_rate = sampling rate in Hz
                 nsamples = number of samples
                 lo_freq = local oscillator frequency in Hz
-    returns: data = complex I/Q times series 
+                session = open SDRSession to reuse (None = open and close the sdr here)
+    returns: data = I/Q time series as int8 with I and Q on the last axis
              metadata = capture parameters
     '''
-    sdr = ugradio.sdr.SDR(device_index=0, direct=False, center_freq=lo_freq, sample_rate=sample_rate, gain=0, fir_coeffs=fir_coeff)
     print(f"Capturing I/Q data: LO = {lo_freq/1e6:.2f} MHz")
-    first_capture = sdr.capture_data(nsamples=nsamples, nblocks=1)
-    data = sdr.capture_data(nsamples=nsamples, nblocks=1)
-    sdr.close()
+    data, timing = _session_capture(session, nsamples, 1, direct=False, center_freq=lo_freq, sample_rate=sample_rate,
+                                    fir_coeffs=fir_coeff)
     
-    #combining I and Q to make complex array
-    if data.ndim == 2:
-        complex_data = data[:,0] + 1j * data[:,1]
-    else: 
-        complex_data = data
+    # data stays interleaved int8 (..., 2); storage.CaptureView gives complex64 blocks when needed
     
     metadata = {'sample_rate': sample_rate, 'nsamples': nsamples, 'lo_freq': lo_freq,
                 'direct_sampling':False, 'timestamp': datetime.now().isoformat()}
+    metadata.update(timing)
     return data, metadata
 
 
+def capture_ng_to_disk(path, sample_rate=2.4e6, nsamples=16384, nblocks=1, blocks_per_read=1, session=None,
+                       late_factor=1.5):
+    '''
+    capture data from noise generator straight into a memory-mapped .npy file, so runs
+    with any number of blocks never have to fit in memory
+    
+    parameters: path = output .npy file (metadata goes to <path>.json)
+                sample_rate = sampling rate in Hz
+                nsamples = number of samples per block
+                nblocks = number of blocks to capture
+                blocks_per_read = blocks read from the sdr at a time
+                session = open SDRSession to reuse (None = open and close the sdr here)
+                late_factor = a read is flagged as late (possible dropped samples) if it ends
+                              more than late_factor read durations after the previous one
+    returns: metadata = capture parameters, per-block timing and late reads (noise can't show
+             drops in the samples themselves, so there is no discontinuities entry)
+    '''
+    direct_sampling = True
+    metadata = {'sample_rate': sample_rate, 'nsamples': nsamples, 'nblocks': nblocks,
+                'direct_sampling': direct_sampling, 'timestamp': datetime.now().isoformat()}
+    owns_session = session is None
+    if owns_session:
+        session = SDRSession(direct=direct_sampling, sample_rate=sample_rate, fir_coeffs=default_fir_coeff).open()
+    else:
+        session.configure(direct=direct_sampling, sample_rate=sample_rate, fir_coeffs=default_fir_coeff)
+    
+    print(f"Capturing data to {path}: {nblocks} blocks of {nsamples} samples")
+    monitor = BlockMonitor(threshold=None, sample_rate=sample_rate, late_factor=late_factor)
+    try:
+        with MemmapWriter(path, (nsamples,), metadata) as writer:
+            while writer.nblocks < nblocks:
+                n = min(blocks_per_read, nblocks - writer.nblocks)
+                start = time.perf_counter()
+                data = session.capture(nsamples=nsamples, nblocks=n)
+                monitor.update(data, start, time.perf_counter())
+                writer.append(data)
+            writer.metadata.update(monitor.summary())
+    finally:
+        if owns_session:
+            session.close()
+    return writer.metadata
+
+
 def save_data(data, metadata, filename, directory):
     '''
     paramters: data=array, metadata=dictionary, filename=output filename
+    returns: save_time = seconds spent in np.savez
     '''
+    start = time.perf_counter()
     np.savez(os.path.join(directory, filename), data=data, **metadata)
-    print(f"Saved: {filename}")
+    save_time = time.perf_counter() - start
+    print(f"Saved: {filename} ({save_time*1e3:.1f} ms)")
+    return save_time
+
+
+def stream_ng(sample_rate=2.4e6, nsamples=16384, nblocks=None, session=None, monitor=None):
+    '''
+    streams noise generator data from the sdr one block at a time
+    
+    parameters: sample_rate = sampling rate in Hz
+                nsamples = number of samples per block
+                nblocks = number of blocks to yield (None = run until stopped)
+                session = open SDRSession to reuse (None = open and close the sdr here)
+                monitor = BlockMonitor that times every block (make it with threshold=None:
+                          boundary checks can't see drops in noise)
+    yields: index = block sequence number
+            timestamp = host time (s) when the block was returned
+            block = time series data for that block
+    '''
+    direct_sampling = True
+    owns_session = session is None
+    if owns_session:
+        session = SDRSession(direct=direct_sampling, sample_rate=sample_rate, fir_coeffs=default_fir_coeff).open()
+    else:
+        session.configure(direct=direct_sampling, sample_rate=sample_rate, fir_coeffs=default_fir_coeff)
+    try:
+        print(f"Streaming data: blocks of {nsamples} samples")
+        index = 0
+        while nblocks is None or index < nblocks:
+            start = time.perf_counter()
+            data = session.capture(nsamples=nsamples, nblocks=1)
+            if monitor is not None:
+                monitor.update(data, start, time.perf_counter())
+            yield index, time.time(), data[0]
+            index += 1
+    finally:
+        if owns_session:
+            session.close()
+
+
+def stream_iq_mixer(sample_rate=2.4e6, nsamples=16384, lo_freq=10e6, nblocks=None, session=None):
+    '''
+    streams I/Q mixer data from the sdr one block at a time (settings as capture_iq_mixer)
+
+    yields: index = block sequence number
+            timestamp = host time (s) when the block was returned
+            block = (nsamples, 2) int8 I/Q block
+    '''
+    owns_session = session is None
+    if owns_session:
+        session = SDRSession(direct=False, sample_rate=sample_rate, center_freq=lo_freq, fir_coeffs=fir_coeff).open()
+    else:
+        session.configure(direct=False, sample_rate=sample_rate, center_freq=lo_freq, fir_coeffs=fir_coeff)
+    try:
+        print(f"Streaming I/Q data: LO = {lo_freq/1e6:.2f} MHz, blocks of {nsamples} samples")
+        index = 0
+        while nblocks is None or index < nblocks:
+            data = session.capture(nsamples=nsamples, nblocks=1)
+            yield index, time.time(), data[0]
+            index += 1
+    finally:
+        if owns_session:
+            session.close()
+
+
+class BlockWriter:
+    '''
+    background thread that appends streamed blocks to disk
+    
+    blocks are appended as raw bytes to <prefix>.bin and the block timestamps, sequence
+    numbers and capture metadata go to <prefix>_meta.npz when the writer is closed.
+    at most max_queue blocks are held in memory; if the disk falls behind, new blocks
+    are dropped and counted instead of growing the queue.
+    
+    parameters: directory = output directory
+                prefix = output file prefix
+                metadata = capture parameters (needs sample_rate and nsamples)
+                max_queue = max number of blocks waiting to be written
+                late_factor = a block is late if it arrives more than late_factor
+                              block durations after the previous one
+    '''
+    
+    def __init__(self, directory, prefix, metadata, max_queue=8, late_factor=1.5):
+        self.path = os.path.join(directory, prefix + '.bin')
+        self.meta_path = os.path.join(directory, prefix + '_meta.npz')
+        self.metadata = dict(metadata)
+        self.block_time = metadata['nsamples'] / metadata['sample_rate']
+        self.late_factor = late_factor
+        
+        self.indices = []
+        self.timestamps = []
+        self.dropped = []
+        self.late = []
+        self.dtype = None
+        self.block_shape = None
+        self._last_time = None
+        self._error = None
+        
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._file = open(self.path, 'wb')
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                index, timestamp, block = item
+                self._file.write(np.ascontiguousarray(block).tobytes())
+                self.indices.append(index)
+                self.timestamps.append(timestamp)
+        except Exception as error:
+            # kept for close() to re-raise in the capturing thread
+            self._error = error
+    
+    def submit(self, index, timestamp, block):
+        '''
+        queue one block for writing
+        returns: True if queued, False if it was dropped because the queue is full
+        '''
+        if self._last_time is not None and timestamp - self._last_time > self.late_factor * self.block_time:
+            self.late.append(index)
+        self._last_time = timestamp
+        
+        if self.dtype is None:
+            self.dtype = block.dtype
+            self.block_shape = block.shape
+        try:
+            self._queue.put_nowait((index, timestamp, block))
+        except queue.Full:
+            self.dropped.append(index)
+            return False
+        return True
+    
+    def close(self):
+        '''
+        waits for queued blocks to be written and saves the metadata file (also when the
+        writer thread failed, so the blocks written before that can be loaded), then
+        re-raises the writer thread's error if it had one
+        returns: summary = dictionary with written, dropped and late block counts
+        '''
+        # a dead writer thread leaves the queue full, so never wait on it indefinitely
+        while self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        self._thread.join()
+        self._file.close()
+        
+        np.savez(self.meta_path, indices=np.array(self.indices), timestamps=np.array(self.timestamps),
+                 dropped=np.array(self.dropped, dtype=int), late=np.array(self.late, dtype=int),
+                 dtype=str(self.dtype), block_shape=np.array(self.block_shape or (), dtype=int),
+                 **self.metadata)
+        if self._error is not None:
+            raise self._error
+        return self.summary()
+    
+    def summary(self):
+        return {'written': len(self.indices), 'dropped': len(self.dropped), 'late': len(self.late)}
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+def stream_capture_ng(directory, prefix='stream', sample_rate=2.4e6, nsamples=16384, nblocks=None,
+                      max_queue=8, callback=None, session=None):
+    '''
+    long noise generator integration: streams blocks from the sdr while a background
+    thread writes them to disk
+    
+    parameters: directory = output directory
+                prefix = output file prefix
+                sample_rate = sampling rate in Hz
+                nsamples = number of samples per block
+                nblocks = number of blocks (None = run until Ctrl-C)
+                max_queue = max number of blocks held in memory
+                callback = optional function called as callback(index, block) for every block
+                session = open SDRSession to reuse (None = open and close the sdr here)
+    returns: summary = dictionary with written, dropped and late block counts (the per-block
+             timing is saved in the metadata file). late blocks are the dropped-sample check
+             here: noise has no memory, so there is no discontinuities check on the samples
+    '''
+    metadata = {'sample_rate': sample_rate, 'nsamples': nsamples,
+                'direct_sampling': True, 'timestamp': datetime.now().isoformat()}
+    writer = BlockWriter(directory, prefix, metadata, max_queue=max_queue)
+    # timing only: the writer already flags late blocks
+    monitor = BlockMonitor(threshold=None)
+    try:
+        for index, timestamp, block in stream_ng(sample_rate=sample_rate, nsamples=nsamples, nblocks=nblocks,
+                                                  session=session, monitor=monitor):
+            writer.submit(index, timestamp, block)
+            if callback is not None:
+                callback(index, block)
+    except KeyboardInterrupt:
+        print("Stream stopped")
+    finally:
+        writer.metadata.update(monitor.summary())
+        summary = writer.close()
+    print(f"Wrote {summary['written']} blocks, dropped {summary['dropped']}, late {summary['late']}")
+    return summary
+
+
+def load_stream(directory, prefix='stream'):
+    '''
+    loads a stream written by BlockWriter
+    returns: data = (nblocks, ...) array memory-mapped from disk (an empty
+                    (0, nsamples) array if no block was written)
+             metadata = dictionary from the metadata file
+    '''
+    meta = np.load(os.path.join(directory, prefix + '_meta.npz'))
+    metadata = {key: meta[key] for key in meta.files}
+    if len(metadata['indices']) == 0:
+        # nothing was submitted, so the block shape and dtype were never seen; an empty
+        # file can't be memory-mapped either
+        return np.zeros((0, int(metadata['nsamples'])), dtype=np.int8), metadata
+    shape = (len(metadata['indices']),) + tuple(metadata['block_shape'])
+    data = np.memmap(os.path.join(directory, prefix + '.bin'), dtype=str(metadata['dtype']), mode='r', shape=shape)
+    return data, metadata
@@ -0,0 +1,158 @@
+'''
+alias prediction and sweep validation
+
+where a tone at signal_freq shows up after sampling at sample_rate, for a whole grid
+at once, and how far the measured peaks are from that.
+
+    predicted, zone = predict_alias(signal_freq, sample_rate)      # any broadcastable arrays
+    report = compare_peaks(rows)                                   # rows from sweep results / catalog
+
+real (direct) sampling folds into 0..fs/2: odd Nyquist zones land at f mod fs, even
+zones are mirrored. I/Q sampling after mixing with the LO wraps the offset f - lo_freq
+into -fs/2..fs/2 without mirroring.
+'''
+
+import csv
+from collections import defaultdict
+import numpy as np
+
+from src import analysis
+from src.peaks import find_peaks
+from src.storage import load_capture
+
+
+def predict_alias(signal_freq, sample_rate, lo_freq=0, iq=False):
+    '''
+    folded (apparent) frequency and Nyquist zone of a tone
+
+    parameters: signal_freq = true frequency in Hz
+                sample_rate = sampling rate in Hz
+                lo_freq = LO frequency in Hz (I/Q only)
+                iq = False for real direct sampling, True for complex I/Q
+                all four broadcast, so a (nrates, 1) sample_rate against an (nfreqs,)
+                signal_freq gives the whole grid
+    returns: apparent = frequency the peak appears at in Hz (0..fs/2 real, -fs/2..fs/2 I/Q)
+             zone = Nyquist zone: 1 = no aliasing, 2 = first mirror, ... for real data;
+                    for I/Q the number of sample rates the offset was shifted by (0 = none)
+    '''
+    signal_freq, sample_rate, lo_freq, iq = np.broadcast_arrays(
+        np.asarray(signal_freq, dtype=float), np.asarray(sample_rate, dtype=float),
+        np.asarray(lo_freq, dtype=float), np.asarray(iq, dtype=bool))
+
+    # real sampling: zones of width fs/2, every even zone is mirrored
+    f = np.abs(signal_freq)
+    real_zone = np.floor(f / (sample_rate / 2)).astype(int) + 1
+    folded = np.mod(f, sample_rate)
+    real_apparent = np.minimum(folded, sample_rate - folded)
+
+    # I/Q sampling: the offset from the LO wraps around by whole sample rates
+    offset = signal_freq - lo_freq
+    iq_zone = np.floor((offset + sample_rate / 2) / sample_rate).astype(int)
+    iq_apparent = offset - iq_zone * sample_rate
+
+    return np.where(iq, iq_apparent, real_apparent), np.where(iq, iq_zone, real_zone)
+
+
+def alias_grid(signal_freqs, sample_rates, lo_freq=0, iq=False):
+    '''
+    predict_alias over every (sample_rate, signal_freq) pair
+    returns: apparent, zone = (nrates, nfreqs) arrays
+    '''
+    return predict_alias(np.asarray(signal_freqs)[None, :], np.asarray(sample_rates)[:, None],
+                         lo_freq, iq)
+
+
+def _column(rows, key, default=np.nan):
+    return np.array([float(row[key]) if row.get(key) not in (None, '') else default for row in rows])
+
+
+def _is_iq(row):
+    direct = row.get('direct_sampling')
+    if direct in (None, ''):
+        return row.get('lo_freq') not in (None, '')
+    return str(direct) not in ('True', '1', '1.0')
+
+
+def compare_peaks(rows, tolerance=None):
+    '''
+    joins measured peaks against the predicted aliases
+
+    parameters: rows = list of dictionaries with signal_freq, sample_rate and peak_freq
+                       (e.g. sweep results or catalog rows after measure_peaks); lo_freq and
+                       direct_sampling are used when present, a row with lo_freq and no
+                       direct_sampling is taken as I/Q
+                tolerance = largest residual in Hz still counted as a match
+                            (None = one fft bin, needs nsamples)
+    returns: dictionary of arrays: signal_freq, sample_rate, predicted, zone, measured,
+             residual (measured - predicted, Hz), residual_bins and ok
+    '''
+    signal_freq = _column(rows, 'signal_freq')
+    sample_rate = _column(rows, 'sample_rate')
+    lo_freq = _column(rows, 'lo_freq', 0.0)
+    measured = _column(rows, 'peak_freq')
+    nsamples = _column(rows, 'nsamples')
+    iq = np.array([_is_iq(row) for row in rows], dtype=bool)
+
+    predicted, zone = predict_alias(signal_freq, sample_rate, lo_freq, iq)
+    # real spectra are symmetric, so a peak found at -f is the same as +f
+    measured = np.where(iq, measured, np.abs(measured))
+    residual = measured - predicted
+    residual_bins = residual / (sample_rate / nsamples)
+    if tolerance is None:
+        ok = np.abs(residual_bins) <= 1
+    else:
+        ok = np.abs(residual) <= tolerance
+    return {'signal_freq': signal_freq, 'sample_rate': sample_rate, 'predicted': predicted, 'zone': zone,
+            'measured': measured, 'residual': residual, 'residual_bins': residual_bins, 'ok': ok}
+
+
+def read_results(path):
+    '''
+    rows of a sweep results.csv
+    '''
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def measure_peaks(paths, method='gaussian'):
+    '''
+    measures the strongest peak of the first block of many saved captures; files with
+    the same block length and type are stacked and go through one batched fft
+
+    parameters: paths = .npz capture files
+                method = peak interpolation, see peaks.find_peaks
+    returns: rows = one dictionary per file: its scalar metadata plus path and peak_freq
+    '''
+    groups = defaultdict(list)
+    rows = []
+    for path in paths:
+        view, metadata = load_capture(path)
+        block = view[0]
+        row = {key: value for key, value in metadata.items() if np.ndim(value) == 0}
+        row.update({'path': path, 'nsamples': len(block),
+                    'direct_sampling': bool(metadata.get('direct_sampling', not np.iscomplexobj(block)))})
+        rows.append(row)
+        groups[(len(block), np.iscomplexobj(block))].append((len(rows) - 1, block))
+
+    for (nsamples, is_complex), members in groups.items():
+        blocks = np.stack([block - np.mean(block) for _, block in members])
+        # one spectrum in cycles per sample for the whole group, scaled per file afterwards
+        freqs, power = analysis.compute_power_spectra(blocks, 1.0)
+        peak = find_peaks(freqs, power, method=method)
+        for (index, _), freq in zip(members, peak['freq'][:, 0]):
+            rows[index]['peak_freq'] = freq * float(rows[index]['sample_rate'])
+    return rows
+
+
+def summarize(report):
+    '''
+    prints how many predictions matched and the worst residuals
+    '''
+    n = len(report['ok'])
+    print(f"{np.sum(report['ok'])}/{n} peaks within tolerance of the predicted alias")
+    for i in np.argsort(-np.abs(report['residual']))[:5]:
+        if report['ok'][i]:
+            break
+        print(f"  f = {report['signal_freq'][i]/1e3:.1f} kHz, fs = {report['sample_rate'][i]/1e6:.3f} MHz: "
+              f"predicted {report['predicted'][i]/1e3:.2f} kHz (zone {report['zone'][i]}), "
+              f"measured {report['measured'][i]/1e3:.2f} kHz")
@@ -1,14 +1,26 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import ugradio
-import ugradio.dft as dft
 from scipy import signal
+from scipy import fft as sp_fft
 
-def compute_power_spectrum(data, sample_rate, method='fft', freq_oversampling=1):
+from src import filtering
+from src.noise_stats import NoiseStats, adc_codes, adc_histogram, fit_quantized_gaussian
+try:
+    import ugradio
+    import ugradio.dft as dft
+except ImportError:
+    # fft methods still work without ugradio, method='dft' needs it
+    dft = None
+
+def compute_power_spectrum(data, sample_rate, method='fft', freq_oversampling=1, validate=False):
     '''
     power spectrum from time series 
     
     parameters: data=array, sample_rate = sampling rate in Hz, method = dft or fft, 
                 freq_oversampling = for dft only (oversample frequency domain by this factor)
+                validate = for dft only, also run the direct O(N*N_freq) dft and raise if
+                           the fast result differs from it
     returns: freqs = frequency bins in Hz 
              power = power spectrum
              
@@ -23,10 +35,11 @@ def compute_power_spectrum(data, sample_rate, method='fft', freq_oversampling=1)
         freqs = np.fft.fftshift(freqs)
         
     elif method == 'dft':
-        times = np.arange(-N/2, N/2) / sample_rate
         N_freq = N * freq_oversampling
         freqs = np.linspace(-sample_rate/2, sample_rate/2 * (1 - 2/N_freq), N_freq)
-        _, spectrum = dft.dft(data, t-times, f=freqs, vsamp=sample_rate)
+        spectrum = fast_dft(data, sample_rate, freqs)
+        if validate:
+            check_dft(data, sample_rate, freqs, spectrum)
         
     else: 
         raise ValueError("choose either fft or dft")
@@ -35,6 +48,217 @@ def compute_power_spectrum(data, sample_rate, method='fft', freq_oversampling=1)
     
     return freqs, power
 
+
+def direct_dft(data, sample_rate, freqs, max_elements=2**22):
+    '''
+    direct O(N * N_freq) dft with times t = (n - N/2) / sample_rate, the same sum as
+    ugradio.dft.dft; uses ugradio when it is installed
+    
+    the exp(-2 pi i f t) kernel is built for a few frequencies at a time, at most
+    max_elements values (64 MB), so long records don't need an N_freq x N matrix
+    returns: spectrum = complex spectrum, frequency on the first axis
+    '''
+    N = np.shape(data)[-1]
+    times = np.arange(-N/2, N/2) / sample_rate
+    if dft is not None and np.ndim(data) == 1:
+        _, spectrum = dft.dft(data, t=times, f=freqs, vsamp=sample_rate)
+        return np.asarray(spectrum)
+    # complex (I/Q) input keeps its imaginary part
+    data = np.asarray(data)
+    samples = np.moveaxis(data.astype(np.result_type(data, np.complex128), copy=False), -1, 0)
+    freqs = np.asarray(freqs, dtype=float)
+    spectrum = np.empty((len(freqs),) + samples.shape[1:], dtype=complex)
+    step = max(max_elements // max(N, 1), 1)
+    for start in range(0, len(freqs), step):
+        kernel = np.exp(-2j * np.pi * np.outer(freqs[start:start + step], times))
+        spectrum[start:start + step] = kernel @ samples
+    return spectrum
+
+
+def fast_dft(data, sample_rate, freqs):
+    '''
+    O(N log N) replacement for the direct dft on an evenly spaced frequency grid
+    
+    X(f_k) = sum_n x_n exp(-2 pi i f_k t_n),  t_n = (n - N/2) / sample_rate
+    
+    evaluated with a chirp-z transform (Bluestein), so the grid can have any start,
+    spacing and length, e.g. the oversampled grid of compute_power_spectrum. uneven
+    grids fall back to direct_dft.
+    
+    parameters: data = time series, or stacked blocks with time on the last axis
+                sample_rate = sampling rate in Hz
+                freqs = frequencies to evaluate in Hz
+    returns: spectrum = complex spectrum at freqs (frequency on the last axis)
+    '''
+    freqs = np.asarray(freqs, dtype=float)
+    N = np.shape(data)[-1]
+    if len(freqs) > 1:
+        df = freqs[1] - freqs[0]
+        if not np.allclose(np.diff(freqs), df, rtol=1e-9, atol=1e-9 * sample_rate):
+            return np.moveaxis(direct_dft(data, sample_rate, freqs), 0, -1)
+    else:
+        df = 0.0
+    
+    # czt evaluates sum_n x_n a^-n w^(nk) = sum_n x_n exp(-2 pi i (f0 + k df) n / fs)
+    w = np.exp(-2j * np.pi * df / sample_rate)
+    a = np.exp(2j * np.pi * freqs[0] / sample_rate)
+    spectrum = signal.czt(np.asarray(data, dtype=np.result_type(data, np.float64)), m=len(freqs), w=w, a=a, axis=-1)
+    # shift the time origin from n = 0 to n = N/2
+    return spectrum * np.exp(2j * np.pi * freqs * (N / 2) / sample_rate)
+
+
+def check_dft(data, sample_rate, freqs, spectrum, rtol=1e-6):
+    '''
+    validation mode: compares a fast dft against the direct sum
+    raises: ValueError if the largest difference is above rtol * max |X|
+    returns: error = largest difference relative to max |X|
+    '''
+    reference = direct_dft(data, sample_rate, freqs)
+    if np.ndim(data) > 1:
+        reference = np.moveaxis(reference, 0, -1)
+    error = np.max(np.abs(spectrum - reference)) / np.max(np.abs(reference))
+    if error > rtol:
+        raise ValueError(f"fast dft differs from the direct dft by {error:.2e} (relative)")
+    return error
+
+
+def zoom_spectrum(data, sample_rate, center, span, npoints=1024, window=None):
+    '''
+    high resolution power spectrum of just the band center +- span/2 (chirp-z zoom)
+    
+    parameters: data = time series, or stacked blocks with time on the last axis
+                sample_rate = sampling rate in Hz
+                center = middle of the window in Hz, one value or one per block
+                span = width of the window in Hz
+                npoints = number of frequencies across the window
+                window = optional taper, a scipy.signal.get_window name or an array
+    returns: freqs = npoints frequencies in Hz (one row per block if center is per block)
+             power = |X|^2 at freqs (frequency on the last axis)
+    '''
+    data = np.asarray(data)
+    if window is not None:
+        if isinstance(window, str):
+            window = signal.get_window(window, data.shape[-1])
+        data = data * window
+    if np.ndim(center) == 0:
+        freqs = np.linspace(center - span/2, center + span/2, npoints)
+        spectrum = fast_dft(data, sample_rate, freqs)
+        return freqs, np.abs(spectrum)**2
+    
+    # one window per block: mixing each block down by its own start frequency leaves the
+    # same grid (0, df, 2 df, ...) for all of them, so one batched czt does every block
+    start = np.broadcast_to(np.asarray(center, dtype=float), data.shape[:-1]) - span/2
+    N = data.shape[-1]
+    df = span / (npoints - 1) if npoints > 1 else 0.0
+    shifted = data * np.exp(-2j * np.pi * start[..., None] * np.arange(N) / sample_rate)
+    spectrum = signal.czt(shifted, m=npoints, w=np.exp(-2j * np.pi * df / sample_rate), a=1.0, axis=-1)
+    # the time origin only changes the phase, |X|^2 doesn't need the shift fast_dft makes
+    freqs = start[..., None] + df * np.arange(npoints)
+    return freqs, spectrum.real**2 + spectrum.imag**2
+
+
+def zoom_peak(data, sample_rate, coarse_freq=None, span=None, npoints=512, window=None):
+    '''
+    sub-bin peak frequency: finds the peak on the fft grid, then zooms in on it
+    
+    parameters: data = time series, or stacked blocks with time on the last axis
+                sample_rate = sampling rate in Hz
+                coarse_freq = where to zoom, one value or one per block (None = the largest
+                              fft bin of each block, f >= 0 for real data)
+                span = zoom window in Hz (None = 4 fft bins)
+                npoints = zoom resolution
+    returns: peak_freq, peak_power = one value per block
+    '''
+    data = np.asarray(data)
+    N = data.shape[-1]
+    if span is None:
+        span = 4 * sample_rate / N
+    if coarse_freq is None:
+        freqs, power = compute_power_spectra(data, sample_rate, onesided=False)
+        if not np.iscomplexobj(data):
+            power = np.where(freqs >= 0, power, 0)
+        coarse_freq = freqs[np.argmax(power, axis=-1)]
+    
+    centers = np.broadcast_to(np.asarray(coarse_freq, dtype=float), data.shape[:-1])
+    freqs, power = zoom_spectrum(data, sample_rate, centers, span, npoints, window)
+    peak = np.argmax(power, axis=-1)[..., None]
+    return np.take_along_axis(freqs, peak, -1)[..., 0], np.take_along_axis(power, peak, -1)[..., 0]
+
+
+def zoom_fwhm(data, sample_rate, center, span, npoints=2048, window=None):
+    '''
+    line width from a zoomed spectrum instead of the coarse fft grid
+    
+    parameters: center = zoom center in Hz, one value or one per block (e.g. from zoom_peak)
+                span, npoints, window = as in zoom_spectrum
+    returns: fwhm in Hz (one per block), nan where the line doesn't drop to half on both sides
+    '''
+    data = np.asarray(data)
+    centers = np.broadcast_to(np.asarray(center, dtype=float), data.shape[:-1])
+    freqs, power = zoom_spectrum(data, sample_rate, centers, span, npoints, window)
+    
+    # same rule as find_fwhm, for every block at once: last point at or below half
+    # maximum left of the peak, first one right of it
+    index = np.arange(npoints)
+    peak = np.argmax(power, axis=-1)[..., None]
+    below = power <= np.take_along_axis(power, peak, -1) / 2
+    left = np.where(below & (index < peak), index, -1).max(axis=-1)
+    right = np.where(below & (index >= peak), index, npoints).min(axis=-1)
+    found = (left >= 0) & (right < npoints)
+    left_freq = np.take_along_axis(freqs, np.maximum(left, 0)[..., None], -1)[..., 0]
+    right_freq = np.take_along_axis(freqs, np.minimum(right, npoints - 1)[..., None], -1)[..., 0]
+    return np.where(found, right_freq - left_freq, np.nan)
+
+
+def compute_power_spectra(data, sample_rate, axis=-1, onesided=None, precision='single', workers=None):
+    '''
+    power spectra |X|^2 of many blocks in one vectorized call
+    
+    parameters: data = stacked blocks with time along axis, e.g. (nblocks, N); int8, real or complex
+                sample_rate = sampling rate in Hz
+                axis = time axis
+                onesided = True: only f >= 0 (real input only), False: full fftshifted spectrum
+                           like compute_power_spectrum, None: one-sided for real input
+                precision = 'single' (float32/complex64) or 'double'
+                workers = threads for scipy.fft (-1 = all cores)
+    returns: freqs = frequency bins in Hz
+             power = (..., nfreq) power spectra, frequency on the last axis
+    note: real input always uses rfft; the negative half of a two-sided spectrum is
+          mirrored from it rather than computed
+    '''
+    data = np.moveaxis(np.asarray(data), axis, -1)
+    N = data.shape[-1]
+    is_complex = np.iscomplexobj(data)
+    if precision == 'single':
+        data = data.astype(np.complex64 if is_complex else np.float32, copy=False)
+    elif precision == 'double':
+        data = data.astype(np.complex128 if is_complex else np.float64, copy=False)
+    else:
+        raise ValueError("precision must be 'single' or 'double'")
+    if onesided is None:
+        onesided = not is_complex
+    if onesided and is_complex:
+        raise ValueError("one-sided spectra need real input")
+    
+    if is_complex:
+        spectrum = sp_fft.fft(data, axis=-1, workers=workers)
+        power = spectrum.real**2 + spectrum.imag**2
+        return np.fft.fftshift(np.fft.fftfreq(N, d=1/sample_rate)), np.fft.fftshift(power, axes=-1)
+    
+    spectrum = sp_fft.rfft(data, axis=-1, workers=workers)
+    power = spectrum.real**2 + spectrum.imag**2
+    freqs = np.fft.rfftfreq(N, d=1/sample_rate)
+    if onesided:
+        return freqs, power
+    
+    # rebuild the fftshifted two-sided spectrum: P(-f) = P(f) for real data
+    n_neg = N // 2
+    negative = power[..., 1:n_neg + 1][..., ::-1]
+    full_freqs = np.fft.fftshift(np.fft.fftfreq(N, d=1/sample_rate))
+    full = np.concatenate([negative, power[..., :N - n_neg]], axis=-1)
+    return full_freqs, full
+
+
 def compute_voltage_spectra(data, sample_rate): 
     N = len(data)
     spectra = np.fft.fft(data)
@@ -46,64 +270,122 @@ def compute_voltage_spectra(data, sample_rate):
     return freqs, spectrum 
 
 
-def compute_acf(data, max_lag=None):
+def compute_acf(data, max_lag=None, method='auto', average=False):
     '''
     compute autocorrelation function
+    
+    only lags -max_lag..max_lag are computed: by fft (Wiener-Khinchin, zero padded to
+    the next fast length >= N + max_lag so nothing wraps) or, for a few lags, as direct
+    dot products. works on stacked blocks with time on the last axis.
+    
     note: max_lag = max lag to compute
+          method = 'fft', 'direct' or 'auto' (direct when max_lag is small)
+          average = average the (unnormalized) acfs of all blocks before normalizing
     returns: lags = lag indices and acf = autocorrelation normalized values
+             (..., 2*max_lag+1), or (2*max_lag+1,) if averaged
     '''
-    N = len(data)
+    data = np.asarray(data)
+    N = data.shape[-1]
     if max_lag is None: 
         max_lag = N - 1
+    max_lag = min(max_lag, N - 1)
         
-    data_normalized = data - np.mean(data)
+    data_normalized = data - np.mean(data, axis=-1, keepdims=True)
+    is_complex = np.iscomplexobj(data_normalized)
+    
+    nfft = sp_fft.next_fast_len(N + max_lag)
+    if method == 'auto':
+        method = 'direct' if max_lag + 1 <= 2 * np.log2(nfft) else 'fft'
     
-    acf_full = signal.correlate(data_normalized, data_normalized, mode='full')
+    # r[k] = sum_n x[n+k] conj(x[n]) for k = 0..max_lag (same convention as signal.correlate)
+    if method == 'fft':
+        if is_complex:
+            spectrum = sp_fft.fft(data_normalized, nfft, axis=-1)
+            r = sp_fft.ifft(spectrum.real**2 + spectrum.imag**2, axis=-1)[..., :max_lag + 1]
+        else:
+            spectrum = sp_fft.rfft(data_normalized, nfft, axis=-1)
+            r = sp_fft.irfft(spectrum.real**2 + spectrum.imag**2, nfft, axis=-1)[..., :max_lag + 1]
+    elif method == 'direct':
+        r = np.stack([np.sum(data_normalized[..., k:] * np.conj(data_normalized[..., :N - k]), axis=-1)
+                      for k in range(max_lag + 1)], axis=-1)
+    else:
+        raise ValueError("method must be 'fft', 'direct' or 'auto'")
     
-    acf_full = acf_full / acf_full[N-1]
+    if average:
+        r = r.reshape(-1, max_lag + 1).mean(axis=0)
     
-    center = N-1 
+    r = r / r[..., :1]
+    # negative lags: r[-k] = conj(r[k])
+    acf = np.concatenate([np.conj(r[..., :0:-1]), r], axis=-1)
+    if not is_complex:
+        acf = acf.real
     lags = np.arange(-max_lag, max_lag +1)
-    acf = acf_full[center - max_lag : center + max_lag + 1]
     
     return lags, acf
 
-def fourier_filter(data, sample_rate, freq_range_to_zero): 
+def fourier_filter(data, sample_rate, freq_range_to_zero, block_size=None, ntaps=255): 
     
     '''
     removes frequency range by zeroing in Fourier domain
     note: freq_range_to_zero = freq range to remove in Hz
+          block_size = None zeroes the band in one fft of the whole record (rfft for real
+                       data); otherwise the record is streamed through an ntaps FIR band-stop
+                       by overlap-save in blocks of block_size (constant memory, see
+                       src.filtering for iterators and live streams)
     returns: filtered time series 
     '''
+    if block_size is not None:
+        taps = filtering.design_taps(sample_rate, freq_range_to_zero, mode='stop', ntaps=ntaps)
+        return filtering.apply_filter(data, taps, block_size=block_size)
     
-    spectrum = np.fft.fft(data)
-    freqs = np.fft.fftfreq(len(data), d=1/sample_rate)
+    N = np.shape(data)[-1]
+    real = not np.iscomplexobj(data)
+    if real:
+        spectrum = sp_fft.rfft(data)
+        freqs = np.fft.rfftfreq(N, d=1/sample_rate)
+    else:
+        spectrum = sp_fft.fft(data)
+        freqs = np.fft.fftfreq(N, d=1/sample_rate)
     
     #filter mask
-    f_low, f_high = freq_range_to_zero
-    mask = (np.abs(freqs) < f_low) | (np.abs(freqs)>f_high)
+    mask = filtering.band_mask(np.abs(freqs), freq_range_to_zero, mode='stop')
     
     spectrum_filtered = spectrum * mask
     
+    if real:
+        filtered = sp_fft.irfft(spectrum_filtered, N)
+    else:
+        filtered = sp_fft.ifft(spectrum_filtered)
     return filtered
 
 def analyze_noise_stats(data):
     '''
     analyzes statistical properties of noise data
+    note: one pass through NoiseStats; use NoiseStats directly to accumulate over blocks
     '''
-    stats = {'mean': np.mean(data), 
-             'std': np.std(data),
-             'variance': np.var(data),
-             'min': np.min(data),
-             'max': np.max(data),
-             'rms': np.sqrt(np.mean(data**2))}
+    result = NoiseStats().update(data).result()
+    stats = {key: result[key] for key in ('mean', 'std', 'variance', 'min', 'max', 'rms')}
     return stats
 
-def fit_gaussian(data, bins=50):
+def fit_gaussian(data, bins=50, quantized=False):
     '''
     gaussian to data histograms
+    note: quantized = for int8 ADC samples, histogram the 256 codes exactly with a
+          bincount and fit a quantized gaussian by maximum likelihood (bins is ignored);
+          noise_stats.fit_quantized_gaussian / code_flags give the fit quality and
+          stuck, missing and clipped codes
     returns: hist = histogram counts, bin_centers = bin centers, gaussian fits
     '''
+    if quantized:
+        counts = adc_histogram(data)
+        fit = fit_quantized_gaussian(counts)
+        used = np.nonzero(counts)[0]
+        codes = slice(used[0], used[-1] + 1)
+        hist = counts[codes] / counts.sum()
+        bin_centers = adc_codes[codes]
+        gaussian_fit = fit['expected'][codes] / counts.sum()
+        return hist, bin_centers, gaussian_fit
+    
     hist, bin_edges = np.histogram(data, bins=bins, density=True)
     bin_centers = (bin_edges[:-1] + bin_edges[1:]) / 2
     
@@ -113,40 +395,103 @@ def fit_gaussian(data, bins=50):
     
     return hist, bin_centers, gaussian_fit
 
-def compute_snr_v_averaging(data_blocks):
+def _snr_curve(spectra):
+    '''
+    SNR (max / std of the averaged spectrum) after averaging the first 1..nblocks
+    spectra, from one cumulative sum
+    '''
+    n = np.arange(1, len(spectra) + 1)[:, None]
+    averaged = np.cumsum(spectra, axis=0) / n
+    return averaged.max(axis=1) / averaged.std(axis=1)
+
+
+_bootstrap_spectra = None
+
+
+def _init_bootstrap(spectra):
+    global _bootstrap_spectra
+    _bootstrap_spectra = spectra
+
+
+def _bootstrap_curves(seeds):
+    '''
+    snr curves for one random block ordering per seed (runs in a worker process)
+    '''
+    spectra = _bootstrap_spectra
+    return np.array([_snr_curve(spectra[np.random.default_rng(seed).permutation(len(spectra))])
+                     for seed in seeds])
+
+
+def compute_snr_curve(data_blocks, sample_rate=None, metadata=None, n_boot=0, ci=0.68, workers=None, seed=None):
+    '''
+    SNR vs number of averaged blocks for every N = 1..nblocks, with bootstrap error bars
+    
+    parameters: data_blocks = (nblocks, N) time series blocks
+                sample_rate = sampling rate in Hz (None = metadata['sample_rate'])
+                metadata = capture metadata, e.g. from storage.load_capture
+                n_boot = number of random block orderings for the confidence interval (0 = none)
+                ci = confidence level of the interval
+                workers = processes for the bootstrap (None = all cores, 1 = no pool); the
+                          result for a given seed is the same for any number of workers
+                seed = random seed
+    returns: dictionary with navg (1..nblocks), snr, snr_low and snr_high (if n_boot),
+             the 1/sqrt(N) expectation scaled to N=1 (radiometer), and freqs
+    '''
+    if sample_rate is None:
+        if metadata is None or 'sample_rate' not in metadata:
+            raise ValueError("give sample_rate or metadata with a sample_rate")
+        sample_rate = float(metadata['sample_rate'])
+    
+    # ** 0.25 gives the sqrt(|X|) scaling of compute_power_spectrum
+    freqs, spectra = compute_power_spectra(data_blocks, sample_rate, onesided=False, precision='double')
+    spectra = spectra ** 0.25
+    nblocks = len(spectra)
+    navg = np.arange(1, nblocks + 1)
+    snr = _snr_curve(spectra)
+    results = {'navg': navg, 'snr': snr, 'radiometer': snr[0] * np.sqrt(navg), 'freqs': freqs}
+    
+    if n_boot:
+        # one seed per ordering, so the result doesn't depend on how many workers share them
+        seeds = np.random.SeedSequence(seed).spawn(n_boot)
+        workers = min(workers or os.cpu_count() or 1, n_boot)
+        if workers == 1:
+            _init_bootstrap(spectra)
+            curves = _bootstrap_curves(seeds)
+        else:
+            split = np.linspace(0, n_boot, workers + 1).astype(int)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_bootstrap,
+                                     initargs=(spectra,)) as pool:
+                curves = np.concatenate(list(pool.map(_bootstrap_curves,
+                                                      [seeds[a:b] for a, b in zip(split[:-1], split[1:])])))
+        tail = (1 - ci) / 2 * 100
+        results['snr_low'], results['snr_high'] = np.percentile(curves, [tail, 100 - tail], axis=0)
+    
+    return results
+
+
+def compute_snr_v_averaging(data_blocks, sample_rate=None, metadata=None):
     '''
     computes SNR improvement w/ averaging
+    note: sample_rate = sampling rate in Hz (None = metadata['sample_rate'], else 2.4e6);
+          compute_snr_curve gives every N with error bars
     '''
+    if sample_rate is None:
+        sample_rate = float(metadata['sample_rate']) if metadata is not None else 2.4e6
     nblocks = data_blocks.shape[0]
-    sample_rate = 2.4e6
     
-    all_spectra = []
-    for block in data_blocks:
-        freqs, power = compute_power_spectrum(block, sample_rate)
-        all_spectra.append(power)
-        
-    all_spectra = np.array(all_spectra)
+    # all blocks in one call; ** 0.25 gives the sqrt(|X|) scaling of compute_power_spectrum
+    freqs, all_spectra = compute_power_spectra(data_blocks, sample_rate, onesided=False, precision='double')
+    all_spectra = all_spectra ** 0.25
     
-    n_avg_list = [1, 2, 4, 8, 16]
-    snr_values = []
-    
-    for n_avg in n_avg_list: 
-        if n_avg > nblocks:
-            break
-            
-        avg_spectrum = np.mean(all_spectra[:n_avg], axis=0)
-        
-        #SNR estimation (signal power/ noise std)
-        signal_power = np.max(avg_spectrum)
-        noise_std = np.std(avg_spectrum)
-        snr = signal_power/noise_std
-        snr_values.append(snr)
+    n_avg_list = [n for n in [1, 2, 4, 8, 16] if n <= nblocks]
+    snr_curve = _snr_curve(all_spectra)
+    snr_values = [snr_curve[n_avg - 1] for n_avg in n_avg_list]
         
-    results = {'navg': n_avg_list[:len(snr_values)],
+    results = {'navg': n_avg_list,
                'snr': snr_values,
                'freqs': freqs,
                'averaged_spectra': [np.mean(all_spectra[:n], axis=0)
-                                    for n in n_avg_list[:len(snr_values)]]
+                                    for n in n_avg_list]
     }
 
     return results
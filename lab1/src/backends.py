@@ -0,0 +1,279 @@
+'''
+hardware-free stand-ins for ugradio.sdr.SDR
+
+both classes take the same constructor arguments as ugradio.sdr.SDR and have the same
+capture_data(nsamples, nblocks) contract, so they can be handed to SDRSession as a backend:
+
+    from functools import partial
+    from src.acquiring_data import SDRSession, capture_ng
+    from src.backends import SimulatedSDR
+
+    with SDRSession(backend=partial(SimulatedSDR, signal='noise')) as session:
+        data, metadata = capture_ng(sample_rate=3e6, nblocks=16, session=session)
+
+direct sampling gives int8 arrays of shape (nblocks, nsamples), I/Q mode gives
+(nblocks, nsamples, 2) like the real sdr.
+'''
+
+import glob
+import json
+import os
+import time
+import numpy as np
+
+from src.catalog import read_metadata
+
+
+def _quantize(x):
+    '''
+    rounds and clips to the sdr's int8 ADC codes
+    '''
+    return np.clip(np.round(x), -128, 127).astype(np.int8)
+
+
+class _RateLimiter:
+    '''
+    sleeps so samples are not handed out faster than the sample rate
+    '''
+
+    def __init__(self):
+        self.deadline = None
+
+    def wait(self, nsamples, sample_rate):
+        now = time.perf_counter()
+        if self.deadline is None or self.deadline < now:
+            self.deadline = now
+        self.deadline += nsamples / sample_rate
+        delay = self.deadline - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class SimulatedSDR:
+    '''
+    synthetic sdr: int8-quantized sine, gaussian noise or I/Q mixer output
+
+    parameters: device_index, direct, center_freq, sample_rate, gain, fir_coeffs = same as ugradio.sdr.SDR
+                signal = 'sine', 'noise' or 'mixer'
+                signal_freq = sine frequency in Hz (RF frequency for 'mixer')
+                amplitude = sine amplitude in ADC codes
+                noise_std = gaussian noise std in ADC codes
+                rate_limit = if True, capture_data takes as long as the real sdr would
+                seed = random seed (devices with the same seed see the same noise)
+                sample_offset = start this many samples into the stream, to fake a clock
+                                offset between devices
+    note: the anti-aliasing filter is not modelled, fir_coeffs is only recorded
+    '''
+
+    def __init__(self, device_index=0, direct=True, center_freq=1420e6, sample_rate=2.2e6, gain=0,
+                 fir_coeffs=None, signal='sine', signal_freq=1e5, amplitude=40, noise_std=4,
+                 rate_limit=False, seed=None, sample_offset=0):
+        if signal not in ('sine', 'noise', 'mixer'):
+            raise ValueError("signal must be 'sine', 'noise' or 'mixer'")
+        self.device_index = device_index
+        self.direct = direct
+        self.center_freq = center_freq
+        self.sample_rate = sample_rate
+        self.gain = gain
+        self.fir_coeffs = fir_coeffs
+        self.signal = signal
+        self.signal_freq = signal_freq
+        self.amplitude = amplitude
+        self.noise_std = noise_std
+        self.rate_limit = rate_limit
+        self.rng = np.random.default_rng(seed)
+        self._limiter = _RateLimiter()
+        # sample counter so the sine phase is continuous between captures
+        self._n = 0
+        if sample_offset:
+            self.capture_data(nsamples=sample_offset, nblocks=1)
+
+    def set_direct_sampling(self, mode):
+        self.direct = bool(mode)
+
+    def set_fir_coeffs(self, coeffs):
+        self.fir_coeffs = np.asarray(coeffs)
+
+    def capture_data(self, nsamples=2048, nblocks=1):
+        total = nsamples * nblocks
+        if self.rate_limit:
+            self._limiter.wait(total, self.sample_rate)
+        t = (self._n + np.arange(total)) / self.sample_rate
+        self._n += total
+
+        if self.direct:
+            x = self.rng.normal(0, self.noise_std, total)
+            if self.signal != 'noise':
+                x += self.amplitude * np.cos(2 * np.pi * self.signal_freq * t)
+            return _quantize(x).reshape(nblocks, nsamples)
+
+        iq = self.rng.normal(0, self.noise_std, (total, 2))
+        if self.signal != 'noise':
+            # mixing down by the LO leaves the offset frequency at baseband
+            phase = 2 * np.pi * (self.signal_freq - self.center_freq) * t
+            iq[:, 0] += self.amplitude * np.cos(phase)
+            iq[:, 1] += self.amplitude * np.sin(phase)
+        return _quantize(iq).reshape(nblocks, nsamples, 2)
+
+    def close(self):
+        pass
+
+
+class ReplaySDR:
+    '''
+    replays saved .npz captures as if they were coming off the sdr
+
+    the 'data' arrays of the matching files are played back as one sample stream and
+    capture_data hands out consecutive pieces of it, looping back to the start when
+    it runs out. only captures taken with the same settings are joined: sample_rate,
+    filter_bypassed, signal_freq and nsamples (if given) pick the files, and the files
+    left must agree on all of them and on lo_freq, otherwise ValueError. a file that
+    doesn't store a setting matches any value of it.
+
+    only the file headers are read up front; samples are loaded one file at a time as
+    the stream reaches it. retuning works like the real sdr: setting sample_rate or
+    new fir_coeffs (the pass-through taps mean bypassed) picks the files taken with the
+    new settings and starts them from the beginning at the next capture_data (so several
+    settings can change in turn), or raises there if there are none, so data is never
+    replayed under the wrong settings.
+
+    parameters: source = .npz file, directory (searched recursively) or glob pattern
+                device_index, direct, center_freq, sample_rate, gain, fir_coeffs = same as ugradio.sdr.SDR
+                    (sample_rate = None takes the rate stored in the files)
+                filter_bypassed = only replay bypassed (True) or filtered (False) captures
+                                  (None = from fir_coeffs if given, else any)
+                signal_freq = only replay captures of this tone frequency in Hz (None = any)
+                nsamples = only replay captures with this block length (None = any)
+                rate_limit = if True, capture_data takes as long as the real sdr would
+                loop = start over at the end of the files (otherwise raise EOFError)
+    '''
+
+    # settings a file is selected by, in the order they are reported
+    keys = ('sample_rate', 'filter_bypassed', 'signal_freq', 'nsamples', 'lo_freq')
+
+    def __init__(self, source, device_index=0, direct=True, center_freq=1420e6, sample_rate=None, gain=0,
+                 fir_coeffs=None, filter_bypassed=None, signal_freq=None, nsamples=None, rate_limit=False,
+                 loop=True):
+        if os.path.isdir(source):
+            files = sorted(glob.glob(os.path.join(source, '**', '*.npz'), recursive=True))
+        else:
+            files = sorted(glob.glob(source))
+        if not files:
+            raise FileNotFoundError(f"no .npz captures found in {source}")
+
+        # settings and length of every file, from the npz fields and the .npy header only
+        self.index = []
+        for file in files:
+            info = read_metadata(file)
+            shape = json.loads(info['shape'])
+            iq = len(shape) == 3 and shape[-1] == 2
+            if 'nsamples' not in info:
+                info['nsamples'] = shape[-2] if iq else shape[-1]
+            self.index.append({'file': file, 'settings': tuple(info.get(key) for key in self.keys), 'iq': iq,
+                               'length': int(np.prod(shape[:-1] if iq else shape))})
+
+        if filter_bypassed is None and fir_coeffs is not None:
+            filter_bypassed = _bypasses_filter(fir_coeffs)
+        self.source = source
+        self.wanted = {'sample_rate': sample_rate, 'filter_bypassed': filter_bypassed,
+                       'signal_freq': signal_freq, 'nsamples': nsamples, 'lo_freq': None}
+        self.center_freq = center_freq
+        self.gain = gain
+        self.fir_coeffs = None if fir_coeffs is None else np.asarray(fir_coeffs)
+        self.rate_limit = rate_limit
+        self.loop = loop
+        self._limiter = _RateLimiter()
+        self._select()
+
+    def _select(self):
+        '''
+        picks the files matching self.wanted and rewinds to the first of them
+        '''
+        selected = [entry for entry in self.index
+                    if not any(value is not None and want is not None and value != want
+                               for value, want in zip(entry['settings'], self.wanted.values()))]
+        if not selected:
+            asked = ', '.join(f"{key}={value}" for key, value in self.wanted.items() if value is not None)
+            raise FileNotFoundError(f"no captures in {self.source} match {asked or 'the settings'}")
+        settings = {entry['settings'] for entry in selected}
+        if len(settings) > 1:
+            found = '; '.join(', '.join(f"{key}={value}" for key, value in zip(self.keys, setting))
+                              for setting in sorted(settings, key=str))
+            raise ValueError(f"captures in {self.source} were taken with different settings: {found}; "
+                             f"pass sample_rate / filter_bypassed / signal_freq / nsamples or a narrower pattern")
+        if len({entry['iq'] for entry in selected}) > 1:
+            raise ValueError("cannot replay real and I/Q captures together")
+
+        self.files = [entry['file'] for entry in selected]
+        self._lengths = np.array([entry['length'] for entry in selected])
+        self.direct = not selected[0]['iq']
+        rate = settings.pop()[0]
+        self._sample_rate = rate if self.wanted['sample_rate'] is None else self.wanted['sample_rate']
+        self._file = 0
+        self._offset = 0
+        self._loaded = (None, None)
+        self._retuned = False
+
+    @property
+    def sample_rate(self):
+        return self._sample_rate
+
+    @sample_rate.setter
+    def sample_rate(self, value):
+        if value != self._sample_rate:
+            self.wanted['sample_rate'] = value
+            self._sample_rate = value
+            self._retuned = True
+
+    def set_direct_sampling(self, mode):
+        pass
+
+    def set_fir_coeffs(self, coeffs):
+        self.fir_coeffs = np.asarray(coeffs)
+        bypassed = _bypasses_filter(self.fir_coeffs)
+        if bypassed != self.wanted['filter_bypassed']:
+            self.wanted['filter_bypassed'] = bypassed
+            self._retuned = True
+
+    def _samples(self, index):
+        # one file in memory at a time, flattened to a sample stream
+        if self._loaded[0] != index:
+            data = np.load(self.files[index])['data']
+            self._loaded = (index, data.reshape(-1) if self.direct else data.reshape(-1, 2))
+        return self._loaded[1]
+
+    def capture_data(self, nsamples=2048, nblocks=1):
+        if self._retuned:
+            self._select()
+        total = nsamples * nblocks
+        if self.rate_limit:
+            self._limiter.wait(total, self.sample_rate)
+        if not self.loop and total > self._lengths[self._file:].sum() - self._offset:
+            raise EOFError("replay ran out of samples")
+        pieces = []
+        need = total
+        while need:
+            if self._file == len(self.files):
+                self._file = 0
+            samples = self._samples(self._file)
+            piece = samples[self._offset:self._offset + need]
+            pieces.append(piece)
+            need -= len(piece)
+            self._offset += len(piece)
+            if self._offset == len(samples):
+                # without looping the position stays past the last file, so the next read raises
+                self._file += 1
+                self._offset = 0
+        data = np.concatenate(pieces)
+        return data.reshape((nblocks, nsamples) + data.shape[1:])
+
+    def close(self):
+        self._loaded = (None, None)
+
+
+def _bypasses_filter(coeffs):
+    '''
+    True for the pass-through taps (a single impulse) used to bypass the anti-aliasing filter
+    '''
+    coeffs = np.asarray(coeffs)
+    return bool(not np.any(coeffs[:-1]) and coeffs[-1] != 0)
@@ -0,0 +1,192 @@
+'''
+sqlite catalog of saved captures
+
+scans the capture folders once, reads each file's metadata (and the data shape from
+the .npy header inside the npz, without loading the samples) and keeps it in a sqlite
+index. rebuilding only re-reads files that are new or changed.
+
+    from src import catalog
+    catalog.build_catalog('.', 'captures.sqlite')
+    rows = catalog.find('captures.sqlite', filter_bypassed=True, sample_rate_min=2e6, signal_freq=1e6)
+'''
+
+import json
+import os
+import re
+import sqlite3
+import zipfile
+import numpy as np
+
+columns = {'path': 'TEXT PRIMARY KEY', 'folder': 'TEXT', 'kind': 'TEXT', 'filter_bypassed': 'INTEGER',
+           'signal_freq': 'REAL', 'sample_rate': 'REAL', 'lo_freq': 'REAL', 'nsamples': 'INTEGER',
+           'nblocks': 'INTEGER', 'direct_sampling': 'INTEGER', 'timestamp': 'TEXT', 'dtype': 'TEXT',
+           'shape': 'TEXT', 'mtime': 'REAL', 'size': 'INTEGER'}
+
+_sci = r'(\d+p\d+e\d+)'
+_ts = r'(?:_(\d{8}_\d{6}))?'
+filename_patterns = [
+    # filtered_f7p500e05_sr1p000e06_20260204_152618.npz, bypassed_f100000_sr1000000.npz
+    (re.compile(r'^(filtered|bypassed)_f(\d+p\d+e\d+|\d+)_sr(\d+p\d+e\d+|\d+)' + _ts + r'\.npz$'),
+     ('kind', 'signal_freq', 'sample_rate', 'timestamp')),
+    # noise_sr3p000e06_1p600e01_samples1p638e04_20260204_232836.npz
+    (re.compile(r'^noise_sr' + _sci + '_' + _sci + '_samples' + _sci + _ts + r'\.npz$'),
+     ('sample_rate', 'nblocks', 'nsamples', 'timestamp')),
+    # noise_f1p600e01_samples1p638e04_20260204_165743.npz (older name, f was the block count)
+    (re.compile(r'^noise_f' + _sci + '_samples' + _sci + _ts + r'\.npz$'),
+     ('nblocks', 'nsamples', 'timestamp')),
+    # mixer_sr2p400e06_lo_freq1p000e08_samples1p638e04_20260206_014241.npz
+    (re.compile(r'^mixer_sr' + _sci + '_lo_freq' + _sci + '_samples' + _sci + _ts + r'\.npz$'),
+     ('sample_rate', 'lo_freq', 'nsamples', 'timestamp')),
+]
+
+
+def from_sci(text):
+    '''
+    inverse of sci_filename: 2p400e06 -> 2.4e6
+    '''
+    return float(text.replace('p', '.').replace('m', '-'))
+
+
+def parse_filename(filename):
+    '''
+    reads the capture parameters encoded in a file name
+    returns: dictionary of the fields found (empty if the name doesn't match)
+    '''
+    for pattern, fields in filename_patterns:
+        match = pattern.match(filename)
+        if match is None:
+            continue
+        info = {}
+        for field, value in zip(fields, match.groups()):
+            if value is None:
+                continue
+            if field == 'kind':
+                info['kind'] = value
+                info['filter_bypassed'] = value == 'bypassed'
+            elif field == 'timestamp':
+                info['timestamp'] = value
+            else:
+                info[field] = from_sci(value)
+        if 'kind' not in info:
+            info['kind'] = filename.split('_')[0]
+        return info
+    return {}
+
+
+def read_metadata(path):
+    '''
+    metadata fields of one .npz capture plus the dtype and shape of its data, read
+    from the array header so the samples are never loaded
+    '''
+    info = {}
+    with zipfile.ZipFile(path) as archive:
+        for name in archive.namelist():
+            key = name[:-4]
+            with archive.open(name) as member:
+                if key == 'data':
+                    version = np.lib.format.read_magic(member)
+                    if version == (1, 0):
+                        shape, _, dtype = np.lib.format.read_array_header_1_0(member)
+                    else:
+                        shape, _, dtype = np.lib.format.read_array_header_2_0(member)
+                    info['shape'] = json.dumps(list(shape))
+                    info['dtype'] = str(dtype)
+                elif key in columns:
+                    value = np.lib.format.read_array(member)
+                    if value.shape == ():
+                        info[key] = value.item()
+    if 'shape' in info and 'nblocks' not in info:
+        shape = json.loads(info['shape'])
+        info['nblocks'] = shape[0] if len(shape) > 1 else 1
+    return info
+
+
+def _connect(db_path):
+    connection = sqlite3.connect(db_path)
+    definition = ', '.join(f'{name} {kind}' for name, kind in columns.items())
+    connection.execute(f'CREATE TABLE IF NOT EXISTS captures ({definition})')
+    return connection
+
+
+def build_catalog(root='.', db_path='captures.sqlite'):
+    '''
+    scans every .npz under root and updates the catalog; unchanged files are skipped
+    and files that disappeared are removed
+    returns: counts = dictionary with added/updated, unchanged and removed file counts
+    '''
+    connection = _connect(db_path)
+    known = {path: (mtime, size) for path, mtime, size in
+             connection.execute('SELECT path, mtime, size FROM captures')}
+    seen = set()
+    counts = {'updated': 0, 'unchanged': 0, 'removed': 0}
+
+    for folder, _, files in os.walk(root):
+        for filename in sorted(files):
+            if not filename.endswith('.npz') or '.ipynb_checkpoints' in folder:
+                continue
+            path = os.path.relpath(os.path.join(folder, filename), root)
+            seen.add(path)
+            stat = os.stat(os.path.join(root, path))
+            if known.get(path) == (stat.st_mtime, stat.st_size):
+                counts['unchanged'] += 1
+                continue
+
+            row = parse_filename(filename)
+            try:
+                row.update(read_metadata(os.path.join(root, path)))
+            except (zipfile.BadZipFile, ValueError) as e:
+                print(f"skipping {path}: {e}")
+                continue
+            row.update({'path': path, 'folder': os.path.dirname(path), 'mtime': stat.st_mtime,
+                        'size': stat.st_size})
+            row = {key: value for key, value in row.items() if key in columns}
+            names = ', '.join(row)
+            connection.execute(f'INSERT OR REPLACE INTO captures ({names}) VALUES ({", ".join("?" * len(row))})',
+                               list(row.values()))
+            counts['updated'] += 1
+
+    for path in set(known) - seen:
+        connection.execute('DELETE FROM captures WHERE path = ?', (path,))
+        counts['removed'] += 1
+    connection.commit()
+    connection.close()
+    print(f"Catalog {db_path}: {counts['updated']} added/updated, {counts['unchanged']} unchanged, "
+          f"{counts['removed']} removed")
+    return counts
+
+
+def query(db_path, where='', params=()):
+    '''
+    runs a SELECT on the catalog
+    parameters: where = sql condition, e.g. "kind = 'bypassed' AND sample_rate >= ?"
+                params = values for the ? placeholders
+    returns: rows = list of dictionaries
+    '''
+    connection = _connect(db_path)
+    connection.row_factory = sqlite3.Row
+    sql = 'SELECT * FROM captures' + (f' WHERE {where}' if where else '') + ' ORDER BY path'
+    rows = [dict(row) for row in connection.execute(sql, params)]
+    connection.close()
+    return rows
+
+
+def find(db_path, **filters):
+    '''
+    keyword version of query: column=value matches exactly, column_min / column_max
+    give inclusive bounds
+        find('captures.sqlite', filter_bypassed=True, sample_rate_min=2e6, signal_freq=1e6)
+    '''
+    conditions = []
+    params = []
+    for key, value in filters.items():
+        # column names go into the sql text, so only names from the columns table are allowed
+        if key.endswith('_min') and key[:-4] in columns:
+            conditions.append(f'{key[:-4]} >= ?')
+        elif key.endswith('_max') and key[:-4] in columns:
+            conditions.append(f'{key[:-4]} <= ?')
+        elif key in columns:
+            conditions.append(f'{key} = ?')
+        else:
+            raise ValueError(f"unknown catalog column in {key!r}")
+        params.append(value)
+    return query(db_path, ' AND '.join(conditions), params)
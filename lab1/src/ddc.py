@@ -0,0 +1,218 @@
+'''
+digital down-converter for I/Q mixer data
+
+shifts a chosen frequency to 0 Hz with a numerically controlled oscillator (NCO), then
+low-pass filters and decimates with either an FIR or a CIC decimator. every stage
+keeps its state between blocks, so a record fed in pieces gives the same output as
+the whole record at once.
+
+    ddc = DDC(sample_rate=2.4e6, shift_freq=150e3, decimation=32)
+    for index, timestamp, block in stream_iq_mixer(lo_freq=100e6):
+        baseband = ddc.process(block)          # complex, 75 kS/s around lo_freq + 150 kHz
+
+    data, metadata = ddc_file('mixer_sr2p400e06_lo_freq1p000e08_....npz', 150e3, 32)
+'''
+
+import numpy as np
+from scipy import signal
+
+from src.storage import load_capture, unpack_iq
+
+
+class NCO:
+    '''
+    complex oscillator that multiplies a stream by exp(-2 pi i f t), phase continuous
+    across blocks
+
+    parameters: freq = frequency moved to 0 Hz
+                sample_rate = sampling rate in Hz
+    '''
+
+    def __init__(self, freq, sample_rate):
+        self.freq = freq
+        self.sample_rate = sample_rate
+        self.phase = 0.0
+
+    def mix(self, x):
+        n = np.arange(len(x))
+        step = -2 * np.pi * self.freq / self.sample_rate
+        y = x * np.exp(1j * (self.phase + step * n))
+        # keep the phase wrapped so it does not lose precision on long runs
+        self.phase = np.mod(self.phase + step * len(x), 2 * np.pi)
+        return y
+
+
+def decimation_taps(decimation, taps_per_phase=24, window=('kaiser', 8.0)):
+    '''
+    low-pass FIR for decimating by `decimation`, cutoff at the output Nyquist frequency
+
+    returns: taps = (decimation * taps_per_phase,) real taps with unity dc gain
+    '''
+    return signal.firwin(decimation * taps_per_phase, 1 / decimation, window=window)
+
+
+class FIRDecimator:
+    '''
+    streaming FIR low-pass + decimation; only every decimation-th output is computed,
+    which is the saving a polyphase decimator makes
+
+    parameters: decimation = integer decimation factor
+                taps = FIR taps (None = decimation_taps(decimation))
+    '''
+
+    def __init__(self, decimation, taps=None):
+        self.decimation = decimation
+        self.taps = decimation_taps(decimation) if taps is None else np.asarray(taps)
+        self._reversed = self.taps[::-1].copy()
+        self.reset()
+
+    def reset(self):
+        self._history = None
+        # index (in the next buffer) of the last input sample of the next output
+        self._next = len(self.taps) - 1
+
+    def process(self, x):
+        ntaps = len(self.taps)
+        if self._history is None:
+            self._history = np.zeros(ntaps - 1, dtype=np.result_type(x, self.taps))
+        buffer = np.concatenate([self._history, x])
+        ends = np.arange(self._next, len(buffer), self.decimation)
+        if len(ends):
+            windows = np.lib.stride_tricks.sliding_window_view(buffer, ntaps)
+            y = windows[ends - (ntaps - 1)] @ self._reversed
+        else:
+            y = np.zeros(0, dtype=buffer.dtype)
+        keep = ntaps - 1
+        self._next = (ends[-1] + self.decimation if len(ends) else self._next) - (len(buffer) - keep)
+        self._history = buffer[len(buffer) - keep:]
+        return y
+
+
+class CICDecimator:
+    '''
+    streaming cascaded integrator-comb decimator: no multiplies, exact integer
+    arithmetic (the int64 integrators may wrap, which the combs undo)
+
+    parameters: decimation = integer decimation factor
+                stages = number of integrator / comb pairs
+                differential_delay = comb delay in decimated samples
+                scale_bits = input is scaled by 2**scale_bits and rounded before integration
+    note: the passband droops like sinc^stages; follow with a short FIR to flatten it
+    '''
+
+    def __init__(self, decimation, stages=3, differential_delay=1, scale_bits=12):
+        self.decimation = decimation
+        self.stages = stages
+        self.delay = differential_delay
+        self.scale = 2.0**scale_bits
+        self.gain = (decimation * differential_delay)**stages
+        self.reset()
+
+    def reset(self):
+        self._integrators = np.zeros((2, self.stages), dtype=np.int64)
+        self._combs = np.zeros((2, self.stages, self.delay), dtype=np.int64)
+        self._phase = self.decimation - 1
+
+    def _run(self, x, part):
+        y = x
+        with np.errstate(over='ignore'):
+            for stage in range(self.stages):
+                y = np.cumsum(y, dtype=np.int64) + self._integrators[part, stage]
+                if len(y):
+                    self._integrators[part, stage] = y[-1]
+            y = y[self._phase::self.decimation]
+            for stage in range(self.stages):
+                z = np.concatenate([self._combs[part, stage], y])
+                y = z[self.delay:] - z[:-self.delay]
+                self._combs[part, stage] = z[len(z) - self.delay:]
+        return y
+
+    def process(self, x):
+        x = np.asarray(x)
+        real = np.round(np.real(x) * self.scale).astype(np.int64)
+        y = self._run(real, 0).astype(np.float64)
+        if np.iscomplexobj(x):
+            imag = np.round(np.imag(x) * self.scale).astype(np.int64)
+            y = y + 1j * self._run(imag, 1)
+        self._phase = (self._phase - len(x)) % self.decimation
+        return y / (self.gain * self.scale)
+
+
+class DDC:
+    '''
+    NCO shift + decimating low-pass, streaming
+
+    parameters: sample_rate = input sampling rate in Hz
+                shift_freq = baseband frequency (offset from the LO) moved to 0 Hz
+                decimation = integer decimation factor
+                method = 'fir' or 'cic'
+                taps = FIR taps for method='fir' (None = decimation_taps)
+                stages = CIC stages for method='cic'
+    '''
+
+    def __init__(self, sample_rate, shift_freq=0.0, decimation=16, method='fir', taps=None, stages=3):
+        self.sample_rate = sample_rate
+        self.shift_freq = shift_freq
+        self.decimation = decimation
+        self.method = method
+        self.nco = NCO(shift_freq, sample_rate)
+        if method == 'fir':
+            self.decimator = FIRDecimator(decimation, taps)
+        elif method == 'cic':
+            self.decimator = CICDecimator(decimation, stages)
+        else:
+            raise ValueError("method must be 'fir' or 'cic'")
+
+    @property
+    def output_rate(self):
+        return self.sample_rate / self.decimation
+
+    def reset(self):
+        self.nco.phase = 0.0
+        self.decimator.reset()
+
+    def process(self, block):
+        '''
+        down-converts the next block of the stream
+        parameters: block = 1-D real or complex samples, or an (nsamples, 2) int8 I/Q block
+        returns: complex baseband samples at output_rate (about len(block) / decimation of them)
+        '''
+        x = np.asarray(block)
+        if x.ndim == 2 and x.shape[-1] == 2:
+            x = unpack_iq(x, dtype=np.complex128)
+        return self.decimator.process(self.nco.mix(x.astype(np.result_type(x, np.float64), copy=False)))
+
+    def metadata(self, metadata=None):
+        '''
+        capture metadata updated for the decimated output
+        '''
+        out = dict(metadata or {})
+        center = float(out.get('lo_freq', 0)) + self.shift_freq
+        out.update({'sample_rate': self.output_rate, 'input_sample_rate': self.sample_rate,
+                    'ddc_shift_freq': self.shift_freq, 'decimation': self.decimation,
+                    'ddc_method': self.method, 'center_freq': center})
+        return out
+
+
+def ddc_stream(source, ddc):
+    '''
+    runs a block iterator through a DDC
+    parameters: source = iterable of blocks, or of (index, timestamp, block) tuples from
+                         stream_iq_mixer / stream_ng
+    yields: decimated complex blocks
+    '''
+    for item in source:
+        yield ddc.process(item[-1] if isinstance(item, tuple) else item)
+
+
+def ddc_file(path, shift_freq=0.0, decimation=16, method='fir', **kwargs):
+    '''
+    down-converts a saved mixer_*.npz capture; its blocks are treated as one record
+
+    returns: data = complex baseband samples at sample_rate / decimation
+             metadata = the file's metadata updated by DDC.metadata
+    '''
+    view, metadata = load_capture(path)
+    ddc = DDC(float(metadata['sample_rate']), shift_freq, decimation, method, **kwargs)
+    data = np.concatenate([ddc.process(block) for block in view])
+    return data, ddc.metadata(metadata)
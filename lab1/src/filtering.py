@@ -0,0 +1,230 @@
+'''
+streaming FIR filtering
+
+StreamFilter convolves a record with FIR taps one block at a time by overlap-save or
+overlap-add, keeping the last ntaps - 1 samples between blocks, so records of any
+length go through in constant memory and the output is identical to filtering the
+whole thing at once. filter spectra are cached per fft length and real data goes
+through rfft.
+
+    taps = design_taps(sample_rate, (0.9e6, 1.1e6), mode='stop')
+    for index, timestamp, block in stream_ng(sample_rate, nsamples):
+        clean = filt.process(block)           # filt = StreamFilter(taps)
+
+or in one call on an array or any iterable of blocks:
+
+    for clean in filter_blocks(view, taps): ...
+
+arrays are filtered along time with every leading axis an independent channel (as in
+analysis.fourier_filter); an iterable of blocks is one record, joined end to end.
+'''
+
+import numpy as np
+from scipy import fft as sp_fft
+from scipy import signal
+
+from src.storage import CaptureView, is_iq, unpack_iq
+
+
+def _is_iq_block(x):
+    '''
+    interleaved int8-style I/Q: an (nsamples, 2) stream block or an (nblocks, nsamples, 2) capture
+    '''
+    return (x.ndim == 2 and x.shape[-1] == 2) or is_iq(x)
+
+
+def band_mask(freqs, band, mode='stop'):
+    '''
+    True where a frequency survives the filter
+
+    parameters: freqs = frequencies in Hz
+                band = (f_low, f_high) in Hz, or a list of them; for real data the band
+                       is applied at +-f, for complex data give signed frequencies
+                mode = 'stop' removes the band(s), 'pass' keeps only the band(s)
+    '''
+    bands = np.atleast_2d(band)
+    inside = np.zeros(np.shape(freqs), dtype=bool)
+    for f_low, f_high in bands:
+        inside |= (freqs >= f_low) & (freqs <= f_high)
+    if mode == 'stop':
+        return ~inside
+    if mode == 'pass':
+        return inside
+    raise ValueError("mode must be 'stop' or 'pass'")
+
+
+def design_taps(sample_rate, band, mode='stop', ntaps=255, window='hann', complex_taps=False):
+    '''
+    linear-phase FIR taps for a band-stop or band-pass mask, by frequency sampling
+
+    parameters: sample_rate = sampling rate in Hz
+                band, mode = see band_mask
+                ntaps = filter length (odd keeps the delay a whole number of samples)
+                window = scipy window applied to the taps
+                complex_taps = True for an asymmetric mask on I/Q data (signed frequencies);
+                               False mirrors the mask to +-f and gives real taps
+    returns: taps = (ntaps,) array, delay (ntaps - 1) / 2 samples
+    '''
+    nfft = sp_fft.next_fast_len(8 * ntaps)
+    freqs = np.fft.fftfreq(nfft, d=1/sample_rate)
+    response = band_mask(freqs if complex_taps else np.abs(freqs), band, mode).astype(float)
+    impulse = np.roll(np.fft.ifft(response), ntaps // 2)[:ntaps]
+    taps = impulse * signal.get_window(window, ntaps, fftbins=False)
+    return taps if complex_taps else taps.real
+
+
+class StreamFilter:
+    '''
+    block-by-block FIR filter with state carried between blocks
+
+    parameters: taps = FIR taps (real or complex)
+                method = 'overlap-save' or 'overlap-add' (same output, different bookkeeping)
+                workers = threads for scipy.fft
+    note: output is the causal convolution, delayed by (ntaps - 1) / 2 samples for
+          linear-phase taps; filter along the last axis, leading axes are independent channels
+    '''
+
+    def __init__(self, taps, method='overlap-save', workers=None):
+        if method not in ('overlap-save', 'overlap-add'):
+            raise ValueError("method must be 'overlap-save' or 'overlap-add'")
+        self.taps = np.asarray(taps)
+        self.method = method
+        self.workers = workers
+        self.ntaps = len(self.taps)
+        self.delay = (self.ntaps - 1) // 2
+        self._spectra = {}
+        self.reset()
+
+    def reset(self):
+        '''
+        forgets the previous blocks (start of a new record)
+        '''
+        self._state = None
+
+    def _spectrum(self, nfft, real):
+        # filter spectra cached per fft length, rfft for real data and taps
+        key = (nfft, real)
+        if key not in self._spectra:
+            if real:
+                self._spectra[key] = sp_fft.rfft(self.taps, nfft)
+            else:
+                self._spectra[key] = sp_fft.fft(self.taps, nfft)
+        return self._spectra[key]
+
+    def _convolve(self, x):
+        '''
+        full linear convolution of x with the taps along the last axis
+        '''
+        n = x.shape[-1] + self.ntaps - 1
+        nfft = sp_fft.next_fast_len(n, real=True)
+        real = not (np.iscomplexobj(x) or np.iscomplexobj(self.taps))
+        if real:
+            y = sp_fft.irfft(sp_fft.rfft(x, nfft, workers=self.workers) * self._spectrum(nfft, True),
+                             nfft, workers=self.workers)
+        else:
+            y = sp_fft.ifft(sp_fft.fft(x, nfft, workers=self.workers) * self._spectrum(nfft, False),
+                            workers=self.workers)
+        return y[..., :n]
+
+    def process(self, block):
+        '''
+        filters the next block of the record
+        parameters: block = (..., nsamples) samples; interleaved I/Q, an (nsamples, 2) block or
+                    (nchannels, nsamples, 2), is unpacked to complex
+        returns: filtered block, same length as the input
+        '''
+        x = np.asarray(block)
+        if _is_iq_block(x):
+            x = unpack_iq(x, dtype=np.complex128)
+        elif not np.iscomplexobj(x):
+            x = x.astype(np.float64, copy=False)
+        nsamples = x.shape[-1]
+        if self._state is None:
+            dtype = np.result_type(x, self.taps)
+            self._state = np.zeros(x.shape[:-1] + (self.ntaps - 1,), dtype=dtype)
+
+        if self.method == 'overlap-save':
+            # prepend the end of the previous input and keep only the samples
+            # whose convolution window is complete
+            buffer = np.concatenate([self._state, x], axis=-1)
+            y = self._convolve(buffer)[..., self.ntaps - 1:self.ntaps - 1 + nsamples]
+            self._state = buffer[..., buffer.shape[-1] - (self.ntaps - 1):]
+        else:
+            # convolve the block alone and add the tail left over from the previous one
+            y = self._convolve(x)
+            y[..., :self.ntaps - 1] += self._state
+            self._state = y[..., nsamples:]
+            y = y[..., :nsamples]
+        return y
+
+    def flush(self):
+        '''
+        output still owed after the last block (the filter's ringing, ntaps - 1 samples)
+        '''
+        if self._state is None:
+            return np.zeros(0)
+        if self.method == 'overlap-save':
+            zeros = np.zeros(self._state.shape, dtype=self._state.dtype)
+            y = self.process(zeros)
+        else:
+            y = self._state
+        self.reset()
+        return y
+
+
+def _iter_blocks(source, block_size):
+    '''
+    pieces of a record: arrays (and CaptureViews) are cut along the time axis, every
+    leading axis staying a separate channel and only one piece converted from int8 at a
+    time; iterators give their items (the block is the last element of tuples from stream_ng)
+    '''
+    if isinstance(source, CaptureView):
+        source = source.raw
+    if isinstance(source, np.ndarray):
+        if _is_iq_block(source):
+            # time is the axis before I/Q
+            for start in range(0, source.shape[-2], block_size):
+                yield source[..., start:start + block_size, :]
+        else:
+            for start in range(0, source.shape[-1], block_size):
+                yield source[..., start:start + block_size]
+        return
+    for item in source:
+        yield item[-1] if isinstance(item, tuple) else item
+
+
+def filter_blocks(source, taps, method='overlap-save', block_size=65536, compensate_delay=True):
+    '''
+    streams a record through a StreamFilter
+
+    parameters: source = array / CaptureView, (..., nsamples) or I/Q (..., nsamples, 2), read in
+                         chunks of block_size samples with leading axes as independent
+                         channels; or an iterable of blocks, e.g. stream_ng(...) or
+                         stream_iq_mixer(...), taken as one continuous record
+                taps = FIR taps, e.g. from design_taps
+                method = 'overlap-save' or 'overlap-add'
+                compensate_delay = shift the output back by the filter delay so it lines up
+                                   with the input (the total length is unchanged)
+    yields: filtered blocks
+    '''
+    stream = StreamFilter(taps, method=method)
+    skip = stream.delay if compensate_delay else 0
+    for block in _iter_blocks(source, block_size):
+        y = stream.process(block)
+        if skip:
+            dropped = min(skip, y.shape[-1])
+            y = y[..., dropped:]
+            skip -= dropped
+        if y.shape[-1]:
+            yield y
+    if compensate_delay:
+        tail = stream.flush()[..., :stream.delay]
+        if tail.shape[-1]:
+            yield tail
+
+
+def apply_filter(data, taps, method='overlap-save', block_size=65536):
+    '''
+    filters a whole array with the streaming engine; same length as data, delay removed
+    '''
+    return np.concatenate(list(filter_blocks(data, taps, method, block_size)), axis=-1)
@@ -0,0 +1,190 @@
+'''
+synchronized capture from several sdrs at once
+
+each device gets its own SDRSession and capture thread; threads start together on a
+barrier and every block is tagged with a host timestamp and sequence number.
+
+    from src.multi_sdr import MultiSDR
+    with MultiSDR(device_indices=(0, 1), sample_rate=2.4e6) as sdrs:
+        data, metadata = sdrs.capture(nsamples=16384, nblocks=16)   # (2, 16, 16384)
+
+pass backend=partial(SimulatedSDR, ...) to run without hardware.
+'''
+
+import queue
+import threading
+import time
+from datetime import datetime
+import numpy as np
+
+from src.acquiring_data import SDRSession
+from src.storage import CaptureView
+
+
+class MultiSDR:
+    '''
+    opens N devices with the same settings and captures from them in parallel
+
+    parameters: device_indices = device index of each sdr
+                direct, sample_rate, center_freq, gain, fir_coeffs, flush_samples = SDRSession settings
+                backend = device factory passed to every SDRSession (None = real sdr)
+    '''
+
+    def __init__(self, device_indices=(0, 1), direct=True, sample_rate=2.4e6, center_freq=0, gain=0,
+                 fir_coeffs=None, flush_samples=2048, backend=None):
+        self.device_indices = list(device_indices)
+        self.sample_rate = sample_rate
+        self.sessions = [SDRSession(device_index=index, direct=direct, sample_rate=sample_rate,
+                                    center_freq=center_freq, gain=gain, fir_coeffs=fir_coeffs,
+                                    flush_samples=flush_samples, backend=backend)
+                         for index in self.device_indices]
+        self.metadata = {'device_indices': np.array(self.device_indices), 'sample_rate': sample_rate,
+                         'direct_sampling': direct, 'center_freq': center_freq}
+
+    def open(self):
+        for session in self.sessions:
+            session.open()
+        return self
+
+    def close(self):
+        for session in self.sessions:
+            session.close()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run_threads(self, target):
+        barrier = threading.Barrier(len(self.sessions))
+        errors = []
+
+        def worker(dev, session):
+            try:
+                barrier.wait()
+                target(dev, session)
+            except Exception as e:
+                errors.append(e)
+                barrier.abort()
+
+        threads = [threading.Thread(target=worker, args=(dev, session), daemon=True)
+                   for dev, session in enumerate(self.sessions)]
+        for thread in threads:
+            thread.start()
+        return threads, errors
+
+    def capture(self, nsamples=16384, nblocks=1):
+        '''
+        captures nblocks from every device at the same time
+
+        returns: data = (ndev, nblocks, nsamples) array ((ndev, nblocks, nsamples, 2) for I/Q)
+                 metadata = capture parameters plus (ndev, nblocks) timestamps and sequence
+                            numbers, and per-device clock offsets estimated from the timestamps
+        '''
+        ndev = len(self.sessions)
+        blocks = [[None] * nblocks for _ in range(ndev)]
+        timestamps = np.zeros((ndev, nblocks))
+
+        def capture_device(dev, session):
+            for seq in range(nblocks):
+                blocks[dev][seq] = session.capture(nsamples=nsamples, nblocks=1)[0]
+                timestamps[dev, seq] = time.time()
+
+        threads, errors = self._run_threads(capture_device)
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+        data = np.stack([np.stack(device_blocks) for device_blocks in blocks])
+        metadata = dict(self.metadata)
+        metadata.update({'nsamples': nsamples, 'nblocks': nblocks, 'timestamps': timestamps,
+                         'sequence': np.tile(np.arange(nblocks), (ndev, 1)),
+                         'host_offsets': host_clock_offsets(timestamps),
+                         'timestamp': datetime.now().isoformat()})
+        return data, metadata
+
+    def stream(self, nsamples=16384, nblocks=None, max_queue=8):
+        '''
+        yields blocks from every device in lockstep
+
+        parameters: nsamples = samples per block
+                    nblocks = number of blocks (None = run until the generator is closed)
+                    max_queue = blocks buffered per device
+        yields: seq = sequence number
+                timestamps = (ndev,) host time of each device's block
+                blocks = (ndev, nsamples) array ((ndev, nsamples, 2) for I/Q)
+        '''
+        queues = [queue.Queue(maxsize=max_queue) for _ in self.sessions]
+        stop = threading.Event()
+
+        def stream_device(dev, session):
+            seq = 0
+            while not stop.is_set() and (nblocks is None or seq < nblocks):
+                block = session.capture(nsamples=nsamples, nblocks=1)[0]
+                queues[dev].put((seq, time.time(), block))
+                seq += 1
+
+        threads, errors = self._run_threads(stream_device)
+        try:
+            seq = 0
+            while nblocks is None or seq < nblocks:
+                items = []
+                for q in queues:
+                    while True:
+                        if errors:
+                            raise errors[0]
+                        try:
+                            items.append(q.get(timeout=0.5))
+                            break
+                        except queue.Empty:
+                            continue
+                yield seq, np.array([item[1] for item in items]), np.stack([item[2] for item in items])
+                seq += 1
+        finally:
+            stop.set()
+            # unblock threads waiting on full queues
+            for q in queues:
+                while not q.empty():
+                    q.get_nowait()
+            for thread in threads:
+                thread.join(timeout=1)
+
+
+def host_clock_offsets(timestamps):
+    '''
+    mean host-time offset of each device's blocks relative to device 0 (s)
+    parameters: timestamps = (ndev, nblocks) block timestamps
+    '''
+    return np.mean(timestamps - timestamps[0], axis=1)
+
+
+def estimate_sample_offsets(data, sample_rate, max_lag=None):
+    '''
+    estimates inter-device offsets by cross-correlating each device against device 0;
+    needs a signal common to all devices (e.g. a shared noise source)
+
+    parameters: data = (ndev, nblocks, nsamples[, 2]) array from MultiSDR.capture
+                sample_rate = sampling rate in Hz
+                max_lag = largest lag searched, in samples (None = half a block)
+    returns: lags = (ndev,) offsets in samples (positive = device is ahead of device 0)
+             offsets = (ndev,) offsets in seconds
+    '''
+    ndev, nblocks, nsamples = data.shape[:3]
+    if max_lag is None:
+        max_lag = nsamples // 2
+    nfft = 2 * nsamples
+    candidates = np.concatenate([np.arange(0, max_lag + 1), np.arange(-max_lag, 0)])
+
+    def spectra(dev):
+        return [np.fft.fft(block - np.mean(block), nfft) for block in CaptureView(data[dev])]
+
+    reference = spectra(0)
+    lags = np.zeros(ndev, dtype=int)
+    for dev in range(1, ndev):
+        # cross power summed over blocks, then back to a cross-correlation
+        cross = sum(np.conj(spectrum) * ref for spectrum, ref in zip(spectra(dev), reference))
+        xcorr = np.abs(np.fft.ifft(cross))
+        lags[dev] = candidates[np.argmax(xcorr[candidates % nfft])]
+    return lags, lags / sample_rate
@@ -0,0 +1,313 @@
+'''
+single-pass, mergeable noise statistics
+
+NoiseStats keeps count, mean, central moments (Welford / Chan et al. / Pebay
+combination), min, max and a fixed-edge histogram. feed it blocks one at a time,
+merge accumulators from other blocks, threads or processes (they pickle), and read
+the statistics at the end without ever holding the whole record.
+
+    stats = NoiseStats()
+    for block in view:          # e.g. a CaptureView or memory-mapped run
+        stats.update(block)
+    stats.result()
+'''
+
+import queue
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scipy import optimize, stats
+
+# one bin per int8 ADC code, -128..127
+adc_codes = np.arange(-128, 128)
+adc_edges = np.arange(-128.5, 128.5)
+
+
+class NoiseStats:
+    '''
+    streaming accumulator for noise statistics
+
+    parameters: edges = histogram bin edges, fixed so accumulators can be merged
+                        (default: one bin per int8 ADC code)
+    '''
+
+    def __init__(self, edges=adc_edges):
+        self.edges = np.asarray(edges, dtype=float)
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.n = 0
+        self.mean = 0.0
+        self.M2 = 0.0
+        self.M3 = 0.0
+        self.M4 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _histogram(self, x):
+        if np.issubdtype(x.dtype, np.integer) and np.array_equal(self.edges, adc_edges):
+            # integer codes: exact bincount, no sorting
+            codes = x.astype(np.int16).ravel() + 128
+            return np.bincount(codes[(codes >= 0) & (codes < 256)], minlength=256)
+        return np.histogram(x, bins=self.edges)[0]
+
+    def _from_codes(self, x):
+        # int8 samples: every statistic follows from the 256 code counts, one pass over the data
+        counts = np.roll(np.bincount(x.view(np.uint8).ravel(), minlength=256), 128)
+        other = NoiseStats(self.edges)
+        other.n = int(x.size)
+        other.mean = float(counts @ adc_codes) / other.n
+        d = adc_codes - other.mean
+        d2 = d * d
+        other.M2 = float(counts @ d2)
+        other.M3 = float(counts @ (d2 * d))
+        other.M4 = float(counts @ (d2 * d2))
+        present = np.flatnonzero(counts)
+        other.min = float(adc_codes[present[0]])
+        other.max = float(adc_codes[present[-1]])
+        if np.array_equal(self.edges, adc_edges):
+            other.counts = counts
+        else:
+            other.counts = np.histogram(adc_codes, bins=self.edges, weights=counts)[0].astype(np.int64)
+        return other
+
+    def update(self, block):
+        '''
+        adds one block of samples (any shape)
+        '''
+        x = np.asarray(block)
+        if x.size == 0:
+            return self
+        if x.dtype == np.int8:
+            return self.merge(self._from_codes(x))
+        other = NoiseStats(self.edges)
+        other.n = x.size
+        other.mean = float(np.mean(x, dtype=np.float64))
+        d = x.astype(np.float64).ravel() - other.mean
+        d2 = d * d
+        other.M2 = float(d2.sum())
+        other.M3 = float(np.dot(d2, d))
+        other.M4 = float(np.dot(d2, d2))
+        other.min = float(x.min())
+        other.max = float(x.max())
+        other.counts = self._histogram(x)
+        return self.merge(other)
+
+    def merge(self, other):
+        '''
+        combines another accumulator into this one (in place)
+        '''
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("can only merge accumulators with the same histogram edges")
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.__dict__.update({key: np.copy(value) if isinstance(value, np.ndarray) else value
+                                  for key, value in other.__dict__.items()})
+            return self
+
+        na, nb = self.n, other.n
+        n = na + nb
+        delta = other.mean - self.mean
+        M2a, M2b, M3a, M3b = self.M2, other.M2, self.M3, other.M3
+        self.M4 = (self.M4 + other.M4 + delta**4 * na * nb * (na**2 - na*nb + nb**2) / n**3
+                   + 6 * delta**2 * (na**2 * M2b + nb**2 * M2a) / n**2
+                   + 4 * delta * (na * M3b - nb * M3a) / n)
+        self.M3 = (M3a + M3b + delta**3 * na * nb * (na - nb) / n**2
+                   + 3 * delta * (na * M2b - nb * M2a) / n)
+        self.M2 = M2a + M2b + delta**2 * na * nb / n
+        self.mean += delta * nb / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.counts = self.counts + other.counts
+        return self
+
+    def __add__(self, other):
+        return NoiseStats(self.edges).merge(self).merge(other)
+
+    @property
+    def variance(self):
+        return self.M2 / self.n
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    @property
+    def rms(self):
+        return np.sqrt(self.variance + self.mean**2)
+
+    @property
+    def skewness(self):
+        return np.sqrt(self.n) * self.M3 / self.M2**1.5
+
+    @property
+    def kurtosis(self):
+        '''
+        excess kurtosis (0 for a gaussian)
+        '''
+        return self.n * self.M4 / self.M2**2 - 3
+
+    def histogram(self, density=True):
+        '''
+        returns: hist = counts (or probability density), bin_centers
+        '''
+        centers = (self.edges[:-1] + self.edges[1:]) / 2
+        if density:
+            return self.counts / (self.counts.sum() * np.diff(self.edges)), centers
+        return self.counts, centers
+
+    def result(self):
+        '''
+        same keys as analysis.analyze_noise_stats, plus n, skewness and kurtosis
+        '''
+        return {'mean': self.mean, 'std': self.std, 'variance': self.variance, 'min': self.min,
+                'max': self.max, 'rms': self.rms, 'n': self.n, 'skewness': self.skewness,
+                'kurtosis': self.kurtosis}
+
+
+def accumulate(blocks, edges=adc_edges, workers=1):
+    '''
+    NoiseStats over an iterable or array of blocks, split across worker threads
+    (numpy releases the GIL in the heavy parts) and merged at the end. arrays and other
+    indexable inputs are split by index; generators and other iterables are read once,
+    feeding the threads through a short queue so only a few blocks are held at a time
+    '''
+    if workers <= 1:
+        total = NoiseStats(edges)
+        for block in blocks:
+            total.update(block)
+        return total
+
+    if hasattr(blocks, '__getitem__') and hasattr(blocks, '__len__'):
+        groups = [range(i, len(blocks), workers) for i in range(workers)]
+
+        def run(indices):
+            partial = NoiseStats(edges)
+            for i in indices:
+                partial.update(blocks[i])
+            return partial
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run, groups))
+    else:
+        work = queue.Queue(maxsize=2 * workers)
+
+        def consume():
+            partial = NoiseStats(edges)
+            error = None
+            while True:
+                block = work.get()
+                if block is None:
+                    break
+                # after a failure keep draining, so the reading loop never blocks on a full queue
+                if error is None:
+                    try:
+                        partial.update(block)
+                    except Exception as exc:
+                        error = exc
+            if error is not None:
+                raise error
+            return partial
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(consume) for _ in range(workers)]
+            try:
+                for block in blocks:
+                    work.put(block)
+            finally:
+                for _ in range(workers):
+                    work.put(None)
+            results = [future.result() for future in futures]
+
+    total = NoiseStats(edges)
+    for partial in results:
+        total.merge(partial)
+    return total
+
+
+def adc_histogram(data, counts=None):
+    '''
+    exact histogram of int8 ADC codes: one bincount, no sorting or float bin edges
+
+    parameters: data = integer samples (any shape)
+                counts = running (256,) counts to add to, for merging blocks
+    returns: counts = (256,) counts for codes -128..127
+    '''
+    codes = np.asarray(data).astype(np.int16).ravel() + 128
+    if codes.size and (codes.min() < 0 or codes.max() > 255):
+        raise ValueError("adc_histogram expects int8 codes between -128 and 127")
+    new = np.bincount(codes, minlength=256)
+    return new if counts is None else counts + new
+
+
+def _code_probabilities(mu, sigma):
+    '''
+    probability of each code for a gaussian quantized by rounding; the end codes take
+    the whole tails, which is what clipping does
+    '''
+    edges = np.concatenate([[-np.inf], adc_codes[1:] - 0.5, [np.inf]])
+    return np.diff(stats.norm.cdf(edges, mu, sigma))
+
+
+def fit_quantized_gaussian(counts, exclude=()):
+    '''
+    maximum-likelihood gaussian fit to an ADC code histogram, with a chi-square
+    goodness of fit
+
+    parameters: counts = (256,) code counts from adc_histogram or NoiseStats.counts
+                exclude = codes left out of the fit (e.g. codes already flagged as stuck)
+    returns: dictionary with mu, sigma, expected counts, chi2, dof and p_value
+    '''
+    counts = np.asarray(counts, dtype=float)
+    use = np.ones(256, dtype=bool)
+    use[np.asarray(exclude, dtype=int) + 128] = False
+    n = counts[use].sum()
+
+    # start from the moments of the histogram
+    mu0 = np.sum(adc_codes[use] * counts[use]) / n
+    sigma0 = np.sqrt(np.sum((adc_codes[use] - mu0)**2 * counts[use]) / n) or 1.0
+
+    def nll(params):
+        p = _code_probabilities(params[0], np.exp(params[1]))[use]
+        p = p / p.sum()
+        return -np.sum(counts[use] * np.log(np.maximum(p, 1e-300)))
+
+    best = optimize.minimize(nll, [mu0, np.log(sigma0)], method='Nelder-Mead',
+                             options={'xatol': 1e-6, 'fatol': 1e-6})
+    mu, sigma = best.x[0], np.exp(best.x[1])
+
+    # excluded codes still get an expected count, so code_flags can judge them against the fit
+    p = _code_probabilities(mu, sigma)
+    expected = n * p / p[use].sum()
+    # pearson chi-square over codes with enough expected counts
+    good = use & (expected >= 5)
+    chi2 = np.sum((counts[good] - expected[good])**2 / expected[good])
+    dof = max(int(good.sum()) - 3, 1)
+    return {'mu': mu, 'sigma': sigma, 'expected': expected, 'chi2': chi2, 'dof': dof,
+            'p_value': stats.chi2.sf(chi2, dof)}
+
+
+def code_flags(counts, fit=None, threshold=5.0):
+    '''
+    flags ADC problems in a code histogram
+
+    parameters: counts = (256,) code counts
+                fit = result of fit_quantized_gaussian (fitted here if None)
+                threshold = |observed - expected| / sqrt(expected) above which a code is flagged
+    returns: dictionary with
+             missing = codes inside mu +- 3 sigma that never occur
+             stuck = codes that occur far more often than the fit predicts
+             low = codes that occur far less often than predicted (but not never)
+             clipped_fraction = fraction of samples at -128 or 127
+    '''
+    counts = np.asarray(counts, dtype=float)
+    if fit is None:
+        fit = fit_quantized_gaussian(counts)
+    expected = fit['expected']
+    inside = np.abs(adc_codes - fit['mu']) <= 3 * fit['sigma']
+    z = np.zeros(256)
+    ok = expected > 0
+    z[ok] = (counts[ok] - expected[ok]) / np.sqrt(expected[ok])
+    return {'missing': adc_codes[inside & (counts == 0)],
+            'stuck': adc_codes[z > threshold],
+            'low': adc_codes[(z < -threshold) & (counts > 0)],
+            'clipped_fraction': (counts[0] + counts[-1]) / counts.sum()}
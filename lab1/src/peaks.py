@@ -0,0 +1,130 @@
+'''
+vectorized spectral peak estimation
+
+works on (nspectra, nfreq) power arrays in one go: band limits, top-k peaks, sub-bin
+interpolation (quadratic, gaussian or jacobsen) and an SNR per peak.
+
+    freqs, power = analysis.compute_power_spectra(blocks, sample_rate)
+    peaks = find_peaks(freqs, power, fmin=1e4, k=3)
+    peaks['freq'][:, 0]          # interpolated strongest peak of every spectrum
+'''
+
+import numpy as np
+
+
+def _band(freqs, fmin, fmax):
+    mask = np.ones(len(freqs), dtype=bool)
+    if fmin is not None:
+        mask &= freqs >= fmin
+    if fmax is not None:
+        mask &= freqs <= fmax
+    return mask
+
+
+def interpolate_peak(power, index, method='quadratic', spectrum=None):
+    '''
+    sub-bin offset of peaks from their three neighbouring bins
+
+    parameters: power = (nspectra, nfreq) power spectra
+                index = (nspectra, k) bin index of each peak
+                method = 'quadratic' (parabola through the power), 'gaussian' (parabola
+                         through log power, exact for gaussian-shaped peaks) or 'jacobsen'
+                         (needs the complex spectrum, for rectangular-window fft bins)
+                spectrum = complex spectra with the same layout as power (jacobsen only)
+    returns: delta = offset in bins (-0.5..0.5), amplitude = interpolated peak power
+    '''
+    nfreq = power.shape[-1]
+    rows = np.arange(power.shape[0])[:, None]
+    # peaks on the edge of the array can't be interpolated
+    center = np.clip(index, 1, nfreq - 2)
+    edge = center != index
+    left, mid, right = (power[rows, center - 1], power[rows, center], power[rows, center + 1])
+
+    if method == 'quadratic':
+        a, b, c = left, mid, right
+    elif method == 'gaussian':
+        tiny = np.finfo(float).tiny
+        a, b, c = (np.log(np.maximum(x, tiny)) for x in (left, mid, right))
+    elif method == 'jacobsen':
+        if spectrum is None:
+            raise ValueError("jacobsen interpolation needs the complex spectrum")
+        xl, xm, xr = (spectrum[rows, center - 1], spectrum[rows, center], spectrum[rows, center + 1])
+        denominator = 2 * xm - xl - xr
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = np.real((xl - xr) / denominator)
+        delta = np.where(np.isfinite(delta) & ~edge, np.clip(delta, -0.5, 0.5), 0.0)
+        return delta, mid
+    else:
+        raise ValueError("method must be 'quadratic', 'gaussian' or 'jacobsen'")
+
+    denominator = a - 2 * b + c
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = 0.5 * (a - c) / denominator
+    delta = np.where(np.isfinite(delta) & ~edge, np.clip(delta, -0.5, 0.5), 0.0)
+    peak = b - 0.25 * (a - c) * delta
+    amplitude = np.exp(peak) if method == 'gaussian' else peak
+    return delta, np.where(edge, mid, amplitude)
+
+
+def find_peaks(freqs, power, fmin=None, fmax=None, k=1, method='quadratic', spectrum=None,
+               min_separation=2):
+    '''
+    top-k interpolated peaks of many spectra at once
+
+    parameters: freqs = (nfreq,) evenly spaced frequencies in Hz
+                power = (nfreq,) or (nspectra, nfreq) power spectra
+                fmin, fmax = only look inside this band
+                k = number of peaks per spectrum (local maxima, strongest first)
+                method = interpolation, see interpolate_peak
+                spectrum = complex spectra for method='jacobsen'
+                min_separation = peaks closer than this many bins to a stronger one are skipped
+    returns: dictionary of (nspectra, k) arrays: freq (Hz), power, bin, snr (peak power
+             over the median power in the band); a 1-D power gives (k,) arrays. a spectrum
+             with fewer than k local maxima gets freq, power and snr NaN and bin -1 for the
+             missing ones
+    '''
+    freqs = np.asarray(freqs)
+    power = np.asarray(power, dtype=float)
+    squeeze = power.ndim == 1
+    power = np.atleast_2d(power)
+    if spectrum is not None:
+        spectrum = np.atleast_2d(spectrum)
+
+    band = np.nonzero(_band(freqs, fmin, fmax))[0]
+    if len(band) == 0:
+        raise ValueError(f"no frequencies between fmin={fmin} and fmax={fmax}")
+    in_band = power[:, band]
+
+    # local maxima inside the band; everything else can't be a peak
+    candidate = np.full(in_band.shape, -np.inf)
+    is_max = np.ones(in_band.shape, dtype=bool)
+    is_max[:, 1:] &= in_band[:, 1:] >= in_band[:, :-1]
+    is_max[:, :-1] &= in_band[:, :-1] >= in_band[:, 1:]
+    candidate[is_max] = in_band[is_max]
+
+    index = np.empty((len(power), k), dtype=int)
+    found = np.empty((len(power), k), dtype=bool)
+    rows = np.arange(len(power))
+    for j in range(k):
+        best = np.argmax(candidate, axis=1)
+        index[:, j] = best
+        # a row with only -inf left has run out of local maxima
+        found[:, j] = np.isfinite(candidate[rows, best])
+        # knock out the neighbourhood of this peak before looking for the next one
+        lo = np.clip(best - min_separation, 0, None)
+        hi = best + min_separation + 1
+        columns = np.arange(in_band.shape[1])
+        candidate[(columns >= lo[:, None]) & (columns < hi[:, None])] = -np.inf
+
+    bins = band[index]
+    delta, amplitude = interpolate_peak(power, bins, method, spectrum)
+    df = freqs[1] - freqs[0]
+    noise = np.median(in_band, axis=1, keepdims=True)
+    with np.errstate(divide='ignore'):
+        snr = amplitude / noise
+
+    result = {'freq': np.where(found, freqs[bins] + delta * df, np.nan), 'power': np.where(found, amplitude, np.nan),
+              'bin': np.where(found, bins, -1), 'snr': np.where(found, snr, np.nan)}
+    if squeeze:
+        result = {key: value[0] for key, value in result.items()}
+    return result
@@ -0,0 +1,207 @@
+'''
+polyphase filterbank (PFB) spectrometer
+
+each output spectrum comes from ntaps consecutive frames of nchan samples, weighted by
+a windowed sinc prototype filter and summed before the fft. this costs one extra
+multiply-add per tap and sample on top of the plain fft but gives sidelobes far below
+those of the rectangular fft bins, and flatter channels (fwidth ~1.2). see
+benchmark_pfb.py for speed and leakage against the plain fft path.
+
+    freqs, spectra = pfb_spectra(blocks, sample_rate, nchan=1024)      # stateless, batched
+
+    pfb = PFBSpectrometer(sample_rate, nchan=1024, ntaps=4)            # streaming
+    for block in view:
+        pfb.update(block)
+    freqs, spectrum = pfb.freqs, pfb.spectrum
+'''
+
+from functools import lru_cache
+import time
+import numpy as np
+from scipy import fft as sp_fft
+from scipy import signal
+
+from src.analysis import compute_power_spectra
+from src.storage import unpack_iq
+
+
+@lru_cache(maxsize=16)
+def pfb_coefficients(nchan, ntaps=4, window='hamming', fwidth=1.0):
+    '''
+    windowed sinc prototype filter, one row per tap
+
+    parameters: nchan = fft length (channels of the complex filterbank)
+                ntaps = frames summed per spectrum
+                window = scipy window applied to the sinc
+                fwidth = sinc width scale; 1 gives neighbouring channels crossing at -6 dB,
+                         ~1.2 crosses near -3 dB (flatter passband, more channel overlap)
+    returns: (ntaps, nchan) read-only coefficients
+    '''
+    n = ntaps * nchan
+    coeffs = signal.get_window(window, n, fftbins=False) * np.sinc(fwidth * (np.arange(n) / nchan - ntaps / 2))
+    coeffs = coeffs.reshape(ntaps, nchan)
+    coeffs.flags.writeable = False
+    return coeffs
+
+
+def _weighted_frames(frames, coeffs):
+    '''
+    (..., nframes, nchan) frames -> (..., nframes - ntaps + 1, nchan) filtered frames
+    '''
+    ntaps = len(coeffs)
+    nout = frames.shape[-2] - ntaps + 1
+    out = frames[..., :nout, :] * coeffs[0]
+    for tap in range(1, ntaps):
+        out += frames[..., tap:tap + nout, :] * coeffs[tap]
+    return out
+
+
+def _freqs(nchan, sample_rate, is_complex):
+    if is_complex:
+        return np.fft.fftshift(np.fft.fftfreq(nchan, d=1/sample_rate))
+    return np.fft.rfftfreq(nchan, d=1/sample_rate)
+
+
+def _power(filtered, is_complex, workers):
+    if is_complex:
+        spectrum = np.fft.fftshift(sp_fft.fft(filtered, axis=-1, workers=workers), axes=-1)
+    else:
+        spectrum = sp_fft.rfft(filtered, axis=-1, workers=workers)
+    return spectrum.real**2 + spectrum.imag**2
+
+
+def pfb_spectra(data, sample_rate, nchan=1024, ntaps=4, window='hamming', fwidth=1.0, workers=None):
+    '''
+    PFB power spectra of every block at once (no state between blocks)
+
+    parameters: data = (..., nsamples) real or complex blocks, or (..., nsamples, 2) int8 I/Q
+                sample_rate = sampling rate in Hz
+                nchan = fft length; real data gives nchan // 2 + 1 channels
+                ntaps = frames per spectrum
+                window, fwidth = prototype filter settings, see pfb_coefficients
+                workers = threads for scipy.fft
+    returns: freqs = channel centres in Hz (fftshifted for complex data)
+             spectra = (..., nspectra, nfreq) power, nspectra = nsamples // nchan - ntaps + 1
+    '''
+    data = np.asarray(data)
+    if data.dtype == np.int8 and data.ndim >= 2 and data.shape[-1] == 2:
+        data = unpack_iq(data)
+    is_complex = np.iscomplexobj(data)
+    data = data.astype(np.complex64 if is_complex else np.float32, copy=False)
+    nframes = data.shape[-1] // nchan
+    if nframes < ntaps:
+        raise ValueError(f"need at least ntaps * nchan = {ntaps * nchan} samples per block")
+    frames = data[..., :nframes * nchan].reshape(data.shape[:-1] + (nframes, nchan))
+    filtered = _weighted_frames(frames, pfb_coefficients(nchan, ntaps, window, fwidth).astype(np.float32))
+    return _freqs(nchan, sample_rate, is_complex), _power(filtered, is_complex, workers)
+
+
+class PFBSpectrometer:
+    '''
+    streaming PFB: keeps the last ntaps - 1 frames and any partial frame between
+    chunks, so a record fed in pieces gives exactly the spectra of the whole record,
+    and integrates the power spectra as it goes
+
+    parameters: sample_rate = sampling rate in Hz
+                nchan, ntaps, window, fwidth = filterbank settings (see pfb_spectra)
+                workers = threads for scipy.fft
+    '''
+
+    def __init__(self, sample_rate, nchan=1024, ntaps=4, window='hamming', fwidth=1.0, workers=None):
+        self.sample_rate = sample_rate
+        self.nchan = nchan
+        self.ntaps = ntaps
+        self.window = window
+        self.fwidth = fwidth
+        self.workers = workers
+        self.coeffs = pfb_coefficients(nchan, ntaps, window, fwidth).astype(np.float32)
+        self.reset()
+
+    def reset(self):
+        self._buffer = None
+        self.is_complex = None
+        self.total = None
+        self.nspectra = 0
+
+    @property
+    def freqs(self):
+        return _freqs(self.nchan, self.sample_rate, self.is_complex)
+
+    def process(self, block):
+        '''
+        spectra completed by this chunk of the stream
+        parameters: block = 1-D real or complex samples, or an (nsamples, 2) int8 I/Q block
+        returns: (nspectra, nfreq) power spectra (nspectra can be 0)
+        '''
+        x = np.asarray(block)
+        if x.ndim == 2 and x.shape[-1] == 2:
+            x = unpack_iq(x)
+        if self.is_complex is None:
+            self.is_complex = np.iscomplexobj(x)
+            self._buffer = np.zeros(0, dtype=np.complex64 if self.is_complex else np.float32)
+        x = np.concatenate([self._buffer, x.astype(self._buffer.dtype, copy=False)])
+
+        nframes = len(x) // self.nchan
+        if nframes < self.ntaps:
+            self._buffer = x
+            return np.zeros((0, len(self.freqs)))
+        frames = x[:nframes * self.nchan].reshape(nframes, self.nchan)
+        spectra = _power(_weighted_frames(frames, self.coeffs), self.is_complex, self.workers)
+        # keep the frames the next spectra still need, plus the partial frame
+        self._buffer = x[(nframes - self.ntaps + 1) * self.nchan:]
+        return spectra
+
+    def update(self, block):
+        '''
+        processes a chunk and adds its spectra to the integration
+        '''
+        spectra = self.process(block)
+        if len(spectra):
+            total = spectra.sum(axis=0, dtype=np.float64)
+            self.total = total if self.total is None else self.total + total
+            self.nspectra += len(spectra)
+        return self
+
+    @property
+    def spectrum(self):
+        '''
+        mean of all spectra integrated so far
+        '''
+        if not self.nspectra:
+            raise ValueError("not enough samples for a spectrum yet")
+        return self.total / self.nspectra
+
+
+def benchmark(nchan=1024, ntaps=4, nsamples=2**22, repeats=5, sample_rate=2.4e6, window='hamming', fwidth=1.0):
+    '''
+    PFB vs the plain fft path (compute_power_spectra on nchan-sample frames): speed,
+    and leakage of a tone halfway between two channels
+
+    returns: dictionary with the best times (s), throughput (samples/s), the
+             scalloping loss (dB) and the power 4 channels away from the tone (dB)
+    '''
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=nsamples).astype(np.float32)
+
+    def best(function):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    results = {'fft_time': best(lambda: compute_power_spectra(data.reshape(-1, nchan), sample_rate)),
+               'pfb_time': best(lambda: pfb_spectra(data, sample_rate, nchan, ntaps, window, fwidth))}
+    results['fft_rate'] = nsamples / results['fft_time']
+    results['pfb_rate'] = nsamples / results['pfb_time']
+
+    # tone exactly between channels 100 and 101: worst case for both
+    t = np.arange(64 * nchan)
+    for name, spectra in (('fft', lambda x: compute_power_spectra(x.reshape(-1, nchan), sample_rate)[1]),
+                          ('pfb', lambda x: pfb_spectra(x, sample_rate, nchan, ntaps, window, fwidth)[1])):
+        on_bin = spectra(np.cos(2 * np.pi * 100 * t / nchan)).mean(axis=0)
+        between = spectra(np.cos(2 * np.pi * 100.5 * t / nchan)).mean(axis=0)
+        results[f'{name}_scalloping_db'] = 10 * np.log10(between[100] / on_bin[100])
+        results[f'{name}_leakage_db'] = 10 * np.log10(between[104] / between[100])
+    return results
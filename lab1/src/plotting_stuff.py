@@ -2,6 +2,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
 
+from src.waterfall import downsample_rows
+
 
 def setup_plot_style():
     plt.rcParams['figure.figsize'] = (10, 6)
@@ -74,4 +76,30 @@ def plot_spectrum(freqs, power, title='Power Spectrum',
     if save_path:
         plt.savefig(save_path, dpi=300, bbox_inches='tight')
     
-    plt.show()
\ No newline at end of file
+    plt.show()
+
+def plot_waterfall(rows, metadata, max_rows=1000, db=True, title='Waterfall', save_path=None):
+    """
+    plot a dynamic spectrum from src.waterfall without loading all of it: rows are
+    averaged down to at most max_rows, a chunk at a time
+    """
+    image, factor = downsample_rows(rows, max_rows)
+    if db:
+        image = 10 * np.log10(np.maximum(image, np.finfo(float).tiny))
+    t0 = metadata.get('start_time', 0)
+    t1 = t0 + len(rows) * metadata['time_resolution']
+    extent = [metadata['freq_min']/1e3, metadata['freq_max']/1e3, t1, t0]
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    im = ax.imshow(image, aspect='auto', extent=extent, interpolation='nearest')
+    fig.colorbar(im, ax=ax, label='Power (dB)' if db else 'Power')
+    ax.set_xlabel('Frequency (kHz)')
+    ax.set_ylabel('Time (s)')
+    ax.set_title(f'{title} ({factor} rows per pixel)' if factor > 1 else title)
+    
+    plt.tight_layout()
+    
+    if save_path:
+        plt.savefig(save_path, dpi=300, bbox_inches='tight')
+    
+    plt.show()
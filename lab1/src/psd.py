@@ -0,0 +1,268 @@
+'''
+averaged power spectra (Welch's method) accumulated block by block
+
+PSDAccumulator splits every block it is fed into overlapping windowed segments, takes
+one batched fft of them and folds the result into a running mean (and optionally a
+running variance) per frequency, so memory is O(nfreq) however many blocks go in.
+
+    acc = PSDAccumulator(sample_rate, nperseg=4096, window='hann', overlap=0.5)
+    for block in view:                    # CaptureView, ChunkedDataset, stream_ng blocks ...
+        acc.update(block)
+    freqs, psd = acc.freqs, acc.psd
+
+with continuous=True (default) the samples left over at the end of a block are kept
+and the next segment straddles the boundary, which is right for consecutive blocks of
+one capture_data call or a stream.
+'''
+
+from functools import lru_cache
+import numpy as np
+from scipy import fft as sp_fft
+from scipy import signal
+
+from src.storage import CaptureView, is_iq, unpack_iq
+
+
+@lru_cache(maxsize=32)
+def window_info(window, nperseg):
+    '''
+    cached window and its normalization constants
+
+    parameters: window = scipy window name or tuple, e.g. 'hann', ('kaiser', 8)
+                nperseg = segment length
+    returns: w = (nperseg,) float64 window (read-only)
+             coherent_gain = mean(w), the amplitude a tone on a bin centre is scaled by
+             enbw = equivalent noise bandwidth in bins, N sum(w^2) / sum(w)^2
+    '''
+    w = signal.get_window(window, nperseg)
+    w.flags.writeable = False
+    coherent_gain = w.sum() / nperseg
+    enbw = nperseg * np.sum(w**2) / w.sum()**2
+    return w, coherent_gain, enbw
+
+
+class PSDAccumulator:
+    '''
+    running Welch power spectrum
+
+    parameters: sample_rate = sampling rate in Hz
+                nperseg = segment (fft) length
+                window = scipy window name or tuple
+                overlap = fraction of a segment shared with the next one (0 <= overlap < 1)
+                scaling = 'density' (V^2/Hz, noise level independent of window and nperseg)
+                          or 'spectrum' (V^2, a tone's peak gives its power whatever the window)
+                onesided = True folds negative frequencies onto positive ones (real data
+                           only), None = one-sided for real data
+                detrend = remove each segment's mean before windowing
+                variance = also keep the running variance of the segment periodograms
+                continuous = carry the samples left over at the end of a block into the next one
+                flagger = rfi.RFIFlagger (or anything with its flag method); flagged cells are
+                          left out and every channel is averaged over its own count
+    '''
+
+    def __init__(self, sample_rate, nperseg=1024, window='hann', overlap=0.5, scaling='density',
+                 onesided=None, detrend=True, variance=False, continuous=True, flagger=None):
+        if scaling not in ('density', 'spectrum'):
+            raise ValueError("scaling must be 'density' or 'spectrum'")
+        if not 0 <= overlap < 1:
+            raise ValueError("overlap must be between 0 and 1")
+        self.sample_rate = sample_rate
+        self.nperseg = nperseg
+        self.window = window
+        self.step = max(nperseg - int(round(overlap * nperseg)), 1)
+        self.scaling = scaling
+        self.onesided = onesided
+        self.detrend = detrend
+        self.track_variance = variance
+        self.continuous = continuous
+        self.flagger = flagger
+        self.w, self.coherent_gain, self.enbw_bins = window_info(window, nperseg)
+        if scaling == 'density':
+            self.scale = 1 / (sample_rate * np.sum(self.w**2))
+        else:
+            self.scale = 1 / self.w.sum()**2
+        self.reset()
+
+    def reset(self):
+        self.nsegments = 0
+        self.counts = None
+        self._mean = None
+        self._M2 = None
+        self._leftover = None
+        self.is_complex = None
+
+    @property
+    def enbw(self):
+        '''
+        equivalent noise bandwidth of one bin in Hz
+        '''
+        return self.enbw_bins * self.sample_rate / self.nperseg
+
+    def _segments(self, x):
+        if self.continuous and self._leftover is not None:
+            x = np.concatenate([self._leftover, x])
+        nseg = (len(x) - self.nperseg) // self.step + 1 if len(x) >= self.nperseg else 0
+        if self.continuous:
+            self._leftover = x[nseg * self.step:]
+        if nseg == 0:
+            return x[:0].reshape(0, self.nperseg)
+        return np.lib.stride_tricks.sliding_window_view(x, self.nperseg)[::self.step][:nseg]
+
+    def _periodograms(self, segments):
+        if self.detrend:
+            segments = segments - segments.mean(axis=1, keepdims=True)
+        segments = segments * self.w
+        if self.is_complex:
+            spectrum = sp_fft.fft(segments, axis=1)
+        else:
+            spectrum = sp_fft.rfft(segments, axis=1)
+        power = (spectrum.real**2 + spectrum.imag**2) * self.scale
+        if not self.is_complex and self.onesided:
+            # fold the negative frequencies in; dc and nyquist have no mirror image
+            last = None if self.nperseg % 2 else -1
+            power[:, 1:last] *= 2
+        return power
+
+    def update(self, block):
+        '''
+        adds one block of samples
+        parameters: block = 1-D real or complex samples (int8 is fine), or an (nsamples, 2)
+                    interleaved I/Q block
+        '''
+        x = np.asarray(block)
+        if x.ndim == 2 and x.shape[-1] == 2:
+            x = unpack_iq(x, dtype=np.complex128)
+        if self.is_complex is None:
+            self.is_complex = np.iscomplexobj(x)
+            if self.onesided is None:
+                self.onesided = not self.is_complex
+            if self.onesided and self.is_complex:
+                raise ValueError("one-sided spectra need real input")
+        x = x.astype(np.complex128 if self.is_complex else np.float64, copy=False)
+
+        segments = self._segments(x)
+        power = self._periodograms(segments)
+        n = len(power)
+        if n == 0:
+            return self
+        if self.flagger is None:
+            counts = np.full(power.shape[1], n)
+            mean = power.mean(axis=0)
+            keep = None
+        else:
+            exclude = None
+            if not self.is_complex:
+                # dc and nyquist of real data are not complex gaussian, SK does not apply there
+                exclude = [0] if self.nperseg % 2 else [0, -1]
+            keep = ~self.flagger.flag(segments, power, exclude_sk=exclude)
+            counts = keep.sum(axis=0)
+            mean = np.where(keep, power, 0).sum(axis=0) / np.maximum(counts, 1)
+        M2 = None
+        if self.track_variance:
+            squares = (power - mean)**2
+            M2 = (squares if keep is None else np.where(keep, squares, 0)).sum(axis=0)
+        self._combine(counts, mean, M2)
+        self.nsegments += n
+        return self
+
+    def _combine(self, counts, mean, M2):
+        # merge per-channel (count, mean, M2) into the running totals (Chan et al.)
+        if self.counts is None:
+            self.counts, self._mean, self._M2 = counts.copy(), mean.copy(), None if M2 is None else M2.copy()
+            return
+        total = self.counts + counts
+        safe = np.maximum(total, 1)
+        delta = mean - self._mean
+        if self.track_variance:
+            self._M2 = self._M2 + M2 + delta**2 * self.counts * counts / safe
+        self._mean = self._mean + delta * counts / safe
+        self.counts = total
+
+    def merge(self, other):
+        '''
+        combines another accumulator with the same settings into this one (in place)
+        '''
+        if other.nsegments == 0:
+            return self
+        if self.nsegments == 0:
+            self.is_complex, self.onesided = other.is_complex, other.onesided
+        self._combine(other.counts, other._mean, other._M2)
+        self.nsegments += other.nsegments
+        return self
+
+    @property
+    def freqs(self):
+        if self.is_complex:
+            return np.fft.fftshift(np.fft.fftfreq(self.nperseg, d=1/self.sample_rate))
+        if self.onesided:
+            return np.fft.rfftfreq(self.nperseg, d=1/self.sample_rate)
+        return np.fft.fftshift(np.fft.fftfreq(self.nperseg, d=1/self.sample_rate))
+
+    def _layout(self, values):
+        # complex: fftshift; real two-sided: mirror the rfft half like compute_power_spectra
+        if self.is_complex:
+            return np.fft.fftshift(values)
+        if self.onesided:
+            return values
+        n_neg = self.nperseg // 2
+        return np.concatenate([values[1:n_neg + 1][::-1], values[:self.nperseg - n_neg]])
+
+    @property
+    def psd(self):
+        '''
+        mean of the segment periodograms
+        '''
+        if self.nsegments == 0:
+            raise ValueError("no complete segments accumulated yet")
+        # channels flagged in every segment have no estimate
+        return self._layout(np.where(self.counts > 0, self._mean, np.nan))
+
+    @property
+    def variance(self):
+        '''
+        variance of the segment periodograms per frequency
+        '''
+        if not self.track_variance:
+            raise ValueError("create the accumulator with variance=True")
+        return self._layout(self._M2 / np.maximum(self.counts - 1, 1))
+
+    @property
+    def std_error(self):
+        '''
+        standard error of the mean spectrum (segments treated as independent)
+        '''
+        return np.sqrt(self.variance / self._layout(np.maximum(self.counts, 1)))
+
+    def result(self):
+        out = {'freqs': self.freqs, 'psd': self.psd, 'nsegments': self.nsegments, 'enbw': self.enbw,
+               'coherent_gain': self.coherent_gain}
+        if self.track_variance:
+            out['variance'] = self.variance
+        return out
+
+
+def welch(data, sample_rate, nperseg=1024, window='hann', overlap=0.5, scaling='density',
+          onesided=None, variance=False, continuous=None, flagger=None):
+    '''
+    Welch spectrum of an array of blocks or any iterable of blocks in one call
+
+    parameters: data = 1-D record, (nblocks, nsamples[, 2]) int8 capture, CaptureView,
+                       or an iterable of blocks (tuples from stream_ng are fine)
+                continuous = join blocks end to end (None = only for a 1-D record or stream)
+                other parameters: see PSDAccumulator
+    returns: freqs, psd (and variance if asked for)
+    '''
+    if continuous is None:
+        continuous = not (isinstance(data, CaptureView) or (isinstance(data, np.ndarray) and data.ndim > 1))
+    acc = PSDAccumulator(sample_rate, nperseg, window, overlap, scaling, onesided, variance=variance,
+                         continuous=continuous, flagger=flagger)
+    if isinstance(data, np.ndarray):
+        if data.ndim == 1:
+            data = data[None]
+        elif data.ndim == 3 and not is_iq(data):
+            raise ValueError("expected (nblocks, nsamples) or (nblocks, nsamples, 2) data")
+    for block in data:
+        acc.update(block[-1] if isinstance(block, tuple) else block)
+    if variance:
+        return acc.freqs, acc.psd, acc.variance
+    return acc.freqs, acc.psd
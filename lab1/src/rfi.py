@@ -0,0 +1,157 @@
+'''
+RFI flagging in time and frequency
+
+robust statistics only, so a strong interferer cannot hide itself by inflating the
+noise estimate:
+
+    mad_flags           samples (or spectrum cells) more than threshold robust sigmas
+                        from the median, sigma = 1.4826 * median absolute deviation
+    spectral_kurtosis   per-channel SK estimator of M power spectra (Nita & Gary 2010);
+                        1 for gaussian noise, > 1 for impulsive / bursty RFI, < 1 for
+                        steady tones
+
+RFIFlagger combines them into a boolean (nsegments, nfreq) mask per block, True =
+flagged. PSDAccumulator(flagger=RFIFlagger()) leaves flagged cells out of the average
+and keeps per-channel counts, so every channel is a proper mean of what survived.
+'''
+
+import numpy as np
+
+# median absolute deviation -> gaussian sigma
+mad_scale = 1.4826
+
+
+def _median_int8(x):
+    '''
+    exact median of int8 samples from a 256-bin bincount (no sort)
+    '''
+    counts = np.bincount(x.astype(np.int16).ravel() + 128, minlength=256)
+    cumulative = np.cumsum(counts)
+    return float(np.searchsorted(cumulative, (x.size + 1) // 2) - 128)
+
+
+def robust_sigma(x, axis=None):
+    '''
+    median and MAD-based sigma along axis (int8 samples use a bincount when axis is None)
+    returns: median, sigma
+    '''
+    x = np.asarray(x)
+    if axis is None and x.dtype == np.int8:
+        median = _median_int8(x)
+        deviation = np.abs(x.astype(np.int16) - int(median))
+        counts = np.bincount(deviation.ravel(), minlength=256)
+        mad = float(np.searchsorted(np.cumsum(counts), (x.size + 1) // 2))
+        return median, mad_scale * mad
+    median = np.median(x, axis=axis, keepdims=axis is not None)
+    sigma = mad_scale * np.median(np.abs(x - median), axis=axis, keepdims=axis is not None)
+    return median, sigma
+
+
+def mad_flags(x, threshold=5.0, axis=None):
+    '''
+    True where |x - median| > threshold * robust sigma
+
+    parameters: x = samples or power (any shape)
+                threshold = cut in robust sigmas
+                axis = axis the median / MAD are taken along (None = all of x)
+    '''
+    median, sigma = robust_sigma(x, axis)
+    sigma = np.where(sigma > 0, sigma, np.inf)
+    return np.abs(np.asarray(x, dtype=np.float64) - median) > threshold * sigma
+
+
+def spectral_kurtosis(power, axis=0, d=1.0):
+    '''
+    generalized SK estimator over M spectra
+
+    parameters: power = power spectra with the M spectra along axis
+                d = shape factor (1 for single, unaveraged fft spectra)
+    returns: SK per channel (expected value 1 for gaussian noise, std ~ 2 / sqrt(M))
+    '''
+    power = np.asarray(power, dtype=np.float64)
+    M = power.shape[axis]
+    s1 = power.sum(axis=axis)
+    s2 = (power**2).sum(axis=axis)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sk = (M * d + 1) / (M - 1) * (M * s2 / s1**2 - 1)
+    return np.where(np.isfinite(sk), sk, 1.0)
+
+
+def sk_flags(power, threshold=3.0, axis=0):
+    '''
+    True for channels whose SK is more than threshold standard deviations (2 / sqrt(M))
+    from 1
+    '''
+    M = np.shape(power)[axis]
+    return np.abs(spectral_kurtosis(power, axis) - 1) > threshold * 2 / np.sqrt(M)
+
+
+class RFIFlagger:
+    '''
+    per-block time-frequency flagger
+
+    parameters: time_threshold = robust sigmas for impulsive samples; a segment containing
+                                 one is flagged in every channel (None = off)
+                mad_threshold = robust sigmas for single spectrum cells, against the
+                                median of that channel over the block (None = off); one
+                                segment's power is exponentially distributed, so 15 is
+                                about a 1e-5 false alarm rate per cell
+                sk_threshold = SK standard deviations for whole channels over the block
+                               (None = off); the SK distribution has a long upper tail
+                               for small M, hence the wide default
+                min_segments = fewest segments per block for the per-channel statistics
+    '''
+
+    def __init__(self, time_threshold=6.0, mad_threshold=15.0, sk_threshold=5.0, min_segments=8):
+        self.time_threshold = time_threshold
+        self.mad_threshold = mad_threshold
+        self.sk_threshold = sk_threshold
+        self.min_segments = min_segments
+        self.nflagged = 0
+        self.ncells = 0
+
+    def flag_samples(self, block):
+        '''
+        True for impulsive samples of a block (real or complex)
+        '''
+        x = np.asarray(block)
+        if np.iscomplexobj(x):
+            x = np.abs(x)
+        return mad_flags(x, self.time_threshold)
+
+    def flag(self, segments, power, exclude_sk=None):
+        '''
+        time-frequency mask for one block
+
+        parameters: segments = (nseg, nperseg) time samples of each segment (before windowing)
+                    power = (nseg, nfreq) power spectra of those segments
+                    exclude_sk = channels where SK does not apply (dc / nyquist of real data,
+                                 which are not complex gaussian)
+        returns: mask = (nseg, nfreq) bool, True = flagged
+        '''
+        mask = np.zeros(power.shape, dtype=bool)
+        nseg = len(power)
+        if self.time_threshold is not None and nseg:
+            # one robust sigma for the whole block (from a subsample, the median is the
+            # slow part), then any flagged sample flags its segment
+            x = np.abs(segments) if np.iscomplexobj(segments) else segments
+            median, sigma = robust_sigma(x[:, ::max(x.size // 8192, 1)])
+            if sigma > 0:
+                mask |= (np.abs(x - median) > self.time_threshold * sigma).any(axis=1)[:, None]
+        if nseg >= self.min_segments:
+            if self.mad_threshold is not None:
+                # power is exponential, not gaussian: only flag the high side
+                median, sigma = robust_sigma(power, axis=0)
+                mask |= power - median > self.mad_threshold * np.where(sigma > 0, sigma, np.inf)
+            if self.sk_threshold is not None:
+                channels = sk_flags(power, self.sk_threshold)
+                if exclude_sk is not None:
+                    channels[exclude_sk] = False
+                mask |= channels[None, :]
+        self.nflagged += int(mask.sum())
+        self.ncells += mask.size
+        return mask
+
+    @property
+    def flagged_fraction(self):
+        return self.nflagged / self.ncells if self.ncells else 0.0
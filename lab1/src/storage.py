@@ -0,0 +1,393 @@
+'''
+compact capture storage
+
+captures stay in the sdr's native int8 (real) or interleaved int8 I/Q with shape
+(..., nsamples, 2) on disk and in memory. CaptureView hands out float32 / complex64
+copies one block at a time so a whole record is never promoted at once.
+'''
+
+import json
+import os
+import struct
+import numpy as np
+
+
+def is_iq(data):
+    '''
+    True for interleaved I/Q arrays, i.e. a last axis of length 2 on a (nblocks, nsamples, 2) array
+    '''
+    return data.ndim == 3 and data.shape[-1] == 2
+
+
+def pack_iq(data):
+    '''
+    complex array -> interleaved int8 I/Q with a trailing axis of 2
+    '''
+    packed = np.empty(data.shape + (2,), dtype=np.int8)
+    packed[..., 0] = np.clip(np.round(data.real), -128, 127)
+    packed[..., 1] = np.clip(np.round(data.imag), -128, 127)
+    return packed
+
+
+def unpack_iq(data, dtype=np.complex64):
+    '''
+    interleaved I/Q -> complex array (complex64 by default)
+    '''
+    out = np.empty(data.shape[:-1], dtype=dtype)
+    out.real = data[..., 0]
+    out.imag = data[..., 1]
+    return out
+
+
+class CaptureView:
+    '''
+    lazy float32 / complex64 view over int8 capture blocks
+
+    indexing or iterating converts only the blocks asked for:
+        view = CaptureView(data)
+        block0 = view[0]            # float32 (real) or complex64 (I/Q) copy of one block
+        for block in view: ...
+
+    parameters: data = int8 array, (nblocks, nsamples) real or (nblocks, nsamples, 2) I/Q
+                real_dtype = dtype for real blocks
+                complex_dtype = dtype for I/Q blocks
+    '''
+
+    def __init__(self, data, real_dtype=np.float32, complex_dtype=np.complex64):
+        self.raw = data
+        self.iq = is_iq(data)
+        self.dtype = np.dtype(complex_dtype if self.iq else real_dtype)
+
+    @property
+    def shape(self):
+        return self.raw.shape[:-1] if self.iq else self.raw.shape
+
+    def __len__(self):
+        return len(self.raw)
+
+    def _convert(self, raw):
+        if self.iq:
+            return unpack_iq(raw, self.dtype)
+        return raw.astype(self.dtype)
+
+    def __getitem__(self, index):
+        return self._convert(self.raw[index])
+
+    def __iter__(self):
+        for block in self.raw:
+            yield self._convert(block)
+
+
+def load_capture(path):
+    '''
+    loads a saved .npz capture without promoting it
+    returns: view = CaptureView over the int8 data
+             metadata = dictionary of the other saved fields
+    '''
+    loaded = np.load(path)
+    metadata = {key: loaded[key][()] for key in loaded.files if key != 'data'}
+    return CaptureView(loaded['data']), metadata
+
+
+def _npy_header(dtype, shape, size=128):
+    '''
+    .npy header padded to a fixed size so it can be rewritten in place as the file grows
+    '''
+    header = repr({'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False,
+                   'shape': tuple(int(n) for n in shape)})
+    header = header.ljust(size - 10 - 1) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+
+def _to_json(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def write_sidecar(path, metadata):
+    '''
+    writes capture metadata as <path>.json next to a .npy capture
+    '''
+    with open(path + '.json', 'w') as f:
+        json.dump({key: _to_json(value) for key, value in metadata.items()}, f, indent=2)
+
+
+def read_sidecar(path):
+    with open(path + '.json') as f:
+        return json.load(f)
+
+
+class MemmapWriter:
+    '''
+    writes capture blocks straight into a growable memory-mapped .npy file
+
+    the file is preallocated grow_blocks at a time and trimmed to the blocks actually
+    written on close, so only the block being written has to be in memory. the result
+    is a normal .npy file (np.load(path, mmap_mode='r') works) with a .json metadata sidecar.
+    the header is rewritten after every append and the sidecar every time the file grows
+    (its nblocks can lag, the header is the true count), so a run that is killed part way
+    still loads with every block appended before that.
+
+    parameters: path = output .npy file
+                block_shape = shape of one block, (nsamples,) or (nsamples, 2) for I/Q
+                metadata = capture parameters for the sidecar (None = no sidecar)
+                dtype = sample dtype (int8 for the sdr)
+                grow_blocks = blocks added each time the file runs out of room
+    '''
+
+    header_size = 128
+
+    def __init__(self, path, block_shape, metadata=None, dtype=np.int8, grow_blocks=64):
+        self.path = path
+        self.block_shape = tuple(block_shape)
+        self.dtype = np.dtype(dtype)
+        self.metadata = None if metadata is None else dict(metadata)
+        self.grow_blocks = grow_blocks
+        self.block_bytes = int(np.prod(self.block_shape)) * self.dtype.itemsize
+        self.nblocks = 0
+        self.capacity = 0
+        self._map = None
+        self._file = open(path, 'w+b')
+        self._write_header()
+
+    def _write_header(self):
+        # the shape in the header is what readers see, extra preallocated room is ignored
+        self._file.seek(0)
+        self._file.write(_npy_header(self.dtype, (self.nblocks,) + self.block_shape, self.header_size))
+        self._file.flush()
+
+    def _write_sidecar(self):
+        if self.metadata is not None:
+            self.metadata['nblocks'] = self.nblocks
+            write_sidecar(self.path, self.metadata)
+
+    def _grow(self, needed):
+        self.capacity = max(needed, self.capacity + self.grow_blocks)
+        self._file.truncate(self.header_size + self.capacity * self.block_bytes)
+        self._map = np.memmap(self._file, dtype=self.dtype, mode='r+', offset=self.header_size,
+                              shape=(self.capacity,) + self.block_shape)
+
+    def append(self, blocks):
+        '''
+        appends one block or a (n, *block_shape) stack of blocks
+        '''
+        blocks = np.asarray(blocks, dtype=self.dtype).reshape((-1,) + self.block_shape)
+        end = self.nblocks + len(blocks)
+        grew = end > self.capacity
+        if grew:
+            self._grow(end)
+        self._map[self.nblocks:end] = blocks
+        self.nblocks = end
+        self._write_header()
+        if grew:
+            self._write_sidecar()
+
+    def close(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map = None
+        self._file.truncate(self.header_size + self.nblocks * self.block_bytes)
+        self._write_header()
+        self._file.close()
+        self._write_sidecar()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_memmap_capture(path):
+    '''
+    reopens a MemmapWriter capture without reading it into memory
+    returns: view = CaptureView over the memory-mapped int8 data
+             metadata = dictionary from the .json sidecar
+    '''
+    return CaptureView(np.load(path, mmap_mode='r')), read_sidecar(path)
+
+
+class ChunkedDataset:
+    '''
+    capture stored as a directory of .npy chunks plus a manifest.json
+
+        <path>/manifest.json        dtype, block shape, metadata and the chunk list
+        <path>/chunk_000000.npy     blocks_per_chunk blocks each (the last may be short)
+
+    chunks are opened memory-mapped only when a block inside them is asked for, so
+    reading one block or sample range costs about that much I/O whatever the run size.
+    a dataset opened with create() can be appended to while a capture runs; the
+    manifest is rewritten each time a chunk is finished, and a reader asked for a
+    block past the end it knows re-reads it (or call refresh()) to see the new chunks.
+
+    reading:  ds = ChunkedDataset(path); ds[3]; ds[2:5]; ds.samples(1000, 5000)
+    writing:  with ChunkedDataset.create(path, (16384,), metadata) as ds: ds.append(blocks)
+    '''
+
+    def __init__(self, path, mode='r'):
+        self.path = path
+        self.mode = mode
+        manifest = self._read_manifest()
+        self.dtype = np.dtype(manifest['dtype'])
+        self.block_shape = tuple(manifest['block_shape'])
+        self.blocks_per_chunk = manifest['blocks_per_chunk']
+        self.metadata = manifest['metadata']
+        self._set_chunks(manifest['chunks'])
+        self._maps = {}
+        self._writer = None
+
+    def _read_manifest(self):
+        with open(os.path.join(self.path, 'manifest.json')) as f:
+            return json.load(f)
+
+    def _set_chunks(self, chunks):
+        self.chunks = chunks
+        # running block count at the end of every chunk, for bisecting block indices
+        self._ends = np.cumsum([chunk['nblocks'] for chunk in chunks], dtype=np.int64)
+
+    def refresh(self):
+        '''
+        re-reads the manifest to pick up chunks finished since it was opened (read mode only)
+        returns: nblocks = number of blocks now available
+        '''
+        if self.mode == 'r':
+            self._set_chunks(self._read_manifest()['chunks'])
+        return self.nblocks
+
+    @classmethod
+    def create(cls, path, block_shape, metadata=None, dtype=np.int8, blocks_per_chunk=16):
+        os.makedirs(path, exist_ok=True)
+        manifest = {'dtype': np.dtype(dtype).str, 'block_shape': list(block_shape),
+                    'blocks_per_chunk': blocks_per_chunk,
+                    'metadata': {key: _to_json(value) for key, value in (metadata or {}).items()},
+                    'chunks': []}
+        with open(os.path.join(path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return cls(path, mode='a')
+
+    def _write_manifest(self):
+        manifest = {'dtype': self.dtype.str, 'block_shape': list(self.block_shape),
+                    'blocks_per_chunk': self.blocks_per_chunk, 'metadata': self.metadata,
+                    'chunks': self.chunks}
+        tmp = os.path.join(self.path, 'manifest.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        # replace in one step so a reader never sees a half written manifest
+        os.replace(tmp, os.path.join(self.path, 'manifest.json'))
+
+    def _finish_chunk(self):
+        self._writer.close()
+        self._set_chunks(self.chunks + [{'file': os.path.basename(self._writer.path),
+                                         'nblocks': self._writer.nblocks}])
+        self._writer = None
+        self._write_manifest()
+
+    def append(self, blocks):
+        '''
+        appends one block or a stack of blocks
+        '''
+        if self.mode != 'a':
+            raise IOError("dataset is read-only, open it with ChunkedDataset.create")
+        blocks = np.asarray(blocks, dtype=self.dtype).reshape((-1,) + self.block_shape)
+        while len(blocks):
+            if self._writer is None:
+                name = f'chunk_{len(self.chunks):06d}.npy'
+                self._writer = MemmapWriter(os.path.join(self.path, name), self.block_shape, dtype=self.dtype,
+                                            grow_blocks=self.blocks_per_chunk)
+            room = self.blocks_per_chunk - self._writer.nblocks
+            self._writer.append(blocks[:room])
+            blocks = blocks[room:]
+            if self._writer.nblocks == self.blocks_per_chunk:
+                self._finish_chunk()
+
+    def close(self):
+        if self._writer is not None:
+            self._finish_chunk()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def nblocks(self):
+        return int(self._ends[-1]) if len(self._ends) else 0
+
+    @property
+    def shape(self):
+        return (self.nblocks,) + self.block_shape
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def __len__(self):
+        return self.nblocks
+
+    def _chunk(self, index):
+        if index not in self._maps:
+            self._maps[index] = np.load(os.path.join(self.path, self.chunks[index]['file']), mmap_mode='r')
+        return self._maps[index]
+
+    def _locate(self, block):
+        '''
+        chunk number and position inside it of a block index
+        '''
+        index = int(np.searchsorted(self._ends, block, side='right'))
+        if index == len(self.chunks):
+            raise IndexError("block index out of range")
+        return index, block - (int(self._ends[index - 1]) if index else 0)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.stop is None or index.stop > self.nblocks:
+                self.refresh()
+            blocks = range(*index.indices(self.nblocks))
+            if len(blocks) == 0:
+                return np.empty((0,) + self.block_shape, dtype=self.dtype)
+            return np.stack([self[i] for i in blocks])
+        nblocks = self.nblocks
+        if index >= nblocks:
+            # a capture may still be writing: look for chunks finished since the last read
+            nblocks = self.refresh()
+        if index < -nblocks or index >= nblocks:
+            raise IndexError(f"block index {index} out of range for {nblocks} blocks")
+        if index < 0:
+            index += nblocks
+        chunk, position = self._locate(index)
+        return self._chunk(chunk)[position]
+
+    def __iter__(self):
+        for chunk in range(len(self.chunks)):
+            yield from self._chunk(chunk)
+
+    def samples(self, start, stop):
+        '''
+        samples start:stop of the record as if all blocks were joined end to end
+        '''
+        nsamples = self.block_shape[0]
+        first, last = start // nsamples, (stop - 1) // nsamples
+        joined = self[first:last + 1].reshape((-1,) + self.block_shape[1:])
+        return joined[start - first * nsamples:stop - first * nsamples]
+
+    def view(self):
+        '''
+        CaptureView giving float32 / complex64 blocks
+        '''
+        return CaptureView(self)
+
+
+def save_chunked(data, metadata, path, blocks_per_chunk=16):
+    '''
+    writes an in-memory capture (e.g. from np.load of an old .npz) as a ChunkedDataset
+    '''
+    data = np.asarray(data)
+    with ChunkedDataset.create(path, data.shape[1:], metadata, dtype=data.dtype,
+                               blocks_per_chunk=blocks_per_chunk) as dataset:
+        dataset.append(data)
+    print(f"Saved: {path}")
+    return dataset
@@ -0,0 +1,173 @@
+'''
+declarative capture sweeps
+
+a sweep spec is a dict (or a YAML/JSON file) like
+
+    capture: sine             # sine, ng or iq_mixer
+    output: sweep_out         # folder for the .npz files and results.csv
+    fixed:                    # arguments shared by every capture
+      signal_freq: 7.5e5
+      nsamples: 2048
+    grid:                     # every combination of these is captured
+      sample_rate: {start: 1.0e6, stop: 3.2e6, step: 1.0e5}
+      bypass_filter: [false, true]
+
+captures run back to back on one SDRSession while saving and the spectrum/peak of
+the previous capture run on worker threads.
+'''
+
+import csv
+import itertools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from src import aliasing, analysis
+from src.acquiring_data import (SDRSession, capture_iq_mixer, capture_ng, capture_sine_wave,
+                                save_data, sci_filename)
+from src.peaks import find_peaks
+from src.storage import CaptureView
+
+capture_functions = {'sine': capture_sine_wave, 'ng': capture_ng, 'iq_mixer': capture_iq_mixer}
+
+
+def load_spec(path):
+    '''
+    reads a sweep spec from a .yaml/.yml or .json file
+    '''
+    with open(path) as f:
+        if path.endswith('.json'):
+            return json.load(f)
+        if yaml is None:
+            raise ImportError("pyyaml is needed to read YAML sweep specs")
+        return yaml.safe_load(f)
+
+
+def _axis_values(values):
+    '''
+    grid axis as a list; {start, stop, step} dicts are expanded with np.arange
+    '''
+    if isinstance(values, dict):
+        return [float(v) for v in np.arange(values['start'], values['stop'], values['step'])]
+    if isinstance(values, (list, tuple)):
+        return list(values)
+    return [values]
+
+
+def expand_grid(spec):
+    '''
+    returns: points = list of capture argument dicts, one per grid point
+    '''
+    fixed = dict(spec.get('fixed', {}))
+    grid = spec.get('grid', {})
+    names = list(grid)
+    axes = [_axis_values(grid[name]) for name in names]
+    points = []
+    for combo in itertools.product(*axes):
+        point = dict(fixed)
+        point.update(zip(names, combo))
+        points.append(point)
+    return points
+
+
+def _filename(capture, metadata, index):
+    # the point index keeps points captured within the same second apart
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    sci_sr = sci_filename(metadata['sample_rate'])
+    settings = f"samples{sci_filename(metadata['nsamples'])}_gain{sci_filename(metadata['gain'])}"
+    if capture == 'sine':
+        state = 'bypassed' if metadata['filter_bypassed'] else 'filtered'
+        name = f"{state}_f{sci_filename(metadata['signal_freq'])}_sr{sci_sr}_{settings}"
+    elif capture == 'ng':
+        name = f"noise_sr{sci_sr}_{sci_filename(metadata['nblocks'])}_{settings}"
+    else:
+        name = f"mixer_sr{sci_sr}_lo_freq{sci_filename(metadata['lo_freq'])}_{settings}"
+    return f"{name}_point{index:04d}_{timestamp}.npz"
+
+
+def _save_and_analyze(capture, data, metadata, directory, index):
+    '''
+    worker thread job: saves one capture and finds its spectral peak
+    '''
+    filename = _filename(capture, metadata, index)
+    save_time = save_data(data, metadata, filename, directory)
+
+    block = CaptureView(data)[0]
+    # remove the dc offset first (as aliasing.measure_peaks does) so bin 0 is never the peak
+    freqs, power = analysis.compute_power_spectrum(block - np.mean(block), metadata['sample_rate'])
+    # real data: the spectrum is symmetric, only look at positive frequencies
+    fmin = None if np.iscomplexobj(block) else 0
+    peak = find_peaks(freqs, power, fmin=fmin, method='gaussian')
+
+    row = {key: value for key, value in metadata.items() if np.isscalar(value)}
+    row.update({'filename': filename, 'peak_freq': peak['freq'][0], 'peak_power': peak['power'][0],
+                'peak_snr': peak['snr'][0], 'save_time': save_time})
+    return row
+
+
+def run_sweep(spec, session=None, workers=2, max_pending=4):
+    '''
+    runs every point of a sweep spec, overlapping captures with saving and analysis
+
+    parameters: spec = sweep spec dict or path to a YAML/JSON file
+                session = open SDRSession to reuse (None = open one for the sweep)
+                workers = number of save/analysis threads
+                max_pending = max captures waiting on the workers (bounds memory)
+    returns: rows = list of result dicts, also written to <output>/results.csv
+    '''
+    if isinstance(spec, str):
+        spec = load_spec(spec)
+    capture = spec.get('capture', 'sine')
+    if capture not in capture_functions:
+        raise ValueError(f"capture must be one of {list(capture_functions)}")
+    capture_function = capture_functions[capture]
+    directory = spec.get('output', f"sweep_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(directory, exist_ok=True)
+    points = expand_grid(spec)
+
+    owns_session = session is None
+    if owns_session:
+        session = SDRSession(direct=capture != 'iq_mixer').open()
+
+    pending = []
+    rows = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for index, point in enumerate(points):
+                # wait for the oldest job so at most max_pending captures sit in memory
+                if len(pending) >= max_pending:
+                    rows.append(pending.pop(0).result())
+                data, metadata = capture_function(session=session, **point)
+                # the capture functions don't record the gain, which is a session setting
+                metadata.setdefault('gain', session.gain)
+                pending.append(pool.submit(_save_and_analyze, capture, data, metadata, directory, index))
+            rows.extend(future.result() for future in pending)
+    finally:
+        if owns_session:
+            session.close()
+
+    write_results(rows, os.path.join(directory, 'results.csv'))
+    if capture == 'sine':
+        # check every measured peak against where the tone should have aliased to
+        aliasing.summarize(aliasing.compare_peaks(rows))
+    return rows
+
+
+def write_results(rows, path):
+    '''
+    writes the sweep results table as csv
+    '''
+    columns = []
+    for row in rows:
+        columns.extend(key for key in row if key not in columns)
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Saved: {path}")
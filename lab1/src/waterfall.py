@@ -0,0 +1,237 @@
+'''
+streaming short-time fft / waterfall
+
+turns a capture (in memory, memory-mapped, chunked on disk or live) into a
+(ntime, nfreq) dynamic spectrum. segments of nfft samples every hop samples go through
+one batched fft per block, integration consecutive spectra are averaged into one row,
+and rows are appended to a memory-mapped .npy as they are made, so an hour-long run
+never has more than a block in memory. the file's header and settings sidecar are kept
+current while rows are added, so load_waterfall can read a run that is still going.
+
+    wf = Waterfall(sample_rate, nfft=1024, hop=1024, integration=64, path='run.npy')
+    for index, timestamp, block in stream_ng(sample_rate, nsamples):
+        wf.update(block)
+    wf.close()
+
+    rows, metadata = load_waterfall('run.npy')          # memory-mapped
+    plotting_stuff.plot_waterfall(rows, metadata)       # renders a time-decimated copy
+'''
+
+import numpy as np
+from scipy import fft as sp_fft
+
+from src.psd import window_info
+from src.storage import CaptureView, MemmapWriter, read_sidecar, unpack_iq, write_sidecar
+
+
+class Waterfall:
+    '''
+    incremental dynamic spectrum
+
+    parameters: sample_rate = sampling rate in Hz
+                nfft = fft length (frequency resolution sample_rate / nfft)
+                hop = samples between segment starts (None = nfft, no overlap)
+                integration = spectra averaged into each output row
+                window = scipy window name (normalized so a row is in V^2/Hz, one-sided for
+                         real data like psd.welch)
+                path = .npy file the rows are written to (None = keep them in memory)
+                metadata = capture metadata stored in the sidecar with the waterfall settings
+                start_time = time of the first sample (s), e.g. a stream block timestamp
+    note: blocks are joined end to end, so segments straddle block boundaries
+    '''
+
+    def __init__(self, sample_rate, nfft=1024, hop=None, integration=1, window='hann', path=None,
+                 metadata=None, start_time=0.0):
+        self.sample_rate = sample_rate
+        self.nfft = nfft
+        self.hop = nfft if hop is None else hop
+        self.integration = integration
+        self.window = window
+        self.w = window_info(window, nfft)[0].astype(np.float32)
+        self.scale = 1 / (sample_rate * np.sum(self.w.astype(np.float64)**2))
+        self.path = path
+        self.start_time = start_time
+        self.metadata = dict(metadata or {})
+        self.is_complex = None
+        self.nrows = 0
+        self._writer = None
+        self._rows = []
+        self._leftover = None
+        self._partial = None
+        self._npartial = 0
+
+    @property
+    def freqs(self):
+        if self.is_complex:
+            return np.fft.fftshift(np.fft.fftfreq(self.nfft, d=1/self.sample_rate))
+        return np.fft.rfftfreq(self.nfft, d=1/self.sample_rate)
+
+    @property
+    def time_resolution(self):
+        return self.hop * self.integration / self.sample_rate
+
+    @property
+    def times(self):
+        '''
+        start time of every row written so far (s)
+        '''
+        return self.start_time + np.arange(self.nrows) * self.time_resolution
+
+    def _settings(self):
+        out = dict(self.metadata)
+        out.update({'sample_rate': self.sample_rate, 'nfft': self.nfft, 'hop': self.hop,
+                    'integration': self.integration, 'window': str(self.window),
+                    'time_resolution': self.time_resolution, 'start_time': self.start_time,
+                    'is_complex': bool(self.is_complex), 'freq_min': float(self.freqs[0]),
+                    'freq_max': float(self.freqs[-1])})
+        return out
+
+    def _spectra(self, x):
+        if self._leftover is not None:
+            x = np.concatenate([self._leftover, x])
+        nseg = (len(x) - self.nfft) // self.hop + 1 if len(x) >= self.nfft else 0
+        self._leftover = x[nseg * self.hop:]
+        if nseg == 0:
+            return np.zeros((0, len(self.freqs)), dtype=np.float32)
+        segments = np.lib.stride_tricks.sliding_window_view(x, self.nfft)[::self.hop][:nseg] * self.w
+        if self.is_complex:
+            spectrum = np.fft.fftshift(sp_fft.fft(segments, axis=1), axes=1)
+        else:
+            spectrum = sp_fft.rfft(segments, axis=1)
+        power = (spectrum.real**2 + spectrum.imag**2) * np.float32(self.scale)
+        if not self.is_complex:
+            # one-sided: fold the negative frequencies in, as PSDAccumulator does
+            last = None if self.nfft % 2 else -1
+            power[:, 1:last] *= 2
+        return power
+
+    def _integrate(self, spectra):
+        # finish the row left open by the previous block, then whole groups, then keep the rest
+        rows = []
+        if self._npartial:
+            need = self.integration - self._npartial
+            self._partial += spectra[:need].sum(axis=0)
+            self._npartial += len(spectra[:need])
+            spectra = spectra[need:]
+            if self._npartial < self.integration:
+                return np.zeros((0, spectra.shape[1]), dtype=np.float32)
+            rows.append(self._partial / self.integration)
+            self._npartial = 0
+        nfull = len(spectra) // self.integration
+        if nfull:
+            grouped = spectra[:nfull * self.integration].reshape(nfull, self.integration, -1)
+            rows.extend(grouped.mean(axis=1))
+        rest = spectra[nfull * self.integration:]
+        if len(rest):
+            self._partial = rest.sum(axis=0)
+            self._npartial = len(rest)
+        if not rows:
+            return np.zeros((0, spectra.shape[1]), dtype=np.float32)
+        return np.asarray(rows, dtype=np.float32)
+
+    def _open_writer(self):
+        # settings go in the sidecar now, so readers can use the file before close
+        self._writer = MemmapWriter(self.path, (len(self.freqs),), metadata=self._settings(), dtype=np.float32,
+                                    grow_blocks=1024)
+        write_sidecar(self.path, self._writer.metadata)
+
+    def update(self, block):
+        '''
+        adds the next block of the stream
+        parameters: block = 1-D real or complex samples (int8 is fine), or an (nsamples, 2) I/Q block
+        returns: rows completed by this block, (nrows, nfreq) float32
+        '''
+        x = np.asarray(block)
+        if x.ndim == 2 and x.shape[-1] == 2:
+            x = unpack_iq(x)
+        if self.is_complex is None:
+            self.is_complex = np.iscomplexobj(x)
+        x = x.astype(np.complex64 if self.is_complex else np.float32, copy=False)
+
+        if self.path is not None and self._writer is None:
+            self._open_writer()
+        rows = self._integrate(self._spectra(x))
+        if len(rows):
+            if self.path is not None:
+                self._writer.append(rows)
+            else:
+                self._rows.append(rows)
+            self.nrows += len(rows)
+        return rows
+
+    def close(self):
+        '''
+        finishes the file (partial rows at the end are dropped)
+        returns: the rows in memory, or the memory-mapped file if written to disk
+        '''
+        if self.path is not None and self._writer is None:
+            # no blocks yet: still leave an empty waterfall behind
+            self._open_writer()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self.path is not None:
+            return load_waterfall(self.path)[0]
+        if not self._rows:
+            return np.zeros((0, len(self.freqs)), dtype=np.float32)
+        return np.concatenate(self._rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def compute_waterfall(source, sample_rate, nfft=1024, hop=None, integration=1, window='hann', path=None,
+                      metadata=None):
+    '''
+    waterfall of a whole capture in one call
+
+    parameters: source = int8 capture array (memory-mapped is fine), CaptureView, ChunkedDataset,
+                         or an iterable of blocks / (index, timestamp, block) tuples
+                other parameters: see Waterfall
+    returns: freqs = frequency of each column in Hz
+             rows = (ntime, nfreq) dynamic spectrum (memory-mapped if path is given)
+             times = start time of each row (s)
+    '''
+    if isinstance(source, np.ndarray):
+        if source.dtype == np.int8:
+            # raw sdr data: convert one block at a time
+            source = CaptureView(source if source.ndim > 1 else source[None])
+        else:
+            source = source.reshape(-1, source.shape[-1])
+    wf = Waterfall(sample_rate, nfft, hop, integration, window, path, metadata)
+    for item in source:
+        wf.update(item[-1] if isinstance(item, tuple) else item)
+    rows = wf.close()
+    return wf.freqs, rows, wf.times
+
+
+def load_waterfall(path):
+    '''
+    memory-mapped rows of a saved waterfall and its settings from the sidecar
+    '''
+    return np.load(path, mmap_mode='r'), read_sidecar(path)
+
+
+def downsample_rows(rows, max_rows=1000, chunk_rows=4096):
+    '''
+    averages groups of rows so at most max_rows are left, reading chunk_rows at a time
+    (the whole file is never in memory)
+
+    returns: reduced = (<= max_rows, nfreq) array, factor = rows averaged per output row
+    '''
+    factor = max(int(np.ceil(len(rows) / max_rows)), 1)
+    chunk_rows = max(chunk_rows // factor, 1) * factor
+    out = []
+    for start in range(0, len(rows), chunk_rows):
+        chunk = np.asarray(rows[start:start + chunk_rows], dtype=np.float64)
+        nfull = len(chunk) // factor
+        if nfull:
+            out.append(chunk[:nfull * factor].reshape(nfull, factor, -1).mean(axis=1))
+        if len(chunk) % factor:
+            out.append(chunk[nfull * factor:].mean(axis=0, keepdims=True))
+    if not out:
+        return np.zeros((0,) + rows.shape[1:]), factor
+    return np.concatenate(out), factor
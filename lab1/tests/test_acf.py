@@ -0,0 +1,50 @@
+'''
+autocorrelation over a limited lag range (user-014)
+'''
+
+import numpy as np
+import pytest
+
+from src.analysis import compute_acf
+
+
+def _reference(x, max_lag):
+    # full np.correlate of the mean-removed block, cut to -max_lag..max_lag, divided by lag 0
+    x = x - x.mean()
+    full = np.correlate(x, x, mode='full')
+    middle = len(x) - 1
+    r = full[middle - max_lag:middle + max_lag + 1]
+    return r / full[middle]
+
+
+@pytest.mark.parametrize('method', ['fft', 'direct', 'auto'])
+@pytest.mark.parametrize('complex_input', [False, True])
+def test_acf_matches_np_correlate(method, complex_input):
+    rng = np.random.default_rng(5)
+    data = rng.normal(size=(3, 200))
+    if complex_input:
+        data = data + 1j * rng.normal(size=(3, 200))
+    lags, acf = compute_acf(data, max_lag=12, method=method)
+    np.testing.assert_array_equal(lags, np.arange(-12, 13))
+    assert acf.shape == (3, 25) and np.iscomplexobj(acf) == complex_input
+    for block, row in zip(data, acf):
+        np.testing.assert_allclose(row, _reference(block, 12), rtol=1e-9, atol=1e-12)
+
+
+def test_full_lag_range_and_int8():
+    rng = np.random.default_rng(6)
+    x = rng.integers(-128, 128, 64).astype(np.int8)
+    lags, acf = compute_acf(x)
+    assert len(lags) == 127
+    np.testing.assert_allclose(acf, _reference(x.astype(float), 63), atol=1e-12)
+
+
+def test_average_normalizes_after_summing():
+    rng = np.random.default_rng(7)
+    data = rng.normal(size=(4, 100)) * np.array([1, 2, 3, 4])[:, None]
+    _, acf = compute_acf(data, max_lag=5, average=True)
+    raw = [np.correlate(b - b.mean(), b - b.mean(), mode='full')[99 - 5:99 + 6] for b in data]
+    mean = np.mean(raw, axis=0)
+    np.testing.assert_allclose(acf, mean / mean[5], rtol=1e-9)
+    with pytest.raises(ValueError):
+        compute_acf(data, max_lag=5, method='nope')
@@ -0,0 +1,58 @@
+'''
+ADC code histogram and quantized gaussian fit (user-016)
+'''
+
+import numpy as np
+import pytest
+from scipy import stats
+
+from src.analysis import fit_gaussian
+from src.noise_stats import adc_codes, adc_edges, adc_histogram, code_flags, fit_quantized_gaussian
+
+
+def _codes(mu, sigma, n=200000, seed=9):
+    rng = np.random.default_rng(seed)
+    return np.clip(np.round(rng.normal(mu, sigma, n)), -128, 127).astype(np.int8)
+
+
+def test_histogram_matches_np_histogram():
+    x = _codes(-4, 30, n=5000)
+    counts = adc_histogram(x)
+    np.testing.assert_array_equal(counts, np.histogram(x, bins=adc_edges)[0])
+    np.testing.assert_array_equal(adc_histogram(x[2500:], adc_histogram(x[:2500])), counts)
+    with pytest.raises(ValueError):
+        adc_histogram(np.array([200]))
+
+
+def test_fit_recovers_quantized_and_clipped_gaussians():
+    # sigma below one code: the plain moments of the rounded samples are biased
+    fit = fit_quantized_gaussian(adc_histogram(_codes(0.3, 0.6)))
+    assert fit['mu'] == pytest.approx(0.3, abs=0.01)
+    assert fit['sigma'] == pytest.approx(0.6, abs=0.01)
+    assert fit['p_value'] > 1e-3
+
+    # heavy clipping at the rails: the end codes carry the tails
+    counts = adc_histogram(_codes(20, 80))
+    fit = fit_quantized_gaussian(counts)
+    assert fit['mu'] == pytest.approx(20, abs=0.5)
+    assert fit['sigma'] == pytest.approx(80, rel=0.01)
+    expected = counts.sum() * np.diff(stats.norm.cdf(np.r_[-np.inf, adc_codes[1:] - 0.5, np.inf], 20, 80))
+    np.testing.assert_allclose(fit['expected'], expected, rtol=0.02, atol=5)
+
+
+def test_code_flags_find_stuck_and_missing_codes():
+    counts = adc_histogram(_codes(0, 10))
+    counts[7 + 128] += 5000
+    counts[-3 + 128] = 0
+    flags = code_flags(counts, fit_quantized_gaussian(counts, exclude=[7, -3]))
+    assert list(flags['stuck']) == [7]
+    assert list(flags['missing']) == [-3]
+    assert flags['clipped_fraction'] == 0
+
+
+def test_fit_gaussian_quantized():
+    x = _codes(1, 2, n=20000)
+    hist, centers, model = fit_gaussian(x, quantized=True)
+    assert centers[0] == x.min() and centers[-1] == x.max()
+    np.testing.assert_allclose(hist.sum(), 1)
+    np.testing.assert_allclose(hist, model, atol=0.01)
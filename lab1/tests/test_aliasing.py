@@ -0,0 +1,59 @@
+'''
+alias prediction and peak comparison (user-019)
+'''
+
+from functools import partial
+import numpy as np
+
+from src.acquiring_data import SDRSession, capture_iq_mixer, capture_sine_wave, save_data
+from src.aliasing import alias_grid, compare_peaks, measure_peaks, predict_alias
+from src.backends import SimulatedSDR
+
+
+def test_real_folding_matches_brute_force():
+    rng = np.random.default_rng(13)
+    freqs = rng.uniform(0, 10e6, 200)
+    rates = rng.uniform(0.5e6, 3.2e6, 7)
+    apparent, zone = alias_grid(freqs, rates)
+    assert apparent.shape == zone.shape == (7, 200)
+    for i, fs in enumerate(rates):
+        for j, f in enumerate(freqs):
+            # nearest image of the tone among f - k fs, folded to positive frequency
+            images = np.abs(f - np.arange(-20, 21) * fs)
+            assert np.isclose(apparent[i, j], np.min(images), rtol=1e-12)
+            assert zone[i, j] == int(f // (fs / 2)) + 1
+
+
+def test_iq_wrapping_matches_brute_force():
+    rng = np.random.default_rng(14)
+    freqs = 100e6 + rng.uniform(-8e6, 8e6, 300)
+    apparent, zone = predict_alias(freqs, 2.4e6, lo_freq=100e6, iq=True)
+    for f, a, z in zip(freqs, apparent, zone):
+        images = (f - 100e6) - np.arange(-10, 11) * 2.4e6
+        best = images[np.argmin(np.abs(images))]
+        assert np.isclose(a, best) and np.isclose(a, (f - 100e6) - z * 2.4e6)
+        assert -1.2e6 <= a < 1.2e6
+
+
+def test_measured_captures_land_on_the_prediction(tmp_path):
+    paths = []
+    for signal_freq, fs in ((3e5, 1e6), (7.5e5, 1e6), (2.6e6, 2e6)):
+        backend = partial(SimulatedSDR, signal='sine', signal_freq=signal_freq, noise_std=1, seed=0)
+        with SDRSession(backend=backend) as session:
+            data, metadata = capture_sine_wave(signal_freq, sample_rate=fs, nsamples=1024, session=session)
+        save_data(data, metadata, f'sine_{len(paths)}.npz', str(tmp_path))
+        paths.append(str(tmp_path / f'sine_{len(paths)}.npz'))
+    backend = partial(SimulatedSDR, signal='mixer', signal_freq=101.9e6, noise_std=1, seed=0)
+    with SDRSession(backend=backend) as session:
+        data, metadata = capture_iq_mixer(sample_rate=1.5e6, nsamples=1024, lo_freq=101e6, session=session)
+    save_data(data, metadata, 'mixer.npz', str(tmp_path))
+    paths.append(str(tmp_path / 'mixer.npz'))
+    rows = measure_peaks(paths)
+    rows[-1]['signal_freq'] = 101.9e6
+
+    report = compare_peaks(rows)
+    np.testing.assert_allclose(report['predicted'], [3e5, 2.5e5, 6e5, -6e5])
+    np.testing.assert_array_equal(report['zone'], [1, 2, 3, 1])
+    assert report['ok'].all()
+    # the tones sit off the fft bins and there is no window: a fraction of a bin off
+    assert np.all(np.abs(report['residual_bins']) < 0.25)
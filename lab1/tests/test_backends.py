@@ -0,0 +1,121 @@
+'''
+SimulatedSDR and ReplaySDR (user-003)
+'''
+
+import numpy as np
+import pytest
+
+from src.backends import ReplaySDR, SimulatedSDR
+
+
+def test_simulated_shapes_and_tone():
+    sdr = SimulatedSDR(sample_rate=1e6, signal='sine', signal_freq=125e3, amplitude=40, noise_std=1, seed=0)
+    data = sdr.capture_data(nsamples=1024, nblocks=3)
+    assert data.shape == (3, 1024) and data.dtype == np.int8
+    # the phase carries on across blocks and calls, like one long record
+    t = np.arange(2 * 3 * 1024) / 1e6
+    reference = 40 * np.cos(2 * np.pi * 125e3 * t)
+    record = np.concatenate([data.ravel(), sdr.capture_data(nsamples=1024, nblocks=3).ravel()])
+    assert np.max(np.abs(record - reference)) < 6
+
+    sdr.set_direct_sampling(False)
+    assert sdr.capture_data(nsamples=64, nblocks=2).shape == (2, 64, 2)
+
+
+def test_simulated_mixer_offset_frequency():
+    sdr = SimulatedSDR(direct=False, center_freq=100e6, sample_rate=1e6, signal='mixer',
+                       signal_freq=100.25e6, noise_std=1, seed=0)
+    iq = sdr.capture_data(nsamples=1024, nblocks=1)[0].astype(float)
+    spectrum = np.abs(np.fft.fft(iq[:, 0] + 1j * iq[:, 1]))
+    freqs = np.fft.fftfreq(1024, d=1e-6)
+    assert freqs[np.argmax(spectrum)] == pytest.approx(250e3, abs=1e6 / 1024)
+
+
+def _save(path, data, **metadata):
+    np.savez(path, data=data, **metadata)
+
+
+def test_replay_loops_over_the_files_in_order(tmp_path):
+    a = np.arange(0, 12, dtype=np.int8).reshape(2, 6)
+    b = np.arange(12, 18, dtype=np.int8).reshape(1, 6)
+    _save(tmp_path / 'a.npz', a, sample_rate=1e6, filter_bypassed=False)
+    _save(tmp_path / 'b.npz', b, sample_rate=1e6, filter_bypassed=False)
+    sdr = ReplaySDR(str(tmp_path))
+    assert sdr.sample_rate == 1e6 and sdr.direct
+    stream = np.concatenate([a.ravel(), b.ravel()])
+    out = np.concatenate([sdr.capture_data(nsamples=5, nblocks=2).ravel() for _ in range(3)])
+    np.testing.assert_array_equal(out, np.resize(stream, 30))
+
+    sdr = ReplaySDR(str(tmp_path), loop=False)
+    sdr.capture_data(nsamples=18)
+    with pytest.raises(EOFError):
+        sdr.capture_data(nsamples=1)
+
+
+def test_replay_keeps_iq_pairs(tmp_path):
+    iq = np.arange(40, dtype=np.int8).reshape(2, 10, 2)
+    _save(tmp_path / 'mixer.npz', iq, sample_rate=2e6)
+    sdr = ReplaySDR(str(tmp_path / 'mixer.npz'))
+    assert not sdr.direct
+    np.testing.assert_array_equal(sdr.capture_data(nsamples=10, nblocks=2), iq)
+
+
+def test_replay_does_not_mix_settings(tmp_path):
+    _save(tmp_path / 'slow.npz', np.zeros((1, 8), np.int8), sample_rate=1e6, filter_bypassed=False)
+    _save(tmp_path / 'fast.npz', np.ones((1, 8), np.int8), sample_rate=2e6, filter_bypassed=False)
+    _save(tmp_path / 'bypassed.npz', np.full((1, 8), 2, np.int8), sample_rate=2e6, filter_bypassed=True)
+    with pytest.raises(ValueError):
+        ReplaySDR(str(tmp_path))
+    with pytest.raises(ValueError):
+        ReplaySDR(str(tmp_path), sample_rate=2e6)
+
+    sdr = ReplaySDR(str(tmp_path), sample_rate=2e6, filter_bypassed=True)
+    assert sdr.files == [str(tmp_path / 'bypassed.npz')]
+    np.testing.assert_array_equal(sdr.capture_data(nsamples=8), 2)
+    assert ReplaySDR(str(tmp_path), sample_rate=1e6).sample_rate == 1e6
+    with pytest.raises(FileNotFoundError):
+        ReplaySDR(str(tmp_path), sample_rate=3e6)
+
+
+def test_replay_does_not_join_different_tones(tmp_path):
+    for freq in (7.5e5, 1e6):
+        _save(tmp_path / f'tone_{int(freq)}.npz', np.full((1, 8), int(freq // 1e5), np.int8), sample_rate=2e6,
+              filter_bypassed=True, signal_freq=freq, nsamples=8)
+    _save(tmp_path / 'long.npz', np.zeros((1, 16), np.int8), sample_rate=2e6, filter_bypassed=True,
+          signal_freq=1e6)
+    with pytest.raises(ValueError):
+        ReplaySDR(str(tmp_path), sample_rate=2e6, filter_bypassed=True)
+    # same tone, different block lengths
+    with pytest.raises(ValueError):
+        ReplaySDR(str(tmp_path), signal_freq=1e6)
+    sdr = ReplaySDR(str(tmp_path), signal_freq=1e6, nsamples=8)
+    assert sdr.files == [str(tmp_path / 'tone_1000000.npz')]
+    np.testing.assert_array_equal(sdr.capture_data(nsamples=8), 10)
+
+
+def test_replay_follows_retunes(tmp_path):
+    from functools import partial
+    from src.acquiring_data import SDRSession, default_fir_coeff, fir_coeff
+    for rate, bypassed, value in ((1e6, False, 1), (1e6, True, 2), (2e6, False, 3)):
+        _save(tmp_path / f'{value}.npz', np.full((2, 8), value, np.int8), sample_rate=rate, filter_bypassed=bypassed)
+    backend = partial(ReplaySDR, str(tmp_path))
+    with SDRSession(backend=backend, sample_rate=1e6, fir_coeffs=default_fir_coeff, flush_samples=0) as session:
+        np.testing.assert_array_equal(session.capture(nsamples=8), 1)
+        session.configure(fir_coeffs=fir_coeff)
+        np.testing.assert_array_equal(session.capture(nsamples=8), 2)
+        session.configure(sample_rate=2e6, fir_coeffs=default_fir_coeff)
+        assert session.sdr.sample_rate == 2e6
+        np.testing.assert_array_equal(session.capture(nsamples=8), 3)
+        # no bypassed capture at 2 MHz: refuse rather than replay something else
+        session.configure(fir_coeffs=fir_coeff)
+        with pytest.raises(FileNotFoundError):
+            session.capture(nsamples=8)
+
+
+def test_replay_loads_one_file_at_a_time(tmp_path):
+    for i in range(3):
+        _save(tmp_path / f'{i}.npz', np.full((1, 10), i, np.int8), sample_rate=1e6)
+    sdr = ReplaySDR(str(tmp_path))
+    assert sdr._loaded == (None, None)
+    np.testing.assert_array_equal(sdr.capture_data(nsamples=4, nblocks=3).ravel(), [0] * 10 + [1] * 2)
+    assert sdr._loaded[0] == 1
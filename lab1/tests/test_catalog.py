@@ -0,0 +1,71 @@
+'''
+sqlite capture catalog (user-009)
+'''
+
+import os
+import numpy as np
+import pytest
+
+from src.catalog import build_catalog, find, parse_filename, query
+
+
+def _save(path, **metadata):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez(path, data=np.zeros((2, 16), np.int8), **metadata)
+
+
+@pytest.fixture
+def captures(tmp_path):
+    root = tmp_path / 'data'
+    _save(str(root / 'a' / 'filtered_f7p500e05_sr1p000e06_20260204_152618.npz'),
+          signal_freq=7.5e5, sample_rate=1e6, filter_bypassed=False)
+    _save(str(root / 'a' / 'bypassed_f7p500e05_sr2p000e06_20260204_152700.npz'),
+          signal_freq=7.5e5, sample_rate=2e6, filter_bypassed=True)
+    _save(str(root / 'b' / 'bypassed_f1p000e06_sr3p000e06.npz'),
+          signal_freq=1e6, sample_rate=3e6, filter_bypassed=True)
+    return str(root), str(tmp_path / 'captures.sqlite')
+
+
+def test_parse_filename():
+    assert parse_filename('filtered_f7p500e05_sr1p000e06_20260204_152618.npz') == {
+        'kind': 'filtered', 'filter_bypassed': False, 'signal_freq': 7.5e5, 'sample_rate': 1e6,
+        'timestamp': '20260204_152618'}
+    assert parse_filename('noise_sr3p000e06_1p600e01_samples1p638e04.npz') == {
+        'kind': 'noise', 'sample_rate': 3e6, 'nblocks': 16, 'nsamples': 16380}
+    assert parse_filename('notes.npz') == {}
+
+
+def test_find_matches_a_python_filter(captures):
+    root, db = captures
+    assert build_catalog(root, db)['updated'] == 3
+    rows = query(db)
+    assert rows[0]['shape'] == '[2, 16]' and rows[0]['nblocks'] == 2
+
+    def reference(predicate):
+        return sorted(row['path'] for row in rows if predicate(row))
+
+    got = [row['path'] for row in find(db, filter_bypassed=True, sample_rate_min=2e6)]
+    assert got == reference(lambda row: row['filter_bypassed'] == 1 and row['sample_rate'] >= 2e6)
+    got = [row['path'] for row in find(db, signal_freq=7.5e5, sample_rate_max=1.5e6)]
+    assert got == reference(lambda row: row['signal_freq'] == 7.5e5 and row['sample_rate'] <= 1.5e6)
+
+
+def test_rebuild_only_reads_changes(captures):
+    root, db = captures
+    build_catalog(root, db)
+    assert build_catalog(root, db) == {'updated': 0, 'unchanged': 3, 'removed': 0}
+    os.remove(os.path.join(root, 'b', 'bypassed_f1p000e06_sr3p000e06.npz'))
+    _save(os.path.join(root, 'b', 'filtered_f1p000e06_sr3p000e06.npz'),
+          signal_freq=1e6, sample_rate=3e6, filter_bypassed=False)
+    assert build_catalog(root, db) == {'updated': 1, 'unchanged': 2, 'removed': 1}
+    assert len(find(db, folder='b', filter_bypassed=False)) == 1
+
+
+def test_find_rejects_unknown_columns(captures):
+    root, db = captures
+    build_catalog(root, db)
+    for key in ('nope', 'sample_rate_minimum', 'x_min'):
+        with pytest.raises(ValueError):
+            find(db, **{key: 1})
+    with pytest.raises(ValueError):
+        find(db, **{'1=1 OR sample_rate': 0})
@@ -0,0 +1,70 @@
+'''
+chunked on-disk datasets (user-010)
+'''
+
+import numpy as np
+import pytest
+
+from src.storage import ChunkedDataset, save_chunked
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    return rng.integers(-128, 128, (23, 40)).astype(np.int8)
+
+
+def test_indexing_matches_the_array(tmp_path, data):
+    save_chunked(data, {'sample_rate': 1e6}, str(tmp_path / 'run'), blocks_per_chunk=5)
+    ds = ChunkedDataset(str(tmp_path / 'run'))
+    assert len(ds.chunks) == 5 and ds.shape == data.shape and ds.metadata['sample_rate'] == 1e6
+    for i in range(-23, 23):
+        np.testing.assert_array_equal(ds[i], data[i])
+    for s in (slice(None), slice(3, 17), slice(-8, None, 3), slice(20, 2, -4), slice(5, 5)):
+        np.testing.assert_array_equal(ds[s], data[s])
+    np.testing.assert_array_equal(np.stack(list(ds)), data)
+    np.testing.assert_array_equal(ds.view()[4], data[4].astype(np.float32))
+
+
+def test_samples_are_the_joined_record(tmp_path, data):
+    ds = save_chunked(data, {}, str(tmp_path / 'run'), blocks_per_chunk=4)
+    record = data.ravel()
+    for start, stop in ((0, 40), (37, 41), (150, 610), (0, record.size), (919, 920)):
+        np.testing.assert_array_equal(ds.samples(start, stop), record[start:stop])
+
+
+def test_out_of_range_blocks_raise(tmp_path, data):
+    ds = save_chunked(data, {}, str(tmp_path / 'run'), blocks_per_chunk=5)
+    for index in (23, 100, -24, -46):
+        with pytest.raises(IndexError):
+            ds[index]
+
+
+def test_append_while_reading(tmp_path, data):
+    path = str(tmp_path / 'live')
+    writer = ChunkedDataset.create(path, (40,), {'sample_rate': 1e6}, blocks_per_chunk=4)
+    writer.append(data[:10])
+    # finished chunks are visible to a reader straight away
+    np.testing.assert_array_equal(ChunkedDataset(path)[:], data[:8])
+    writer.append(data[10:])
+    writer.close()
+    np.testing.assert_array_equal(ChunkedDataset(path)[:], data)
+    with pytest.raises(IOError):
+        ChunkedDataset(path).append(data[:1])
+
+
+def test_reader_opened_before_the_capture_sees_new_chunks(tmp_path, data):
+    path = str(tmp_path / 'live')
+    writer = ChunkedDataset.create(path, (40,), {}, blocks_per_chunk=4)
+    reader = ChunkedDataset(path)
+    assert len(reader) == 0
+    writer.append(data[:9])
+    # blocks 0..7 are in finished chunks, block 8 is not
+    np.testing.assert_array_equal(reader[7], data[7])
+    with pytest.raises(IndexError):
+        reader[8]
+    writer.append(data[9:])
+    writer.close()
+    np.testing.assert_array_equal(reader[22], data[22])
+    np.testing.assert_array_equal(reader[:], data)
+    assert reader._locate(12) == (3, 0) and reader._locate(22) == (5, 2)
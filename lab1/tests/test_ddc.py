@@ -0,0 +1,58 @@
+'''
+digital down-converter (user-023)
+'''
+
+import numpy as np
+import pytest
+from scipy import signal
+
+from src.acquiring_data import save_data
+from src.ddc import DDC, decimation_taps, ddc_file
+
+
+def _iq(n, seed):
+    rng = np.random.default_rng(seed)
+    return rng.integers(-128, 128, (n, 2)).astype(np.int8)
+
+
+def _mixed(iq, shift, sample_rate):
+    z = iq[:, 0] + 1j * iq[:, 1].astype(float)
+    return z * np.exp(-2j * np.pi * shift * np.arange(len(z)) / sample_rate)
+
+
+def test_fir_matches_lfilter_then_decimate():
+    iq = _iq(10000, 24)
+    ddc = DDC(2.4e6, shift_freq=150e3, decimation=8)
+    out = np.concatenate([ddc.process(iq[start:start + 777]) for start in range(0, 10000, 777)])
+    reference = signal.lfilter(decimation_taps(8), 1, _mixed(iq, 150e3, 2.4e6))[::8]
+    np.testing.assert_allclose(out, reference, atol=1e-9)
+    assert ddc.output_rate == 3e5
+
+
+@pytest.mark.parametrize('stages', [1, 3])
+def test_cic_matches_cascaded_boxcars(stages):
+    iq = _iq(6000, 25)
+    ddc = DDC(1e6, shift_freq=0.0, decimation=10, method='cic', stages=stages)
+    out = np.concatenate([ddc.process(iq[start:start + 613]) for start in range(0, 6000, 613)])
+    # integrator-comb pairs are boxcar sums of length decimation, sampled at the end of each period
+    kernel = np.ones(1)
+    for _ in range(stages):
+        kernel = np.convolve(kernel, np.ones(10))
+    z = iq[:, 0] + 1j * iq[:, 1].astype(float)
+    reference = signal.lfilter(kernel, 1, z)[9::10] / 10**stages
+    np.testing.assert_allclose(out, reference, atol=1e-9)
+
+
+def test_tone_lands_at_zero_and_metadata(tmp_path):
+    fs, n = 2.4e6, 2**15
+    t = np.arange(n) / fs
+    tone = 100 * np.exp(2j * np.pi * 230e3 * t)
+    iq = np.stack([tone.real, tone.imag], axis=-1).round().astype(np.int8).reshape(4, n // 4, 2)
+    save_data(iq, {'sample_rate': fs, 'lo_freq': 100e6}, 'mixer.npz', str(tmp_path))
+    data, metadata = ddc_file(str(tmp_path / 'mixer.npz'), shift_freq=230e3, decimation=16)
+    assert len(data) == n // 16
+    # after the filter settles the output is a constant phasor of the tone's amplitude
+    np.testing.assert_allclose(np.abs(data[200:]), 100, rtol=0.01)
+    assert metadata['sample_rate'] == fs / 16 and metadata['center_freq'] == 100.23e6
+    with pytest.raises(ValueError):
+        DDC(fs, method='nope')
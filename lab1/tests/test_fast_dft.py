@@ -0,0 +1,47 @@
+'''
+chirp-z dft against the direct sum (user-012)
+'''
+
+import numpy as np
+import pytest
+
+from src.analysis import check_dft, compute_power_spectrum, direct_dft, fast_dft
+
+
+def _reference(x, sample_rate, freqs):
+    # X(f) = sum_n x_n exp(-2 pi i f t_n), t_n = (n - N/2) / sample_rate, one frequency at a time
+    t = np.arange(-len(x) / 2, len(x) / 2) / sample_rate
+    return np.array([np.sum(x * np.exp(-2j * np.pi * f * t)) for f in freqs])
+
+
+@pytest.mark.parametrize('complex_input', [False, True])
+def test_fast_and_direct_match_the_sum(complex_input):
+    rng = np.random.default_rng(2)
+    x = rng.normal(size=300)
+    if complex_input:
+        x = x + 1j * rng.normal(size=300)
+    freqs = np.linspace(-5e5, 4.9e5, 700)
+    reference = _reference(x, 1e6, freqs)
+    np.testing.assert_allclose(fast_dft(x, 1e6, freqs), reference, rtol=1e-8, atol=1e-8)
+    # a small max_elements forces several kernel chunks
+    np.testing.assert_allclose(direct_dft(x, 1e6, freqs, max_elements=1000), reference, rtol=1e-8, atol=1e-8)
+
+
+def test_blocks_and_uneven_grids():
+    rng = np.random.default_rng(3)
+    blocks = rng.normal(size=(3, 128)) + 1j * rng.normal(size=(3, 128))
+    freqs = np.sort(rng.uniform(-1e6, 1e6, 50))
+    reference = np.array([_reference(block, 2e6, freqs) for block in blocks])
+    np.testing.assert_allclose(fast_dft(blocks, 2e6, freqs), reference, rtol=1e-8, atol=1e-8)
+    np.testing.assert_allclose(direct_dft(blocks, 2e6, freqs, max_elements=500).T, reference,
+                               rtol=1e-8, atol=1e-8)
+
+
+def test_validate_mode():
+    rng = np.random.default_rng(4)
+    iq = rng.normal(size=256) + 1j * rng.normal(size=256)
+    freqs, power = compute_power_spectrum(iq, 1e6, method='dft', freq_oversampling=4, validate=True)
+    assert len(freqs) == 1024
+    np.testing.assert_allclose(power, np.sqrt(np.abs(_reference(iq, 1e6, freqs))), rtol=1e-8)
+    with pytest.raises(ValueError):
+        check_dft(iq, 1e6, freqs, fast_dft(iq.real, 1e6, freqs))
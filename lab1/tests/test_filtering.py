@@ -0,0 +1,61 @@
+'''
+streaming FIR filtering (user-020)
+'''
+
+import numpy as np
+import pytest
+from scipy import signal
+
+from src.filtering import StreamFilter, apply_filter, design_taps, filter_blocks
+from src.storage import CaptureView
+
+
+def _reference(x, taps):
+    # whole record through lfilter, then shifted back by the linear-phase delay
+    delay = (len(taps) - 1) // 2
+    padded = np.concatenate([x, np.zeros(x.shape[:-1] + (delay,))], axis=-1)
+    return signal.lfilter(taps, 1, padded, axis=-1)[..., delay:]
+
+
+@pytest.mark.parametrize('method', ['overlap-save', 'overlap-add'])
+def test_block_by_block_equals_lfilter(method):
+    rng = np.random.default_rng(15)
+    x = rng.normal(size=5000)
+    taps = design_taps(1e6, (1e5, 2e5), ntaps=101)
+    stream = StreamFilter(taps, method=method)
+    pieces = [stream.process(x[i:i + 700]) for i in range(0, 5000, 700)]
+    causal = np.concatenate(pieces + [stream.flush()])
+    np.testing.assert_allclose(causal, signal.lfilter(taps, 1, np.r_[x, np.zeros(100)]), atol=1e-10)
+    np.testing.assert_allclose(apply_filter(x, taps, method, block_size=333), _reference(x, taps), atol=1e-10)
+
+
+def test_leading_axes_are_channels():
+    rng = np.random.default_rng(16)
+    data = rng.integers(-128, 128, (3, 2000)).astype(np.int8)
+    taps = design_taps(1e6, (2e5, 3e5), mode='pass', ntaps=63)
+    out = apply_filter(CaptureView(data), taps, block_size=256)
+    assert out.shape == data.shape
+    np.testing.assert_allclose(out, _reference(data.astype(float), taps), atol=1e-9)
+
+
+def test_iq_stream_blocks():
+    rng = np.random.default_rng(17)
+    iq = rng.integers(-128, 128, (4000, 2)).astype(np.int8)
+    z = iq[:, 0] + 1j * iq[:, 1].astype(float)
+    taps = design_taps(1e6, (1e5, 3e5), mode='pass', ntaps=81, complex_taps=True)
+    # stream_iq_mixer style items: (index, timestamp, (nsamples, 2) block)
+    stream = ((i, 0.0, iq[start:start + 500]) for i, start in enumerate(range(0, 4000, 500)))
+    out = np.concatenate(list(filter_blocks(stream, taps)))
+    np.testing.assert_allclose(out, _reference(z, taps), atol=1e-9)
+    # the same record as one (nblocks, nsamples, 2) capture is filtered block by block instead
+    capture = iq.reshape(8, 500, 2)
+    np.testing.assert_allclose(apply_filter(capture, taps, block_size=128),
+                               _reference(z.reshape(8, 500), taps), atol=1e-9)
+
+
+def test_design_taps_response():
+    taps = design_taps(1e6, (1e5, 2e5), ntaps=255)
+    freqs, response = signal.freqz(taps, worN=4096, fs=1e6)
+    gain = np.abs(response)
+    assert np.all(gain[(freqs > 1.2e5) & (freqs < 1.8e5)] < 0.01)
+    assert np.all(np.abs(gain[(freqs < 0.7e5) | (freqs > 2.3e5)] - 1) < 0.02)
@@ -0,0 +1,103 @@
+'''
+capture timing and dropped-sample detection (user-008)
+'''
+
+import time
+
+import numpy as np
+
+from src.acquiring_data import (BlockMonitor, SDRSession, capture_ng_to_disk, detect_discontinuities,
+                                stream_capture_ng)
+from src.backends import SimulatedSDR
+from src.storage import read_sidecar
+
+
+def _sine_blocks(nblocks, nsamples, drop_after=None, drop=37):
+    n = np.arange(nblocks * nsamples + drop)
+    if drop_after is not None:
+        # remove samples right after block drop_after, like a usb overrun would
+        cut = (drop_after + 1) * nsamples
+        n = np.concatenate([n[:cut], n[cut + drop:]])
+    return np.round(60 * np.sin(2 * np.pi * n / 97))[:nblocks * nsamples].reshape(nblocks, nsamples)
+
+
+def test_detect_discontinuities_finds_the_drop():
+    clean = _sine_blocks(8, 500)
+    assert len(detect_discontinuities(clean)[0]) == 0
+    boundaries, z = detect_discontinuities(_sine_blocks(8, 500, drop_after=4))
+    assert list(boundaries) == [4] and len(z) == 7
+
+    # the jump from the previous read into data[0] is boundary -1
+    data = _sine_blocks(8, 500, drop_after=0)
+    assert list(detect_discontinuities(data[1:], previous=data[0])[0]) == [-1]
+    assert len(detect_discontinuities(clean[1:], previous=clean[0])[0]) == 0
+
+
+def test_block_monitor_across_reads():
+    data = _sine_blocks(9, 400, drop_after=5)
+    monitor = BlockMonitor(live=False)
+    for start in range(0, 9, 3):
+        monitor.update(data[start:start + 3], 0.0, 0.3)
+    summary = monitor.summary()
+    # the drop sits between the second and third read
+    assert list(summary['discontinuities']) == [5]
+    np.testing.assert_allclose(summary['block_latency'], 0.1)
+    assert len(summary['read_gap']) == 2
+
+
+class StallingSDR(SimulatedSDR):
+    '''
+    simulated noise sdr whose stall_at-th block read is held up by stall seconds, like a
+    busy host missing its turn to read the usb buffer
+    '''
+
+    def __init__(self, stall_at=3, stall=0.1, nsamples=10000, **kwargs):
+        super().__init__(signal='noise', seed=0, **kwargs)
+        self.stall_at = stall_at
+        self.stall = stall
+        self.block_size = nsamples
+        self.reads = 0
+
+    def capture_data(self, nsamples=2048, nblocks=1):
+        if nsamples == self.block_size:
+            if self.reads == self.stall_at:
+                time.sleep(self.stall)
+            self.reads += nblocks
+        return super().capture_data(nsamples, nblocks)
+
+
+def test_block_monitor_flags_late_reads():
+    monitor = BlockMonitor(threshold=None, live=False, sample_rate=1e6)
+    noise = np.zeros((2, 1000), dtype=np.int8)
+    # 2 ms of samples per read: reads ending 2 ms apart are on time, 10 ms apart are late
+    for end in [0.002, 0.004, 0.014, 0.016]:
+        monitor.update(noise, end - 0.001, end)
+    summary = monitor.summary()
+    assert list(summary['late_reads']) == [4]
+    assert 'discontinuities' not in summary
+
+
+def test_noise_paths_flag_late_reads(tmp_path):
+    # 10 ms blocks; the 100 ms stall is the only read that can end 15 ms after the previous one
+    with SDRSession(backend=StallingSDR, sample_rate=1e6) as session:
+        summary = stream_capture_ng(str(tmp_path), sample_rate=1e6, nsamples=10000, nblocks=6, session=session)
+    assert 'discontinuities' not in summary
+    meta = np.load(tmp_path / 'stream_meta.npz')
+    assert 3 in meta['late'] and 'discontinuities' not in meta.files
+    assert len(meta['block_latency']) == 6
+
+    path = str(tmp_path / 'noise.npy')
+    with SDRSession(backend=StallingSDR, sample_rate=1e6) as session:
+        capture_ng_to_disk(path, sample_rate=1e6, nsamples=10000, nblocks=6, session=session)
+    sidecar = read_sidecar(path)
+    assert 3 in sidecar['late_reads'] and 'discontinuities' not in sidecar
+
+
+def test_session_stats_keys():
+    with SDRSession(backend=SimulatedSDR, sample_rate=1e6) as session:
+        mark = session.stats.mark()
+        for _ in range(3):
+            session.capture(nsamples=256, nblocks=2)
+        stats = session.stats.summary(since=mark, sample_rate=1e6)
+    assert len(stats['read_latency']) == 3 and len(stats['read_gap']) == 2
+    assert stats['capture_time'] == stats['read_latency'].sum()
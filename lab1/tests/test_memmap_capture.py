@@ -0,0 +1,47 @@
+'''
+capture_ng_to_disk and MemmapWriter (user-007)
+'''
+
+from functools import partial
+import numpy as np
+
+from src.acquiring_data import SDRSession, capture_ng_to_disk, default_fir_coeff
+from src.backends import SimulatedSDR
+from src.storage import MemmapWriter, open_memmap_capture, read_sidecar
+
+backend = partial(SimulatedSDR, signal='noise', noise_std=10, seed=5)
+
+
+def test_to_disk_matches_an_in_memory_capture(tmp_path):
+    path = str(tmp_path / 'noise.npy')
+    settings = dict(sample_rate=1e6, fir_coeffs=default_fir_coeff)
+    with SDRSession(backend=backend, **settings) as session:
+        metadata = capture_ng_to_disk(path, sample_rate=1e6, nsamples=256, nblocks=70, blocks_per_read=3,
+                                      session=session)
+    # same seed and settings: the same samples, read in one go
+    with SDRSession(backend=backend, **settings) as session:
+        reference = session.capture(nsamples=256, nblocks=70)
+
+    view, sidecar = open_memmap_capture(path)
+    assert isinstance(view.raw, np.memmap) and view.raw.dtype == np.int8
+    np.testing.assert_array_equal(view.raw, reference)
+    assert sidecar['nblocks'] == metadata['nblocks'] == 70
+    assert len(sidecar['block_latency']) == 70
+
+
+def test_writer_file_is_readable_before_close(tmp_path):
+    path = str(tmp_path / 'partial.npy')
+    rng = np.random.default_rng(0)
+    blocks = rng.integers(-128, 128, (10, 32, 2)).astype(np.int8)
+    writer = MemmapWriter(path, (32, 2), {'sample_rate': 1e6}, grow_blocks=4)
+    for i in range(7):
+        writer.append(blocks[i])
+    writer._map.flush()
+    # as if the run had been killed here: the header already counts every block
+    np.testing.assert_array_equal(np.load(path, mmap_mode='r'), blocks[:7])
+    assert read_sidecar(path)['nblocks'] <= 7
+
+    writer.append(blocks[7:])
+    writer.close()
+    np.testing.assert_array_equal(np.load(path), blocks)
+    assert read_sidecar(path)['nblocks'] == 10
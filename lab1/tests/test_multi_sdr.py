@@ -0,0 +1,58 @@
+'''
+synchronized multi-device capture (user-006)
+'''
+
+import numpy as np
+
+from src.backends import SimulatedSDR
+from src.multi_sdr import MultiSDR, estimate_sample_offsets
+
+offsets = {0: 0, 1: 7, 2: 30}
+
+
+def _device(device_index=0, **kwargs):
+    # every device sees the same noise, each starting a few samples further into it
+    return SimulatedSDR(device_index=device_index, signal='noise', noise_std=20, seed=3,
+                        sample_offset=offsets[device_index], **kwargs)
+
+
+def _brute_force_lag(reference, other, max_lag):
+    # lag that best lines up other[n] with reference[n + lag], summed over blocks
+    best, best_lag = -np.inf, 0
+    for lag in range(-max_lag, max_lag + 1):
+        total = 0.0
+        for ref, block in zip(reference.astype(float), other.astype(float)):
+            ref, block = ref - ref.mean(), block - block.mean()
+            if lag >= 0:
+                total += np.dot(ref[lag:], block[:len(block) - lag])
+            else:
+                total += np.dot(ref[:lag], block[-lag:])
+        if abs(total) > best:
+            best, best_lag = abs(total), lag
+    return best_lag
+
+
+def test_capture_shapes_and_metadata():
+    with MultiSDR(device_indices=(0, 1, 2), sample_rate=1e6, backend=_device) as multi:
+        data, metadata = multi.capture(nsamples=512, nblocks=3)
+    assert data.shape == (3, 3, 512) and data.dtype == np.int8
+    assert metadata['timestamps'].shape == (3, 3)
+    np.testing.assert_array_equal(metadata['sequence'], np.tile(np.arange(3), (3, 1)))
+
+
+def test_sample_offsets_match_brute_force():
+    with MultiSDR(device_indices=(0, 1, 2), sample_rate=1e6, flush_samples=0, backend=_device) as multi:
+        data, _ = multi.capture(nsamples=512, nblocks=2)
+    lags, seconds = estimate_sample_offsets(data, 1e6, max_lag=40)
+    # devices 1 and 2 start further into the stream, i.e. ahead of device 0
+    assert list(lags) == [0, 7, 30]
+    for dev in (1, 2):
+        assert lags[dev] == _brute_force_lag(data[0], data[dev], 40)
+    np.testing.assert_allclose(seconds, lags / 1e6)
+
+
+def test_stream_is_lockstep():
+    with MultiSDR(device_indices=(0, 1), sample_rate=1e6, backend=_device) as multi:
+        out = list(multi.stream(nsamples=128, nblocks=4))
+    assert [seq for seq, _, _ in out] == [0, 1, 2, 3]
+    assert all(blocks.shape == (2, 128) for _, _, blocks in out)
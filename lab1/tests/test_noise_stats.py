@@ -0,0 +1,70 @@
+'''
+single-pass mergeable noise statistics (user-015)
+'''
+
+import numpy as np
+import pytest
+from scipy import stats
+
+from src.noise_stats import NoiseStats, accumulate
+
+
+@pytest.fixture
+def blocks():
+    rng = np.random.default_rng(8)
+    return np.clip(np.round(rng.normal(3, 9, (12, 5000))), -128, 127).astype(np.int8)
+
+
+def _check(result, x):
+    # whole record at once, in float64, with numpy / scipy
+    x = x.astype(np.float64).ravel()
+    assert result['n'] == x.size
+    np.testing.assert_allclose(result['mean'], x.mean(), rtol=1e-12)
+    np.testing.assert_allclose(result['variance'], x.var(), rtol=1e-10)
+    np.testing.assert_allclose(result['rms'], np.sqrt(np.mean(x**2)), rtol=1e-10)
+    np.testing.assert_allclose(result['skewness'], stats.skew(x), rtol=1e-8, atol=1e-10)
+    np.testing.assert_allclose(result['kurtosis'], stats.kurtosis(x), rtol=1e-8, atol=1e-10)
+    assert (result['min'], result['max']) == (x.min(), x.max())
+
+
+def test_int8_blocks_match_scipy(blocks):
+    total = NoiseStats()
+    for block in blocks:
+        total.update(block)
+    _check(total.result(), blocks)
+    np.testing.assert_array_equal(total.counts, np.bincount(blocks.astype(int).ravel() + 128, minlength=256))
+
+
+def test_int8_and_float_paths_agree(blocks):
+    fast = NoiseStats().update(blocks)
+    slow = NoiseStats().update(blocks.astype(np.float32))
+    for key, value in fast.result().items():
+        np.testing.assert_allclose(value, slow.result()[key], rtol=1e-9)
+    np.testing.assert_array_equal(fast.counts, slow.counts)
+
+    edges = np.linspace(-40.5, 40.5, 28)
+    fast, slow = NoiseStats(edges).update(blocks), NoiseStats(edges).update(blocks.astype(np.float64))
+    np.testing.assert_array_equal(fast.counts, slow.counts)
+
+
+def test_merge_equals_whole(blocks):
+    halves = NoiseStats().update(blocks[:5]) + NoiseStats().update(blocks[5:].astype(np.float64) * 0.5)
+    _check(halves.result(), np.concatenate([blocks[:5].ravel(), blocks[5:].ravel() * 0.5]))
+    _check(accumulate(blocks, workers=3).result(), blocks)
+    with pytest.raises(ValueError):
+        NoiseStats().merge(NoiseStats(np.linspace(0, 1, 5)))
+
+
+
+def test_accumulate_streams_generators(blocks):
+    # a generator is read once, through the queue, and gives the same statistics
+    result = accumulate((block for block in blocks), workers=3)
+    _check(result.result(), blocks)
+    np.testing.assert_array_equal(result.counts, NoiseStats().update(blocks).counts)
+
+    # a bad block fails the call instead of leaving the reading loop stuck on a full queue
+    def failing():
+        yield 'not samples'
+        yield from blocks
+    with pytest.raises(TypeError):
+        accumulate(failing(), workers=2)
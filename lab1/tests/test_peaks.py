@@ -0,0 +1,75 @@
+'''
+vectorized peak finding and interpolation (user-018)
+'''
+
+import numpy as np
+import pytest
+from scipy import signal
+
+from src.peaks import find_peaks
+
+
+def test_gaussian_interpolation_is_exact_for_gaussian_lines():
+    freqs = np.arange(200) * 10.0
+    centers = np.array([503.7, 1212.2, 877.0])
+    power = 5 * np.exp(-0.5 * ((freqs - centers[:, None]) / 23.0)**2) + 1e-3
+    peaks = find_peaks(freqs, power, method='gaussian')
+    np.testing.assert_allclose(peaks['freq'][:, 0], centers, atol=0.01)
+    np.testing.assert_allclose(peaks['power'][:, 0], 5, rtol=1e-3)
+
+
+def test_quadratic_matches_a_parabola_fit():
+    rng = np.random.default_rng(11)
+    freqs = np.linspace(0, 1e5, 300)
+    power = rng.exponential(1, (5, 300))
+    power[np.arange(5), rng.integers(20, 280, 5)] += 50
+    peaks = find_peaks(freqs, power)
+    for row, p in enumerate(power):
+        i = np.argmax(p)
+        a, b, c = np.polyfit(freqs[i - 1:i + 2], p[i - 1:i + 2], 2)
+        assert peaks['freq'][row, 0] == pytest.approx(-b / (2 * a), rel=1e-9)
+        assert peaks['power'][row, 0] == pytest.approx(c - b**2 / (4 * a), rel=1e-9)
+        assert peaks['snr'][row, 0] == pytest.approx(peaks['power'][row, 0] / np.median(p), rel=1e-12)
+
+
+def test_jacobsen_on_an_off_bin_tone():
+    N, fs = 512, 1e6
+    true = 123.4567e3
+    x = np.exp(2j * np.pi * true * np.arange(N) / fs)
+    spectrum = np.fft.fftshift(np.fft.fft(x))
+    freqs = np.fft.fftshift(np.fft.fftfreq(N, 1/fs))
+    peak = find_peaks(freqs, np.abs(spectrum)**2, method='jacobsen', spectrum=spectrum)
+    assert peak['freq'][0] == pytest.approx(true, abs=0.02 * fs / N)
+    with pytest.raises(ValueError):
+        find_peaks(freqs, np.abs(spectrum)**2, method='jacobsen')
+
+
+def test_top_k_in_band_matches_scipy():
+    rng = np.random.default_rng(12)
+    freqs = np.arange(1000) * 1.0
+    power = rng.exponential(1, 1000)
+    for f, height in ((150, 40), (420, 90), (430, 60), (900, 70), (960, 200)):
+        power[f] += height
+    peaks = find_peaks(freqs, power, fmin=100, fmax=950, k=3, min_separation=20)
+    index, props = signal.find_peaks(power[100:951], height=0, distance=21)
+    # scipy keeps the strongest peak of every close pair too, then take the three highest
+    expected = sorted(100 + index[np.argsort(props['peak_heights'])[::-1][:3]], key=lambda i: -power[i])
+    assert list(peaks['bin']) == expected == [420, 900, 150]
+
+
+def test_rows_with_fewer_than_k_maxima():
+    freqs = np.arange(50) * 1.0
+    power = np.vstack([np.exp(-0.5 * ((freqs - 20) / 3)**2),
+                       np.cos(2 * np.pi * freqs / 10) + 2])
+    peaks = find_peaks(freqs, power, k=3, min_separation=2)
+    # one maximum in the first spectrum, five (every 10 bins) in the second
+    assert list(peaks['bin'][0]) == [20, -1, -1]
+    assert np.isnan(peaks['freq'][0, 1:]).all() and np.isnan(peaks['power'][0, 1:]).all()
+    assert np.isnan(peaks['snr'][0, 1:]).all()
+    assert np.isfinite(peaks['freq'][1]).all() and -1 not in peaks['bin'][1]
+
+
+def test_empty_band():
+    freqs = np.arange(100) * 1.0
+    with pytest.raises(ValueError):
+        find_peaks(freqs, np.ones(100), fmin=200)
@@ -0,0 +1,65 @@
+'''
+polyphase filterbank spectrometer (user-022)
+'''
+
+import numpy as np
+from scipy import signal
+
+from src.analysis import compute_power_spectra
+from src.pfb import PFBSpectrometer, pfb_coefficients, pfb_spectra
+
+
+def _reference(x, nchan, ntaps, window='hamming'):
+    # textbook pfb: one spectrum per frame step, ntaps frames weighted by the windowed sinc
+    n = np.arange(ntaps * nchan)
+    h = signal.get_window(window, ntaps * nchan, fftbins=False) * np.sinc(n / nchan - ntaps / 2)
+    spectra = []
+    for s in range(len(x) // nchan - ntaps + 1):
+        segment = x[s * nchan:(s + ntaps) * nchan] * h
+        spectra.append(np.abs(np.fft.fft(segment.reshape(ntaps, nchan).sum(axis=0)))**2)
+    return np.array(spectra)
+
+
+def test_batched_matches_the_direct_loop():
+    rng = np.random.default_rng(22)
+    blocks = rng.integers(-128, 128, (2, 64 * 20 + 17)).astype(np.int8)
+    freqs, spectra = pfb_spectra(blocks, 1e6, nchan=64, ntaps=4)
+    np.testing.assert_allclose(freqs, np.fft.rfftfreq(64, 1e-6))
+    assert spectra.shape == (2, 17, 33)
+    for block, got in zip(blocks, spectra):
+        reference = _reference(block.astype(float), 64, 4)[:, :33]
+        np.testing.assert_allclose(got, reference, rtol=1e-3, atol=1e-4 * reference.max())
+    np.testing.assert_array_equal(pfb_coefficients(64, 4).shape, (4, 64))
+
+    iq = rng.integers(-128, 128, (64 * 8, 2)).astype(np.int8)
+    freqs, spectra = pfb_spectra(iq[None], 1e6, nchan=64, ntaps=3)
+    reference = np.fft.fftshift(_reference(iq[:, 0] + 1j * iq[:, 1], 64, 3), axes=-1)
+    np.testing.assert_allclose(spectra[0], reference, rtol=1e-3, atol=1e-4 * reference.max())
+
+
+def test_streaming_equals_the_whole_record():
+    rng = np.random.default_rng(23)
+    x = rng.normal(size=128 * 40 + 50) + 1j * rng.normal(size=128 * 40 + 50)
+    _, whole = pfb_spectra(x, 2e6, nchan=128, ntaps=4)
+    pfb = PFBSpectrometer(2e6, nchan=128, ntaps=4)
+    pieces = [pfb.process(x[start:start + 300]) for start in range(0, len(x), 300)]
+    streamed = np.concatenate([p for p in pieces if len(p)])
+    np.testing.assert_allclose(streamed, whole, rtol=1e-4, atol=1e-4 * whole.max())
+
+    pfb = PFBSpectrometer(2e6, nchan=128, ntaps=4)
+    for start in range(0, len(x), 1000):
+        pfb.update(x[start:start + 1000])
+    assert pfb.nspectra == len(whole)
+    np.testing.assert_allclose(pfb.spectrum, whole.mean(axis=0), rtol=1e-4)
+
+
+def test_less_leakage_than_the_plain_fft():
+    nchan = 256
+    t = np.arange(64 * nchan)
+    # tone halfway between channels 40 and 41
+    x = np.cos(2 * np.pi * 40.5 / nchan * t)
+    _, pfb = pfb_spectra(x, 1.0, nchan=nchan)
+    _, fft = compute_power_spectra(x.reshape(-1, nchan), 1.0)
+    pfb, fft = pfb.mean(axis=0), fft.mean(axis=0)
+    far = 40 + 6
+    assert pfb[far] / pfb[40] < 1e-3 * fft[far] / fft[40]
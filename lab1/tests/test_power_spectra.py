@@ -0,0 +1,41 @@
+'''
+batched power spectra (user-011)
+'''
+
+import numpy as np
+import pytest
+
+from src.analysis import compute_power_spectra
+
+
+def _reference(data, sample_rate):
+    # one np.fft per block, fftshifted, in double precision
+    freqs = np.fft.fftshift(np.fft.fftfreq(data.shape[-1], d=1/sample_rate))
+    power = np.array([np.abs(np.fft.fftshift(np.fft.fft(block.astype(np.complex128))))**2 for block in data])
+    return freqs, power
+
+
+@pytest.mark.parametrize('N', [256, 255])
+def test_real_two_sided_matches_fft(N):
+    rng = np.random.default_rng(N)
+    data = rng.integers(-128, 128, (6, N)).astype(np.int8)
+    ref_freqs, ref_power = _reference(data, 2e6)
+    freqs, power = compute_power_spectra(data, 2e6, onesided=False, precision='double')
+    np.testing.assert_allclose(freqs, ref_freqs)
+    np.testing.assert_allclose(power, ref_power, rtol=1e-9, atol=1e-6)
+
+    freqs, power = compute_power_spectra(data, 2e6)
+    assert power.dtype == np.float32
+    np.testing.assert_allclose(freqs, np.fft.rfftfreq(N, d=1/2e6))
+    np.testing.assert_allclose(power, np.abs(np.fft.rfft(data.astype(float)))**2, rtol=1e-4, atol=1e-2 * N)
+
+
+def test_complex_and_axis():
+    rng = np.random.default_rng(1)
+    data = rng.normal(size=(4, 128)) + 1j * rng.normal(size=(4, 128))
+    ref_freqs, ref_power = _reference(data, 1e6)
+    freqs, power = compute_power_spectra(data.T, 1e6, axis=0, precision='double', workers=2)
+    np.testing.assert_allclose(freqs, ref_freqs)
+    np.testing.assert_allclose(power, ref_power, rtol=1e-9)
+    with pytest.raises(ValueError):
+        compute_power_spectra(data, 1e6, onesided=True)
@@ -0,0 +1,70 @@
+'''
+block-by-block Welch spectra (user-021)
+'''
+
+import numpy as np
+import pytest
+from scipy import signal
+
+from src.psd import PSDAccumulator, welch
+
+
+@pytest.mark.parametrize('scaling', ['density', 'spectrum'])
+def test_streamed_record_matches_scipy_welch(scaling):
+    rng = np.random.default_rng(18)
+    x = rng.integers(-128, 128, 20000).astype(np.int8)
+    acc = PSDAccumulator(2e6, nperseg=512, overlap=0.5, scaling=scaling, variance=True)
+    for start in range(0, len(x), 3001):
+        acc.update(x[start:start + 3001])
+    ref_freqs, ref_psd = signal.welch(x.astype(float), 2e6, nperseg=512, noverlap=256, scaling=scaling)
+    np.testing.assert_allclose(acc.freqs, ref_freqs)
+    np.testing.assert_allclose(acc.psd, ref_psd, rtol=1e-9)
+
+    # variance of the individual segment periodograms
+    _, _, segments = signal.spectrogram(x.astype(float), 2e6, window='hann', nperseg=512, noverlap=256,
+                                        scaling=scaling, mode='psd')
+    assert acc.nsegments == segments.shape[1]
+    np.testing.assert_allclose(acc.variance, segments.var(axis=1, ddof=1), rtol=1e-8)
+
+
+def test_complex_two_sided():
+    rng = np.random.default_rng(19)
+    iq = rng.integers(-128, 128, (6, 4096, 2)).astype(np.int8)
+    freqs, psd = welch(iq, 1e6, nperseg=256, overlap=0.25, window=('kaiser', 8))
+    z = iq[..., 0] + 1j * iq[..., 1].astype(float)
+    # blocks of a capture are independent: segments don't straddle them, means weight every segment
+    per_block = [signal.welch(block, 1e6, window=('kaiser', 8), nperseg=256, noverlap=64,
+                              return_onesided=False) for block in z]
+    np.testing.assert_allclose(freqs, np.fft.fftshift(per_block[0][0]))
+    np.testing.assert_allclose(psd, np.fft.fftshift(np.mean([p for _, p in per_block], axis=0)), rtol=1e-9)
+
+
+def test_merge_equals_one_accumulator():
+    rng = np.random.default_rng(20)
+    blocks = rng.normal(size=(8, 1024))
+    whole = PSDAccumulator(1e6, nperseg=128, variance=True, continuous=False)
+    for block in blocks:
+        whole.update(block)
+    a = PSDAccumulator(1e6, nperseg=128, variance=True, continuous=False)
+    b = PSDAccumulator(1e6, nperseg=128, variance=True, continuous=False)
+    for block in blocks[:3]:
+        a.update(block)
+    for block in blocks[3:]:
+        b.update(block)
+    a.merge(b)
+    assert a.nsegments == whole.nsegments
+    np.testing.assert_allclose(a.psd, whole.psd, rtol=1e-10)
+    np.testing.assert_allclose(a.variance, whole.variance, rtol=1e-9)
+
+
+def test_two_sided_real_and_errors():
+    rng = np.random.default_rng(21)
+    x = rng.normal(size=4096)
+    freqs, psd = welch(x, 1e6, nperseg=256, onesided=False)
+    ref_freqs, ref_psd = signal.welch(x, 1e6, nperseg=256, return_onesided=False)
+    np.testing.assert_allclose(freqs, np.fft.fftshift(ref_freqs))
+    np.testing.assert_allclose(psd, np.fft.fftshift(ref_psd), rtol=1e-9)
+    with pytest.raises(ValueError):
+        PSDAccumulator(1e6, onesided=True).update(x + 1j)
+    with pytest.raises(ValueError):
+        PSDAccumulator(1e6).psd
@@ -0,0 +1,73 @@
+'''
+RFI flagging (user-025)
+'''
+
+import numpy as np
+import pytest
+
+from src.psd import PSDAccumulator
+from src.rfi import RFIFlagger, mad_flags, robust_sigma, spectral_kurtosis
+
+
+def _codes(shape, seed, sigma=10):
+    rng = np.random.default_rng(seed)
+    return np.clip(np.round(rng.normal(0, sigma, shape)), -128, 127).astype(np.int8)
+
+
+@pytest.mark.parametrize('n', [10001, 10000])
+def test_int8_robust_sigma_matches_sorting(n):
+    x = _codes(n, 29) + np.int8(3)
+    median, sigma = robust_sigma(x)
+    # lower median (the (n + 1) // 2-th smallest) of the samples and of the deviations
+    ordered = np.sort(x.astype(float))
+    lower_median = ordered[(n + 1) // 2 - 1]
+    mad = np.sort(np.abs(x - lower_median))[(n + 1) // 2 - 1]
+    assert median == lower_median and sigma == pytest.approx(1.4826 * mad)
+    if n % 2:
+        assert (median, sigma) == pytest.approx(tuple(float(v) for v in robust_sigma(x.astype(float))))
+
+
+def test_mad_flags_and_sk():
+    x = _codes(5000, 30).astype(float)
+    x[[10, 2000]] = [120, -127]
+    assert list(np.flatnonzero(mad_flags(x, threshold=6))) == [10, 2000]
+
+    rng = np.random.default_rng(31)
+    M = 400
+    spectra = np.abs(np.fft.fft(rng.normal(size=(M, 256)) + 1j * rng.normal(size=(M, 256)), axis=1))**2
+    sk = spectral_kurtosis(spectra)
+    assert abs(np.mean(sk) - 1) < 0.02 and np.std(sk) == pytest.approx(2 / np.sqrt(M), rel=0.2)
+    # a channel that is on in only a few spectra is impulsive
+    spectra[:20, 50] *= 30
+    assert spectral_kurtosis(spectra)[50] > 1 + 10 * 2 / np.sqrt(M)
+
+
+def test_flagger_is_quiet_on_clean_noise():
+    flagger = RFIFlagger()
+    acc = PSDAccumulator(1e6, nperseg=256, flagger=flagger, continuous=False)
+    for seed in range(8):
+        acc.update(_codes(32768, seed))
+    assert flagger.flagged_fraction < 0.01
+
+
+def test_flagged_burst_is_left_out_of_the_average():
+    clean = _codes((8, 32768), 32).astype(float)
+    dirty = clean.copy()
+    # strong broadband burst in the middle of block 3
+    dirty[3, 16000:16300] += 100 * np.sin(np.arange(300))
+
+    reference = PSDAccumulator(1e6, nperseg=256, continuous=False)
+    for block in clean:
+        reference.update(block)
+    flagger = RFIFlagger()
+    acc = PSDAccumulator(1e6, nperseg=256, flagger=flagger, continuous=False)
+    for block in dirty:
+        acc.update(block)
+    unflagged = PSDAccumulator(1e6, nperseg=256, continuous=False)
+    for block in dirty:
+        unflagged.update(block)
+
+    assert 0 < flagger.flagged_fraction < 0.02
+    error = np.abs(acc.psd / reference.psd - 1)
+    assert np.median(error) < 0.01
+    assert np.max(np.abs(unflagged.psd / reference.psd - 1)) > 10 * np.max(error)
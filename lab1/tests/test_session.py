@@ -0,0 +1,47 @@
+'''
+SDRSession reuse and retuning (user-002)
+'''
+
+from functools import partial
+import numpy as np
+
+from src.acquiring_data import (SDRSession, capture_iq_mixer, capture_ng, capture_sine_wave,
+                                default_fir_coeff, fir_coeff)
+from src.backends import SimulatedSDR
+
+
+def _session(**kwargs):
+    return SDRSession(backend=partial(SimulatedSDR, signal='noise', seed=0), **kwargs)
+
+
+def test_configure_only_retunes_on_change():
+    with _session(sample_rate=1e6) as session:
+        nflush = session.stats.mark()
+        assert session.configure(sample_rate=1e6) is False
+        assert session.stats.mark() == nflush
+        assert session.configure(sample_rate=2e6) is True
+        assert session.sdr.sample_rate == 2e6
+        # one flush per retune
+        assert session.stats.mark() == nflush + 1
+
+
+def test_session_device_is_reused():
+    with _session(sample_rate=1e6) as session:
+        device = session.sdr
+        capture_ng(sample_rate=1e6, nsamples=256, nblocks=2, session=session)
+        capture_sine_wave(1e5, sample_rate=2e6, nsamples=256, session=session)
+        assert session.sdr is device
+
+
+def test_noise_capture_turns_the_filter_back_on():
+    with _session(sample_rate=1e6) as session:
+        capture_sine_wave(1e5, sample_rate=1e6, nsamples=256, bypass_filter=True, session=session)
+        np.testing.assert_array_equal(session.sdr.fir_coeffs, fir_coeff)
+        capture_ng(sample_rate=1e6, nsamples=256, session=session)
+        np.testing.assert_array_equal(session.sdr.fir_coeffs, default_fir_coeff)
+
+        capture_iq_mixer(sample_rate=1e6, nsamples=256, lo_freq=1e8, session=session)
+        data, _ = capture_ng(sample_rate=1e6, nsamples=256, session=session)
+        assert session.sdr.direct
+        np.testing.assert_array_equal(session.sdr.fir_coeffs, default_fir_coeff)
+        assert data.shape == (1, 256)
@@ -0,0 +1,47 @@
+'''
+SNR vs number of averaged blocks (user-017)
+'''
+
+import numpy as np
+
+from src.analysis import compute_power_spectrum, compute_snr_curve, compute_snr_v_averaging
+
+
+def _blocks(nblocks=12, N=256, seed=10):
+    rng = np.random.default_rng(seed)
+    t = np.arange(N) / 1e6
+    return np.round(5 * np.cos(2 * np.pi * 125e3 * t) + rng.normal(0, 8, (nblocks, N))).astype(np.int8)
+
+
+def _reference(blocks, navg):
+    # the original loop: one compute_power_spectrum per block, average the first n, max / std
+    spectra = np.array([compute_power_spectrum(block.astype(float), 1e6)[1] for block in blocks])
+    return np.array([spectra[:n].mean(axis=0).max() / spectra[:n].mean(axis=0).std() for n in navg])
+
+
+def test_curve_matches_the_loop():
+    blocks = _blocks()
+    result = compute_snr_curve(blocks, metadata={'sample_rate': 1e6})
+    np.testing.assert_array_equal(result['navg'], np.arange(1, 13))
+    np.testing.assert_allclose(result['snr'], _reference(blocks, result['navg']), rtol=1e-9)
+    np.testing.assert_allclose(result['radiometer'], result['snr'][0] * np.sqrt(result['navg']))
+
+    old = compute_snr_v_averaging(blocks, sample_rate=1e6)
+    assert old['navg'] == [1, 2, 4, 8]
+    np.testing.assert_allclose(old['snr'], _reference(blocks, old['navg']), rtol=1e-9)
+
+
+def test_bootstrap_interval():
+    blocks = _blocks()
+    result = compute_snr_curve(blocks, 1e6, n_boot=40, workers=1, seed=0)
+    assert np.all(result['snr_low'] <= result['snr_high'])
+    # every ordering averages the same blocks in the end
+    np.testing.assert_allclose([result['snr_low'][-1], result['snr_high'][-1]], result['snr'][-1])
+    again = compute_snr_curve(blocks, 1e6, n_boot=40, workers=1, seed=0)
+    np.testing.assert_array_equal(result['snr_low'], again['snr_low'])
+
+    # the same seed gives the same interval however the orderings are split between workers
+    for workers in (2, 3):
+        pooled = compute_snr_curve(blocks, 1e6, n_boot=40, workers=workers, seed=0)
+        np.testing.assert_array_equal(pooled['snr_low'], result['snr_low'])
+        np.testing.assert_array_equal(pooled['snr_high'], result['snr_high'])
@@ -0,0 +1,51 @@
+'''
+int8 capture storage and CaptureView (user-005)
+'''
+
+from functools import partial
+import numpy as np
+
+from src.acquiring_data import SDRSession, capture_iq_mixer, save_data
+from src.backends import SimulatedSDR
+from src.storage import CaptureView, is_iq, load_capture, pack_iq, unpack_iq
+
+
+def test_pack_unpack_round_trip():
+    rng = np.random.default_rng(0)
+    z = rng.integers(-128, 128, (3, 50)) + 1j * rng.integers(-128, 128, (3, 50))
+    packed = pack_iq(z)
+    assert packed.shape == (3, 50, 2) and packed.dtype == np.int8
+    unpacked = unpack_iq(packed)
+    assert unpacked.dtype == np.complex64
+    np.testing.assert_array_equal(unpacked, z)
+    # out of range values clip to the int8 codes
+    np.testing.assert_array_equal(pack_iq(np.array([300 - 300j])), [[127, -128]])
+
+
+def test_capture_view_converts_one_block():
+    rng = np.random.default_rng(1)
+    real = rng.integers(-128, 128, (4, 32)).astype(np.int8)
+    view = CaptureView(real)
+    assert view.shape == (4, 32) and len(view) == 4
+    assert view[2].dtype == np.float32
+    np.testing.assert_array_equal(view[2], real[2].astype(np.float32))
+    np.testing.assert_array_equal(np.stack(list(view)), real)
+
+    iq = rng.integers(-128, 128, (4, 32, 2)).astype(np.int8)
+    view = CaptureView(iq)
+    assert is_iq(iq) and view.shape == (4, 32)
+    np.testing.assert_array_equal(view[1], iq[1, :, 0] + 1j * iq[1, :, 1])
+    assert view[1].dtype == np.complex64
+
+
+def test_iq_capture_stays_int8_through_save_and_load(tmp_path):
+    backend = partial(SimulatedSDR, signal='mixer', signal_freq=100.1e6, seed=0)
+    with SDRSession(backend=backend) as session:
+        data, metadata = capture_iq_mixer(sample_rate=1e6, nsamples=256, lo_freq=100e6,
+                                          session=session)
+    assert data.dtype == np.int8 and data.shape == (1, 256, 2)
+    save_data(data, metadata, 'mixer.npz', str(tmp_path))
+    view, loaded = load_capture(str(tmp_path / 'mixer.npz'))
+    assert view.raw.dtype == np.int8
+    np.testing.assert_array_equal(view.raw, data)
+    assert loaded['lo_freq'] == 100e6
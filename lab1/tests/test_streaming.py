@@ -0,0 +1,61 @@
+'''
+stream_ng / BlockWriter / stream_capture_ng (user-001)
+'''
+
+from functools import partial
+import numpy as np
+import pytest
+
+from src.acquiring_data import BlockWriter, SDRSession, load_stream, stream_capture_ng
+from src.backends import SimulatedSDR
+
+
+def test_stream_capture_writes_every_block(tmp_path):
+    seen = []
+    backend = partial(SimulatedSDR, signal='sine', signal_freq=3e4, seed=1)
+    with SDRSession(backend=backend, sample_rate=1e6) as session:
+        # the simulated sdr is not rate limited and can outrun the writer, so the queue
+        # holds the whole run
+        summary = stream_capture_ng(str(tmp_path), nsamples=1024, nblocks=10, sample_rate=1e6,
+                                    max_queue=10, session=session, callback=lambda index, block: seen.append(block.copy()))
+    assert summary['written'] == 10 and summary['dropped'] == 0
+
+    data, metadata = load_stream(str(tmp_path))
+    assert data.shape == (10, 1024) and data.dtype == np.int8
+    np.testing.assert_array_equal(data, np.stack(seen))
+    np.testing.assert_array_equal(metadata['indices'], np.arange(10))
+
+
+def test_block_writer_drops_instead_of_growing(tmp_path):
+    metadata = {'sample_rate': 1e6, 'nsamples': 8}
+    writer = BlockWriter(str(tmp_path), 'full', metadata, max_queue=1)
+    # stop the writer thread, so nothing drains the queue: the first block fills it
+    writer._queue.put(None)
+    writer._thread.join()
+    writer._file.close()
+    block = np.zeros(8, dtype=np.int8)
+    assert writer.submit(0, 0.0, block) is True
+    assert writer.submit(1, 0.001, block) is False
+    assert writer.dropped == [1]
+
+
+def test_close_reraises_when_the_writer_thread_died(tmp_path):
+    metadata = {'sample_rate': 1e6, 'nsamples': 8}
+    writer = BlockWriter(str(tmp_path), 'dead', metadata, max_queue=1)
+    # a closed file makes the next write fail inside the writer thread
+    writer._file.close()
+    block = np.zeros(8, dtype=np.int8)
+    writer.submit(0, 0.0, block)
+    writer._thread.join(timeout=5)
+    assert not writer._thread.is_alive()
+    # with the thread gone the queue stays full; close must neither hang nor pass silently
+    writer.submit(1, 0.001, block)
+    with pytest.raises(ValueError):
+        writer.close()
+
+
+def test_empty_stream_loads(tmp_path):
+    with BlockWriter(str(tmp_path), 'empty', {'sample_rate': 1e6, 'nsamples': 64}):
+        pass
+    data, metadata = load_stream(str(tmp_path), 'empty')
+    assert data.shape == (0, 64) and len(metadata['indices']) == 0
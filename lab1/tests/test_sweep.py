@@ -0,0 +1,70 @@
+'''
+declarative capture sweeps (user-004)
+'''
+
+import csv
+import os
+from functools import partial
+import numpy as np
+
+from src.acquiring_data import SDRSession
+from src.backends import SimulatedSDR
+from src.sweep import expand_grid, run_sweep
+
+
+def test_expand_grid_is_the_full_product():
+    spec = {'fixed': {'nsamples': 256},
+            'grid': {'sample_rate': {'start': 1e6, 'stop': 1.3e6, 'step': 1e5}, 'bypass_filter': [False, True]}}
+    points = expand_grid(spec)
+    assert len(points) == 6
+    assert points[0] == {'nsamples': 256, 'sample_rate': 1e6, 'bypass_filter': False}
+    assert {(p['sample_rate'], p['bypass_filter']) for p in points} == {
+        (rate, bypass) for rate in np.arange(1e6, 1.3e6, 1e5) for bypass in (False, True)}
+
+
+def test_sweep_finds_the_aliased_tone(tmp_path):
+    output = str(tmp_path / 'sweep')
+    spec = {'capture': 'sine', 'output': output,
+            'fixed': {'signal_freq': 7.5e5, 'nsamples': 2048},
+            'grid': {'sample_rate': [1e6, 2e6, 3e6]}}
+    backend = partial(SimulatedSDR, signal='sine', signal_freq=7.5e5, noise_std=1, seed=0)
+    with SDRSession(backend=backend) as session:
+        rows = run_sweep(spec, session=session)
+
+    assert len(rows) == 3
+    assert len([f for f in os.listdir(output) if f.endswith('.npz')]) == 3
+    with open(os.path.join(output, 'results.csv')) as f:
+        assert len(list(csv.DictReader(f))) == 3
+    for row in rows:
+        fs = row['sample_rate']
+        # brute-force fold: the nearest image of the tone in 0..fs/2
+        images = np.abs(7.5e5 - np.arange(-4, 5) * fs)
+        expected = images.min()
+        assert abs(row['peak_freq'] - expected) < fs / 2048
+
+
+class OffsetSDR(SimulatedSDR):
+    '''
+    simulated sdr with a dc offset far stronger than the tone
+    '''
+
+    def capture_data(self, nsamples=2048, nblocks=1):
+        data = super().capture_data(nsamples, nblocks)
+        return (data.astype(np.int16) + 60).clip(-128, 127).astype(np.int8)
+
+
+def test_repeated_points_get_their_own_files_and_skip_dc(tmp_path):
+    output = str(tmp_path / 'sweep')
+    # the same point twice, well inside one second
+    spec = {'capture': 'sine', 'output': output,
+            'fixed': {'signal_freq': 2e5, 'nsamples': 1024, 'sample_rate': 1e6},
+            'grid': {'bypass_filter': [True, True]}}
+    backend = partial(OffsetSDR, signal='sine', signal_freq=2e5, amplitude=10, noise_std=1, seed=0)
+    with SDRSession(backend=backend, gain=0) as session:
+        rows = run_sweep(spec, session=session)
+
+    names = [row['filename'] for row in rows]
+    assert len(set(names)) == 2 and sorted(names) == sorted(f for f in os.listdir(output) if f.endswith('.npz'))
+    assert all('samples1p024e03' in name and 'gain0p000e00' in name for name in names)
+    for row in rows:
+        assert abs(row['peak_freq'] - 2e5) < 1e6 / 1024
@@ -0,0 +1,69 @@
+'''
+streaming waterfall (user-024)
+'''
+
+import numpy as np
+from scipy import signal
+
+from src.psd import PSDAccumulator
+from src.storage import read_sidecar
+from src.waterfall import Waterfall, compute_waterfall, downsample_rows, load_waterfall
+
+
+def _reference(x, sample_rate, nfft, hop, integration):
+    # scipy's one-sided density spectrogram of the whole record, then row means
+    _, _, spectra = signal.spectrogram(x, sample_rate, window='hann', nperseg=nfft, noverlap=nfft - hop,
+                                       detrend=False, scaling='density', mode='psd')
+    spectra = spectra.T
+    nrows = len(spectra) // integration
+    return spectra[:nrows * integration].reshape(nrows, integration, -1).mean(axis=1)
+
+
+def test_blocks_match_the_whole_record_stft():
+    rng = np.random.default_rng(26)
+    data = rng.integers(-128, 128, (7, 3000)).astype(np.int8)
+    freqs, rows, times = compute_waterfall(data, 1e6, nfft=256, hop=192, integration=5)
+    reference = _reference(data.ravel().astype(float), 1e6, 256, 192, 5)
+    np.testing.assert_allclose(freqs, np.fft.rfftfreq(256, 1e-6))
+    assert rows.dtype == np.float32 and rows.shape == reference.shape
+    np.testing.assert_allclose(rows, reference, rtol=1e-4)
+    np.testing.assert_allclose(times, np.arange(len(rows)) * 192 * 5 / 1e6)
+
+
+def test_rows_agree_with_welch():
+    rng = np.random.default_rng(29)
+    x = rng.normal(size=64 * 512)
+    _, rows, _ = compute_waterfall(x[None], 1e6, nfft=512, integration=64)
+    acc = PSDAccumulator(1e6, nperseg=512, overlap=0, detrend=False).update(x)
+    np.testing.assert_allclose(rows[0], acc.psd, rtol=1e-4)
+
+
+def test_rows_are_readable_while_running(tmp_path):
+    path = str(tmp_path / 'run.npy')
+    rng = np.random.default_rng(27)
+    x = rng.normal(size=40000).astype(np.float32)
+    wf = Waterfall(2e6, nfft=128, integration=4, path=path, metadata={'lo_freq': 1e8})
+    for start in range(0, 20000, 2500):
+        wf.update(x[start:start + 2500])
+    # nothing closed yet: the header and sidecar already describe the rows so far
+    rows, settings = load_waterfall(path)
+    assert len(rows) == wf.nrows == 20000 // (128 * 4)
+    assert settings['nfft'] == 128 and settings['lo_freq'] == 1e8
+    np.testing.assert_allclose(rows, _reference(x[:20000], 2e6, 128, 128, 4), rtol=1e-4)
+
+    for start in range(20000, 40000, 2500):
+        wf.update(x[start:start + 2500])
+    final = wf.close()
+    assert len(final) == 40000 // 512 and read_sidecar(path)['nblocks'] == len(final)
+
+
+def test_empty_run_and_downsample(tmp_path):
+    path = str(tmp_path / 'empty.npy')
+    assert Waterfall(1e6, nfft=64, path=path).close().shape[0] == 0
+
+    rng = np.random.default_rng(28)
+    rows = rng.normal(size=(1003, 9))
+    reduced, factor = downsample_rows(rows, max_rows=100, chunk_rows=64)
+    assert factor == 11 and len(reduced) == 92
+    np.testing.assert_allclose(reduced[:-1], rows[:91 * 11].reshape(91, 11, 9).mean(axis=1))
+    np.testing.assert_allclose(reduced[-1], rows[91 * 11:].mean(axis=0))
@@ -0,0 +1,52 @@
+'''
+chirp-z zoom spectra, peaks and line widths (user-013)
+'''
+
+import numpy as np
+
+from src.analysis import find_fwhm, zoom_fwhm, zoom_peak, zoom_spectrum
+
+
+def _tones(freqs, N=1000, sample_rate=1e6, noise=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(N) / sample_rate
+    return np.array([np.cos(2 * np.pi * f * t) for f in freqs]) + noise * rng.normal(size=(len(freqs), N))
+
+
+def test_zoom_matches_the_direct_sum():
+    x = _tones([123.4e3])[0]
+    freqs, power = zoom_spectrum(x, 1e6, 123e3, 4e3, npoints=101)
+    n = np.arange(len(x))
+    reference = np.abs([np.sum(x * np.exp(-2j * np.pi * f * n / 1e6)) for f in freqs])**2
+    np.testing.assert_allclose(freqs, np.linspace(121e3, 125e3, 101))
+    np.testing.assert_allclose(power, reference, rtol=1e-8)
+
+
+def test_per_block_centers_match_one_block_at_a_time():
+    data = _tones([101.3e3, 250.7e3, 333.3e3], seed=1)
+    centers = np.array([101e3, 251e3, 333e3])
+    freqs, power = zoom_spectrum(data, 1e6, centers, 3e3, npoints=64, window='hann')
+    for block, center, f, p in zip(data, centers, freqs, power):
+        ref_f, ref_p = zoom_spectrum(block, 1e6, center, 3e3, npoints=64, window='hann')
+        np.testing.assert_allclose(f, ref_f)
+        np.testing.assert_allclose(p, ref_p, rtol=1e-8)
+
+
+def test_zoom_peak_finds_off_bin_tones():
+    true = np.array([101.37e3, 250.71e3, 333.33e3])
+    peak_freq, peak_power = zoom_peak(_tones(true, seed=2), 1e6, npoints=2001)
+    # fft bins are 1 kHz wide here, the zoom grid 2 Hz
+    np.testing.assert_allclose(peak_freq, true, atol=20)
+    assert peak_freq.shape == peak_power.shape == (3,)
+
+
+def test_zoom_fwhm_is_find_fwhm_per_block():
+    data = _tones([101.37e3, 250.71e3], seed=3)
+    centers = np.array([101.4e3, 250.7e3])
+    widths = zoom_fwhm(data, 1e6, centers, 4e3, npoints=501)
+    freqs, power = zoom_spectrum(data, 1e6, centers, 4e3, npoints=501)
+    np.testing.assert_allclose(widths, [find_fwhm(f, p) for f, p in zip(freqs, power)])
+    # a 1 ms record gives a line about 1 kHz wide
+    assert np.all((widths > 700) & (widths < 1300))
+    # a window narrower than the line never reaches half maximum
+    assert np.all(np.isnan(zoom_fwhm(data, 1e6, centers, 200, npoints=51)))